@@ -0,0 +1,350 @@
+"""Embedded analytics store for historical submissions.
+
+Parsed question and subject tables are appended to local tables, one row per question per
+submission, so cohort and historical questions ("Physics accuracy on hard questions across
+all QPT tests this term") become one grouped SQL query instead of a script over many JSON
+files. DuckDB is used when it is installed (columnar file, vectorized scans); otherwise the
+standard-library sqlite3 backend with indexes on the common filter columns is used.
+
+Several processes (the dashboard and the watch folder) may write a sqlite store: writes take
+the lock when their transaction begins and SQLite assigns the submission ids. DuckDB allows
+one writer process per file, so a DuckDB store must only be written by one of them.
+
+Usage:
+    python analytics_store.py ingest STORE SUBMISSION [SUBMISSION ...]
+    python analytics_store.py query STORE --by subject level --where subject=Physics level=hard --test "QPT%"
+    python analytics_store.py sql STORE "SELECT ..."
+"""
+import argparse
+import io
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+BACKEND = "duckdb" if duckdb is not None else "sqlite"
+# How long a sqlite writer waits for another process's transaction to finish
+BUSY_TIMEOUT_S = 30.0
+ANALYTICS_STORE_PATH = os.environ.get(
+    "FAST_EDA_ANALYTICS", os.path.join(".cache", "analytics.duckdb" if BACKEND == "duckdb" else "analytics.sqlite")
+)
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS submissions (
+        submission_id INTEGER PRIMARY KEY,
+        source_key TEXT UNIQUE,
+        student_id TEXT,
+        test_id TEXT,
+        test_name TEXT,
+        taken_at TEXT,
+        total_marks DOUBLE,
+        total_questions INTEGER
+    )""",
+    """CREATE TABLE IF NOT EXISTS questions (
+        submission_id INTEGER NOT NULL,
+        subject TEXT,
+        chapter TEXT,
+        level TEXT,
+        section TEXT,
+        status TEXT,
+        is_correct INTEGER,
+        time_taken INTEGER
+    )""",
+    """CREATE TABLE IF NOT EXISTS subjects (
+        submission_id INTEGER NOT NULL,
+        subject TEXT,
+        total_correct INTEGER,
+        total_attempted INTEGER,
+        accuracy DOUBLE,
+        total_time DOUBLE
+    )"""
+]
+
+# Row-store indexes for sqlite; DuckDB prunes scans with its own zone maps
+SQLITE_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS questions_by_submission ON questions (submission_id)",
+    "CREATE INDEX IF NOT EXISTS questions_by_subject_level ON questions (subject, level)",
+    "CREATE INDEX IF NOT EXISTS questions_by_chapter ON questions (chapter)",
+    "CREATE INDEX IF NOT EXISTS subjects_by_submission ON subjects (submission_id)",
+    "CREATE INDEX IF NOT EXISTS submissions_by_test ON submissions (test_name, taken_at)",
+    "CREATE INDEX IF NOT EXISTS submissions_by_student ON submissions (student_id, taken_at)"
+]
+
+# Parsed-frame columns and the table columns they are stored in
+QUESTION_SOURCE = {
+    "subject": "subject", "chapter": "chapter", "level": "level", "section": "section",
+    "status": "status", "isCorrect": "is_correct", "timeTaken": "time_taken"
+}
+SUBJECT_SOURCE = {
+    "Subject": "subject", "TotalCorrect": "total_correct", "TotalAttempted": "total_attempted",
+    "Accuracy": "accuracy", "TotalTimeTaken": "total_time"
+}
+COLUMN_TYPES = {
+    "questions": {"subject": str, "chapter": str, "level": str, "section": str, "status": str,
+                  "is_correct": "int64", "time_taken": "int64"},
+    "subjects": {"subject": str, "total_correct": "int64", "total_attempted": "int64",
+                 "accuracy": float, "total_time": float}
+}
+
+# Dimensions accepted by group-by and filter arguments, mapped to their SQL expressions
+DIMENSIONS = {
+    "subject": "q.subject",
+    "chapter": "q.chapter",
+    "level": "q.level",
+    "section": "q.section",
+    "status": "q.status",
+    "student_id": "s.student_id",
+    "test_id": "s.test_id",
+    "test_name": "s.test_name",
+    "date": "substr(s.taken_at, 1, 10)",
+    "month": "substr(s.taken_at, 1, 7)"
+}
+
+def _where(filters, since=None, until=None, dimensions=DIMENSIONS):
+    """WHERE clause and parameters; '%' in a value means LIKE, a list or tuple means IN"""
+    clauses, params = [], []
+    for name, value in filters.items():
+        if value is None:
+            continue
+        if name not in dimensions:
+            raise ValueError(f"Unknown filter '{name}'; expected one of {', '.join(dimensions)}")
+        column = dimensions[name]
+        if isinstance(value, (list, tuple)):
+            clauses.append(f"{column} IN ({', '.join('?' * len(value))})")
+            params.extend(value)
+        elif isinstance(value, str) and "%" in value:
+            clauses.append(f"{column} LIKE ?")
+            params.append(value)
+        else:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    if since is not None:
+        clauses.append("s.taken_at >= ?")
+        params.append(str(since))
+    if until is not None:
+        clauses.append("s.taken_at < ?")
+        params.append(str(until))
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+class AnalyticsStore:
+    """Question- and subject-level tables of every ingested submission with a grouped query API"""
+
+    def __init__(self, path=ANALYTICS_STORE_PATH, backend=BACKEND):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.backend = backend
+        if backend == "duckdb":
+            self.conn = duckdb.connect(path)
+        else:
+            # Autocommit mode; ingest_many manages its own transaction
+            self.conn = sqlite3.connect(path, isolation_level=None, timeout=BUSY_TIMEOUT_S)
+            self.conn.execute("PRAGMA journal_mode = WAL")
+        for statement in SCHEMA + (SQLITE_INDEXES if backend == "sqlite" else []):
+            self.conn.execute(statement)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @classmethod
+    def open_existing(cls, path=ANALYTICS_STORE_PATH):
+        """Open the store if it has been built, otherwise None"""
+        return cls(path) if os.path.exists(path) else None
+
+    def _frame(self, sql, params=()):
+        if self.backend == "duckdb":
+            return self.conn.execute(sql, list(params)).df()
+        return pd.read_sql_query(sql, self.conn, params=list(params))
+
+    def _insert_frame(self, table, frame):
+        if frame.empty:
+            return
+        if self.backend == "duckdb":
+            self.conn.register("_ingest_frame", frame)
+            try:
+                self.conn.execute(f"INSERT INTO {table} SELECT {', '.join(frame.columns)} FROM _ingest_frame")
+            finally:
+                self.conn.unregister("_ingest_frame")
+        else:
+            self.conn.executemany(
+                f"INSERT INTO {table} ({', '.join(frame.columns)}) VALUES ({', '.join('?' * len(frame.columns))})",
+                frame.itertuples(index=False, name=None)
+            )
+
+    def _begin(self):
+        # IMMEDIATE takes the sqlite write lock up front, so a concurrent writer waits for it
+        # instead of failing on a stale snapshot after this transaction has read
+        self.conn.execute("BEGIN IMMEDIATE" if self.backend == "sqlite" else "BEGIN")
+
+    def _insert_submissions(self, rows):
+        columns = "source_key, student_id, test_id, test_name, taken_at, total_marks, total_questions"
+        if self.backend == "sqlite":
+            insert = f"INSERT INTO submissions ({columns}) VALUES (?, ?, ?, ?, ?, ?, ?)"
+            return [self.conn.execute(insert, row).lastrowid for row in rows]
+        # A DuckDB file has a single writer process, so the next ids can be read inside the transaction
+        next_id = self.conn.execute("SELECT COALESCE(MAX(submission_id), 0) FROM submissions").fetchone()[0] + 1
+        ids = list(range(next_id, next_id + len(rows)))
+        self.conn.executemany(f"INSERT INTO submissions (submission_id, {columns}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                              [(submission_id, *row) for submission_id, row in zip(ids, rows)])
+        return ids
+
+    def _delete_keys(self, keys):
+        if not keys:
+            return
+        placeholders = ", ".join("?" * len(keys))
+        for table in ("questions", "subjects"):
+            self.conn.execute(
+                f"DELETE FROM {table} WHERE submission_id IN "
+                f"(SELECT submission_id FROM submissions WHERE source_key IN ({placeholders}))", keys
+            )
+        self.conn.execute(f"DELETE FROM submissions WHERE source_key IN ({placeholders})", keys)
+
+    def remove(self, source_keys):
+        """Delete the submissions ingested under the given source keys"""
+        self._begin()
+        try:
+            self._delete_keys(list(source_keys))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def submission_questions(self, source_key):
+        """Question rows of the submission ingested under source_key, with the parsed-frame column
+        names, or None when no such submission is stored"""
+        found = self.conn.execute("SELECT submission_id FROM submissions WHERE source_key = ?", [source_key]).fetchone()
+        if found is None:
+            return None
+        frame = self._frame(f"SELECT {', '.join(QUESTION_SOURCE.values())} FROM questions WHERE submission_id = ?", [found[0]])
+        return frame.rename(columns={column: name for name, column in QUESTION_SOURCE.items()})
+
+    def ingest(self, parsed_data, source_key=None):
+        """Add one parsed submission; returns its submission_id"""
+        return self.ingest_many([(parsed_data, source_key)])[0]
+
+    def ingest_many(self, items):
+        """Add (parsed_data, source_key) pairs in one transaction, replacing earlier rows with the same key"""
+        self._begin()
+        try:
+            self._delete_keys([key for _, key in items if key is not None])
+            ids = self._insert_submissions([
+                (
+                    source_key, parsed_data.get("student_id"), parsed_data["test_info"].get("test_id"),
+                    parsed_data["test_info"]["name"], parsed_data["test_info"].get("taken_at"),
+                    parsed_data["test_info"].get("total_marks"), parsed_data["test_info"].get("total_questions")
+                )
+                for parsed_data, source_key in items
+            ])
+            # Concatenate the batch first so column conversion happens once, not per submission
+            for table, key, columns in (("questions", "questions_df", QUESTION_SOURCE), ("subjects", "subject_data", SUBJECT_SOURCE)):
+                frames = [parsed_data[key] for parsed_data, _ in items]
+                if not any(len(frame) for frame in frames):
+                    continue
+                batch = pd.concat([frame[list(columns)] for frame in frames if len(frame)], ignore_index=True)
+                batch = batch.rename(columns=columns)
+                batch.insert(0, "submission_id", np.repeat(ids, [len(frame) for frame in frames]))
+                self._insert_frame(table, batch.astype(COLUMN_TYPES[table]))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return ids
+
+    def count(self):
+        """Number of ingested submissions"""
+        return self.conn.execute("SELECT COUNT(*) FROM submissions").fetchone()[0]
+
+    def accuracy(self, by=("subject",), since=None, until=None, **filters):
+        """Question-level accuracy and average time grouped by the given dimensions
+
+        Filters are dimension=value keyword arguments; since/until bound taken_at (ISO dates).
+        """
+        by = list(by)
+        unknown = [name for name in by if name not in DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Unknown dimension(s) {', '.join(unknown)}; expected one of {', '.join(DIMENSIONS)}")
+        where, params = _where(filters, since, until)
+        select = "".join(f"{DIMENSIONS[name]} AS {name}, " for name in by)
+        group = f" GROUP BY {', '.join(DIMENSIONS[name] for name in by)} ORDER BY {', '.join(by)}" if by else ""
+        return self._frame(
+            f"SELECT {select}COUNT(DISTINCT q.submission_id) AS submissions, COUNT(*) AS questions,"
+            " CAST(SUM(q.is_correct) AS BIGINT) AS correct, 100.0 * SUM(q.is_correct) / COUNT(*) AS accuracy,"
+            " AVG(q.time_taken) AS avg_time"
+            f" FROM questions q JOIN submissions s USING (submission_id){where}{group}",
+            params
+        )
+
+    def subject_scores(self, by=("test_name",), since=None, until=None, **filters):
+        """Exported per-subject totals (mean accuracy and time per submission) grouped by submission dimensions"""
+        dimensions = {**{name: DIMENSIONS[name] for name in ("student_id", "test_id", "test_name", "date", "month")},
+                      "subject": "t.subject"}
+        by = list(by)
+        unknown = [name for name in by if name not in dimensions]
+        if unknown:
+            raise ValueError(f"Unknown dimension(s) {', '.join(unknown)}; expected one of {', '.join(dimensions)}")
+        where, params = _where(filters, since, until, dimensions)
+        select = "".join(f"{dimensions[name]} AS {name}, " for name in by)
+        group = f" GROUP BY {', '.join(dimensions[name] for name in by)} ORDER BY {', '.join(by)}" if by else ""
+        return self._frame(
+            f"SELECT {select}COUNT(DISTINCT t.submission_id) AS submissions,"
+            " AVG(t.accuracy) AS mean_accuracy, AVG(t.total_time) AS mean_time"
+            f" FROM subjects t JOIN submissions s USING (submission_id){where}{group}",
+            params
+        )
+
+    def query(self, sql, params=()):
+        """Run an arbitrary read query against the submissions, questions and subjects tables"""
+        return self._frame(sql, params)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest submissions into, or query, the analytics store")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest_parser = commands.add_parser("ingest", help="Parse submissions and add them to the store")
+    ingest_parser.add_argument("store")
+    ingest_parser.add_argument("submissions", nargs="+", help="Submission JSON files (optionally compressed)")
+    query_parser = commands.add_parser("query", help="Grouped question-level accuracy")
+    query_parser.add_argument("store")
+    query_parser.add_argument("--by", nargs="*", default=["subject"], help=f"Dimensions: {', '.join(DIMENSIONS)}")
+    query_parser.add_argument("--where", nargs="*", default=[], metavar="DIM=VALUE", help="Filters ('%%' for LIKE)")
+    query_parser.add_argument("--test", help="Test name filter, e.g. 'QPT%%'")
+    query_parser.add_argument("--since", help="Only attempts taken on or after this ISO date")
+    query_parser.add_argument("--until", help="Only attempts taken before this ISO date")
+    sql_parser = commands.add_parser("sql", help="Run a raw SQL query")
+    sql_parser.add_argument("store")
+    sql_parser.add_argument("sql")
+    args = parser.parse_args()
+
+    with AnalyticsStore(args.store) as store:
+        if args.command == "ingest":
+            import json_backend
+            from columnar_cache import source_hash
+            from main import parse_json_data
+
+            items = []
+            for path in args.submissions:
+                with open(path, "rb") as f:
+                    raw = f.read()
+                parsed_data = parse_json_data(json_backend.validate_submission(json_backend.load(io.BytesIO(raw))))
+                if parsed_data:
+                    items.append((parsed_data, source_hash(raw)))
+            store.ingest_many(items)
+            print(f"Ingested {len(items)} submissions into {args.store} ({store.count()} total)")
+        elif args.command == "query":
+            filters = dict(item.split("=", 1) for item in args.where)
+            if args.test:
+                filters["test_name"] = args.test
+            print(store.accuracy(args.by, args.since, args.until, **filters).to_string(index=False))
+        else:
+            print(store.query(args.sql).to_string(index=False))
@@ -0,0 +1,55 @@
+"""Content-addressed store for generated report artifacts.
+
+An artifact is saved under the SHA-256 of everything that went into it (artifact_key), so
+the same inputs always map to the same file and a repeat request is a single disk read.
+Files are written to a temporary name and renamed into place, so concurrent writers of the
+same key are harmless and readers never see a partial file.
+"""
+import hashlib
+import json
+import os
+import uuid
+
+ARTIFACT_DIR = os.environ.get("FAST_EDA_ARTIFACTS", os.path.join(".cache", "artifacts"))
+
+def artifact_key(*parts):
+    """Stable hash of JSON-serializable inputs; dict key order does not matter, but 1 and 1.0 give different keys"""
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ArtifactStore:
+    """Directory of artifacts sharded by the first two hex digits of their key"""
+
+    def __init__(self, directory=ARTIFACT_DIR, suffix=".pdf"):
+        self.directory = directory
+        self.suffix = suffix
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}{self.suffix}")
+
+    def get(self, key):
+        """Artifact bytes, or None on a miss"""
+        try:
+            with open(self.path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, data):
+        """Store an artifact and return its path"""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return path
+
+    def get_or_build(self, key, build, should_store=None):
+        """Serve the artifact from disk, or build and return it; stored unless should_store() is false"""
+        data = self.get(key)
+        if data is None:
+            data = build()
+            if should_store is None or should_store():
+                self.put(key, data)
+        return data
@@ -0,0 +1,270 @@
+"""Resumable batch report generation.
+
+Every input file is a job row in a SQLite manifest next to the reports, holding its state
+(pending, running, done, failed), input hash, output path, attempt count and last error.
+A rerun skips jobs that are done, whose input hash is unchanged and whose PDF still exists,
+resets jobs left running by a crashed run, and retries only what failed. Reports are built
+on a warm ReportPool with a bounded number of jobs in flight, and every PDF is written to a
+temporary file and renamed into place, so an interrupted run never leaves a partial output.
+Reports mirror the inputs' directories below their common parent (a/s1.json -> OUTPUT_DIR/a/
+s1.pdf), and a run that would write two inputs to the same PDF is refused before it starts.
+The manifest keeps the first run's parent directory, so rerunning any subset of the inputs
+maps them to the same reports and finds their finished jobs.
+
+Usage: python batch_reports.py OUTPUT_DIR SUBMISSION [SUBMISSION ...] [--workers N] [--retries N]
+       python batch_reports.py OUTPUT_DIR --status
+"""
+import argparse
+import io
+import os
+import sqlite3
+import time
+
+import json_backend
+from columnar_cache import source_hash
+
+MANIFEST_NAME = "batch_manifest.sqlite"
+STATES = ("pending", "running", "done", "failed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    input_path TEXT PRIMARY KEY,
+    input_hash TEXT NOT NULL,
+    student_name TEXT NOT NULL,
+    output_path TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs (state);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+def report_name(path):
+    """Output stem for a submission file: its name without .json and compression suffixes"""
+    name = os.path.basename(path)
+    for suffix in [f".{ext}" for ext in json_backend.COMPRESSED_EXTENSIONS] + [".json"]:
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    return name
+
+def input_root(inputs):
+    """Common parent directory of the input files"""
+    return os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in inputs])
+
+def report_stems(inputs, root=None):
+    """Report path per input path, relative to the output directory and without .pdf
+
+    The inputs' directories below root (by default their common parent) are kept, so a/s1.json
+    and b/s1.json become a/s1 and b/s1. Raises ValueError when an input lies outside root or
+    two inputs would still share a report, such as s1.json and s1.json.gz in the same directory.
+    """
+    inputs = sorted(set(os.path.abspath(path) for path in inputs))
+    if not inputs:
+        return {}
+    root = os.path.abspath(root) if root else input_root(inputs)
+    stems = {}
+    owners = {}
+    for path in inputs:
+        if os.path.commonpath([root, os.path.dirname(path)]) != root:
+            raise ValueError(f"{path} is outside {root}, the input directory of this batch")
+        stem = os.path.normpath(os.path.join(os.path.relpath(os.path.dirname(path), root), report_name(path)))
+        if stem in owners:
+            raise ValueError(f"{owners[stem]} and {path} would both be written to {stem}.pdf")
+        owners[stem] = path
+        stems[path] = stem
+    return stems
+
+def report_paths(inputs, output_dir, root=None):
+    """Output PDF per input path; see report_stems"""
+    return {
+        path: os.path.abspath(os.path.join(output_dir, f"{stem}.pdf"))
+        for path, stem in report_stems(inputs, root).items()
+    }
+
+class JobManifest:
+    """Per-input job state for a batch run, stored in SQLite so every transition is durable"""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def register(self, input_path, input_hash, student_name, output_path):
+        """Add or refresh a job; returns True when it needs to run
+
+        Raises ValueError when an earlier run recorded a different input for the same output.
+        """
+        owner = self.conn.execute(
+            "SELECT input_path FROM jobs WHERE output_path = ? AND input_path != ?", (output_path, input_path)
+        ).fetchone()
+        if owner is not None:
+            raise ValueError(f"{output_path} already holds the report for {owner[0]}, not {input_path}")
+        row = self.conn.execute(
+            "SELECT input_hash, state, output_path FROM jobs WHERE input_path = ?", (input_path,)
+        ).fetchone()
+        if row is not None and row[0] == input_hash and row[1] == "done" and row[2] == output_path \
+                and os.path.exists(output_path):
+            return False
+        with self.conn:
+            if row is None:
+                self.conn.execute(
+                    "INSERT INTO jobs (input_path, input_hash, student_name, output_path) VALUES (?, ?, ?, ?)",
+                    (input_path, input_hash, student_name, output_path)
+                )
+            else:
+                # Changed inputs start over; failed and interrupted (running) jobs keep their attempt count
+                attempts_reset = " attempts = 0," if row[0] != input_hash else ""
+                self.conn.execute(
+                    f"UPDATE jobs SET input_hash = ?, student_name = ?, output_path = ?,{attempts_reset}"
+                    " state = 'pending', error = NULL WHERE input_path = ?",
+                    (input_hash, student_name, output_path, input_path)
+                )
+        return True
+
+    def input_root(self, default):
+        """Directory the reports mirror: the one recorded by the first run, which records default"""
+        with self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('input_root', ?)", (default,))
+        return self.conn.execute("SELECT value FROM meta WHERE key = 'input_root'").fetchone()[0]
+
+    def pending(self):
+        return [row[0] for row in self.conn.execute(
+            "SELECT input_path FROM jobs WHERE state = 'pending' ORDER BY input_path"
+        )]
+
+    def job(self, input_path):
+        row = self.conn.execute(
+            "SELECT input_hash, student_name, output_path, attempts FROM jobs WHERE input_path = ?", (input_path,)
+        ).fetchone()
+        return dict(zip(("input_hash", "student_name", "output_path", "attempts"), row))
+
+    def start(self, input_path):
+        with self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET state = 'running', attempts = attempts + 1, started_at = ? WHERE input_path = ?",
+                (time.time(), input_path)
+            )
+
+    def finish(self, input_path, error=None, retry=False):
+        """Record a job outcome; a failed job marked for retry goes back to pending"""
+        state = "done" if error is None else ("pending" if retry else "failed")
+        with self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET state = ?, error = ?, finished_at = ? WHERE input_path = ?",
+                (state, error, time.time(), input_path)
+            )
+
+    def counts(self):
+        counts = dict.fromkeys(STATES, 0)
+        counts.update(self.conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state"))
+        return counts
+
+    def failures(self):
+        return self.conn.execute(
+            "SELECT input_path, attempts, error FROM jobs WHERE state = 'failed' ORDER BY input_path"
+        ).fetchall()
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def run_batch(inputs, output_dir, workers=None, retries=1, manifest_path=None, pool=None):
+    """Generate a PDF per input file, resuming from the manifest; returns the job state counts"""
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = manifest_path or os.path.join(output_dir, MANIFEST_NAME)
+    with JobManifest(manifest_path) as manifest:
+        root = manifest.input_root(input_root(inputs)) if inputs else None
+        outputs = report_paths(inputs, output_dir, root)
+        for path, output_path in outputs.items():
+            with open(path, "rb") as f:
+                input_hash = source_hash(f.read())
+            manifest.register(path, input_hash, report_name(path), output_path)
+        queue = manifest.pending()
+        if not queue:
+            return manifest.counts()
+
+        own_pool = pool is None
+        if own_pool:
+            from report_pool import ReportPool
+
+            pool = ReportPool(workers)
+        # Keep a bounded number of decoded submissions in flight rather than queueing the whole batch
+        limit = 2 * (workers or os.cpu_count() or 1)
+        in_flight = []
+        tries = {}
+        try:
+            while queue or in_flight:
+                while queue and len(in_flight) < limit:
+                    path = queue.pop(0)
+                    job = manifest.job(path)
+                    manifest.start(path)
+                    tries[path] = tries.get(path, 0) + 1
+                    try:
+                        with open(path, "rb") as f:
+                            raw = f.read()
+                        if source_hash(raw) != job["input_hash"]:
+                            raise ValueError("Input changed after it was registered")
+                        json_data = json_backend.validate_submission(json_backend.load(io.BytesIO(raw)))
+                    except Exception as e:
+                        manifest.finish(path, str(e))
+                        continue
+                    in_flight.append((pool.submit(json_data, job["student_name"], source_key=job["input_hash"]), path, job))
+                if not in_flight:
+                    continue
+                ready = [item for item in in_flight if item[0].ready()]
+                if not ready:
+                    in_flight[0][0].wait(0.1)
+                    continue
+                for item in ready:
+                    in_flight.remove(item)
+                    result, path, job = item
+                    try:
+                        _write_atomic(job["output_path"], result.get())
+                    except Exception as e:
+                        retry = tries[path] <= retries
+                        manifest.finish(path, str(e), retry)
+                        if retry:
+                            queue.append(path)
+                    else:
+                        manifest.finish(path)
+        finally:
+            if own_pool:
+                pool.close()
+        return manifest.counts()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate PDF reports for a batch of submissions, resuming earlier runs")
+    parser.add_argument("output_dir", help="Directory for the PDFs and the job manifest")
+    parser.add_argument("submissions", nargs="*", help="Submission JSON files (optionally compressed)")
+    parser.add_argument("--workers", type=int, help="Report worker processes (default: CPU count)")
+    parser.add_argument("--retries", type=int, default=1, help="Extra attempts per failed job within one run")
+    parser.add_argument("--manifest", help=f"Job manifest (default: OUTPUT_DIR/{MANIFEST_NAME})")
+    parser.add_argument("--status", action="store_true", help="Only print the manifest state")
+    args = parser.parse_args()
+    if not args.status:
+        run_batch(args.submissions, args.output_dir, args.workers, args.retries, args.manifest)
+    with JobManifest(args.manifest or os.path.join(args.output_dir, MANIFEST_NAME)) as manifest:
+        counts = manifest.counts()
+        failures = manifest.failures()
+    print(", ".join(f"{state}={count}" for state, count in counts.items()))
+    for path, attempts, error in failures:
+        print(f"failed after {attempts} attempt(s): {path}: {error}")
@@ -0,0 +1,692 @@
+"""Benchmarks for the report pipeline.
+
+Usage: python benchmarks.py [benchmark ...]   (runs every benchmark when none is named)
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+SUBJECT_IDS = {
+    "Physics": "607018ee404ae53194e73d92",
+    "Chemistry": "607018ee404ae53194e73d90",
+    "Mathematics": "607018ee404ae53194e73d91"
+}
+CHAPTERS = {
+    "Physics": ["Electrostatics", "Capacitance", "Current Electricity", "Magnetism"],
+    "Chemistry": ["Solutions", "Electrochemistry", "Chemical Kinetics"],
+    "Mathematics": ["Functions", "Sets and Relations", "Probability", "Matrices"]
+}
+SUBMITTED_AT_MS = 1735689600000  # 2025-01-01 UTC; each seed submits a day and a few minutes later
+
+def make_submission(questions_per_subject=25, seed=0):
+    """Build a synthetic submission in the upload JSON format"""
+    rng = random.Random(seed)
+    sections = []
+    subjects = []
+    for subject, subject_id in SUBJECT_IDS.items():
+        questions = []
+        for q_idx in range(questions_per_subject):
+            question_id = f"{subject_id[-8:]}{q_idx:016x}"
+            options = [{"_id": {"$oid": f"{question_id}{o}"}, "isCorrect": o == 0} for o in range(4)]
+            status = rng.choice(["answered", "answered", "answered", "notAnswered", "markedReview"])
+            marked = []
+            if status != "notAnswered":
+                marked = [options[0] if rng.random() < 0.6 else options[rng.randint(1, 3)]]
+            # Question metadata is fixed per question id; only the responses vary by student
+            question_rng = random.Random(question_id)
+            questions.append({
+                "questionId": {
+                    "_id": {"$oid": question_id},
+                    "chapters": [{"title": question_rng.choice(CHAPTERS[subject])}],
+                    "level": question_rng.choice(["easy", "medium", "hard"])
+                },
+                "subjectId": {"$oid": subject_id},
+                "markedOptions": marked,
+                "timeTaken": rng.randint(5, 400),
+                "status": status
+            })
+        correct = sum(1 for q in questions if q["markedOptions"] and q["markedOptions"][0]["isCorrect"])
+        attempted = sum(1 for q in questions if q["markedOptions"])
+        subjects.append({
+            "subjectId": {"$oid": subject_id},
+            "totalCorrect": correct,
+            "totalAttempted": attempted,
+            "accuracy": correct / attempted * 100 if attempted else 0.0,
+            "totalTimeTaken": sum(q["timeTaken"] for q in questions)
+        })
+        sections.append({"title": subject, "questions": questions})
+    return [{
+        "test": {
+            "title": "QPT Benchmark",
+            "totalQuestions": questions_per_subject * 3,
+            "totalMarks": questions_per_subject * 12,
+            "duration": 10800,
+            "syllabus": "<ul>" + "".join(f"<li>{c}</li>" for chapters in CHAPTERS.values() for c in chapters) + "</ul>"
+        },
+        "subjects": subjects,
+        "sections": sections,
+        "submittedAt": SUBMITTED_AT_MS + seed * (86400 + 137) * 1000
+    }]
+
+def report(name, **metrics):
+    """Print one benchmark result line"""
+    values = ", ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}" for k, v in metrics.items())
+    print(f"{name}: {values}")
+
+class OfflineGemini:
+    """Gemini stand-in that fails at once: report benchmarks time the local pipeline with fallback feedback"""
+
+    def generate_content(self, prompt):
+        raise RuntimeError("Gemini is disabled in benchmarks")
+
+def offline_pipeline():
+    """Import the report pipeline with Gemini stubbed out; ReportPool workers forked afterwards inherit it"""
+    import main
+
+    main.model = OfflineGemini()
+    return main
+
+COLD_REPORT_SCRIPT = (
+    "import json, sys, main, benchmarks; main.model = benchmarks.OfflineGemini(); "
+    "main.build_report(main.parse_json_data(json.load(open(sys.argv[1]))), 'Student')"
+)
+
+def bench_report_pool(n_reports=6, processes=2):
+    """Per-report latency: fresh interpreter per report vs the warm ReportPool"""
+    from report_pool import ReportPool
+
+    offline_pipeline()
+
+    submissions = [make_submission(seed=i) for i in range(n_reports)]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cold_times = []
+        for i, submission in enumerate(submissions):
+            path = os.path.join(tmp_dir, f"submission_{i}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(submission, f)
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", COLD_REPORT_SCRIPT, path], check=True,
+                           cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True)
+            cold_times.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    pool = ReportPool(processes=processes)
+    warm_up_time = time.perf_counter() - start
+    warm_times = []
+    with pool:
+        for submission in submissions:
+            start = time.perf_counter()
+            pool.generate(submission)
+            warm_times.append(time.perf_counter() - start)
+    report(
+        "report_pool",
+        reports=n_reports,
+        cold_per_report_s=sum(cold_times) / n_reports,
+        warm_per_report_s=sum(warm_times) / n_reports,
+        pool_warm_up_s=warm_up_time
+    )
+
+def _mapped_blocks():
+    import shared_frame
+
+    return len(shared_frame._attached)
+
+def bench_shared_frame(questions_per_subject=2000, tasks=4, processes=2):
+    """ReportPool.render_charts through shared memory: task payload, render time and mappings left in workers"""
+    import pickle
+
+    from main import parse_json_data
+    from report_pool import ReportPool
+    from shared_frame import publish_frame
+
+    questions_df = parse_json_data(make_submission(questions_per_subject))["questions_df"]
+    with ReportPool(processes=processes) as pool, publish_frame(questions_df) as shared:
+        start = time.perf_counter()
+        results = [pool.render_charts(shared.handle, "svg") for _ in range(tasks)]
+        charts = [len(result.get()) for result in results]
+        render_s = (time.perf_counter() - start) / tasks
+        # Every worker should have unmapped the block again once its task finished
+        mapped = sum(pool._pool.apply(_mapped_blocks) for _ in range(processes * 2))
+    report("shared_frame", questions=len(questions_df), charts=charts[0],
+           frame_payload_kb=len(pickle.dumps(questions_df)) / 1024,
+           handle_payload_kb=len(pickle.dumps(shared.handle)) / 1024,
+           per_task_s=render_s, blocks_still_mapped=mapped)
+
+def bench_json_decode(questions_per_subject=5000, repeats=5):
+    """Decode throughput (MB/s) of each available JSON backend, the schema check, and peak memory of
+    load() on gzip input per backend"""
+    import gzip
+    import io
+    import tracemalloc
+
+    import json_backend
+
+    payload = json.dumps(make_submission(questions_per_subject)).encode("utf-8")
+    size_mb = len(payload) / 1e6
+    for backend in json_backend.available_backends():
+        start = time.perf_counter()
+        for _ in range(repeats):
+            data = json_backend.loads(payload, backend)
+        elapsed = (time.perf_counter() - start) / repeats
+        report(f"json_decode[{backend}]", size_mb=size_mb, seconds=elapsed, mb_per_s=size_mb / elapsed)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        json_backend.validate_submission(data)
+    elapsed = (time.perf_counter() - start) / repeats
+    report("json_validate", size_mb=size_mb, seconds=elapsed, mb_per_s=size_mb / elapsed)
+    compressed = gzip.compress(payload)
+    for backend in json_backend.available_backends():
+        tracemalloc.start()
+        data = json_backend.load(io.BytesIO(compressed), backend)
+        decoded, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del data
+        report(f"json_load_gzip[{backend}]", size_mb=size_mb, decoded_mb=decoded / 1e6, peak_mb=peak / 1e6)
+
+def bench_item_analysis(n_students=10000, questions_per_subject=100):
+    """Response-matrix build and item analysis for a full cohort sitting one test"""
+    from item_analysis import ResponseMatrix, item_statistics, distractor_rates
+
+    submissions = [make_submission(questions_per_subject, seed=i) for i in range(n_students)]
+    start = time.perf_counter()
+    matrix = ResponseMatrix.from_submissions(submissions)
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    item_statistics(matrix)
+    distractor_rates(matrix)
+    analysis_time = time.perf_counter() - start
+    report(
+        "item_analysis",
+        students=matrix.shape[0],
+        questions=matrix.shape[1],
+        matrix_mb=matrix.nbytes / 1e6,
+        build_s=build_time,
+        analysis_s=analysis_time
+    )
+
+def bench_question_store(n_students=1000, questions_per_subject=100):
+    """Per-student parse_json_data frames vs the normalized QuestionStore: parse time and memory"""
+    from main import parse_json_data
+    from question_store import QuestionStore
+
+    submissions = [make_submission(questions_per_subject, seed=i) for i in range(n_students)]
+    start = time.perf_counter()
+    frames = [parse_json_data(submission)["questions_df"] for submission in submissions]
+    frames_time = time.perf_counter() - start
+    frames_mb = sum(frame.memory_usage(deep=True).sum() for frame in frames) / 1e6
+    start = time.perf_counter()
+    store = QuestionStore.from_submissions(submissions)
+    store.responses
+    store_time = time.perf_counter() - start
+    report(
+        "question_store",
+        students=n_students,
+        frames_s=frames_time,
+        store_s=store_time,
+        frames_mb=frames_mb,
+        store_mb=store.nbytes / 1e6
+    )
+
+def bench_analytics_store(n_submissions=2000, questions_per_subject=25, repeats=20):
+    """Analytics store ingest throughput and grouped query latency for each available backend"""
+    import analytics_store
+    from main import parse_json_data
+
+    parsed = [parse_json_data(make_submission(questions_per_subject, seed=i)) for i in range(n_submissions)]
+    queries = {
+        "subject_level": lambda store: store.accuracy(("subject", "level"), subject="Physics", level="hard"),
+        "chapter": lambda store: store.accuracy(("subject", "chapter")),
+        "test_month": lambda store: store.accuracy(("test_name", "month"), test_name="QPT%")
+    }
+    backends = ["duckdb", "sqlite"] if analytics_store.duckdb is not None else ["sqlite"]
+    for backend in backends:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with analytics_store.AnalyticsStore(os.path.join(tmp_dir, f"analytics.{backend}"), backend) as store:
+                start = time.perf_counter()
+                for i in range(0, n_submissions, 100):
+                    store.ingest_many([(p, f"bench-{j}") for j, p in enumerate(parsed[i:i + 100], start=i)])
+                ingest_time = time.perf_counter() - start
+                latencies = {}
+                for name, run in queries.items():
+                    run(store)
+                    start = time.perf_counter()
+                    for _ in range(repeats):
+                        run(store)
+                    latencies[f"{name}_ms"] = (time.perf_counter() - start) / repeats * 1000
+            report(
+                f"analytics_store[{backend}]",
+                submissions=n_submissions,
+                ingest_per_s=n_submissions / ingest_time,
+                rows_per_s=n_submissions * questions_per_subject * len(SUBJECT_IDS) / ingest_time,
+                **latencies
+            )
+
+def bench_sharded_batch(n_submissions=48, node_counts=(1, 2, 4), chunk=4, reports=True):
+    """Wall time of a sharded batch with 1..N local node processes sharing one queue directory"""
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        inputs = []
+        for i in range(n_submissions):
+            path = os.path.join(tmp_dir, f"submission_{i}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(make_submission(seed=i), f)
+            inputs.append(path)
+        baseline = None
+        for nodes in node_counts:
+            queue_dir = os.path.join(tmp_dir, f"queue_{nodes}")
+            output_dir = os.path.join(tmp_dir, f"reports_{nodes}")
+            subprocess.run([sys.executable, "sharded_batch.py", "enqueue", queue_dir, *inputs, "--chunk", str(chunk)],
+                           check=True, cwd=repo_dir, capture_output=True)
+            command = [sys.executable, "sharded_batch.py", "work", queue_dir, output_dir, "--workers", "1"]
+            if not reports:
+                command.append("--no-reports")
+            start = time.perf_counter()
+            workers = [subprocess.Popen(command + ["--node", f"node{i}"], cwd=repo_dir,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                       for i in range(nodes)]
+            for worker in workers:
+                worker.wait()
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            report(
+                f"sharded_batch[{nodes} nodes]",
+                submissions=n_submissions,
+                seconds=elapsed,
+                per_s=n_submissions / elapsed,
+                speedup=baseline / elapsed
+            )
+
+def bench_report_service(n_clients=8, reports_per_client=4, workers=2, queue_size=8):
+    """Load test of the HTTP report service: throughput, end-to-end latency and 429 backpressure
+
+    Every request runs the real pipeline in the pool (parse, charts, fallback feedback, PDF) with
+    Gemini stubbed out, and a distinct student name so no report is served from the artifact store.
+    """
+    import threading
+    import urllib.error
+    import urllib.parse
+    import urllib.request
+
+    from report_service import ReportService, make_server
+
+    offline_pipeline()
+
+    payloads = [json.dumps(make_submission(seed=i)).encode("utf-8") for i in range(n_clients)]
+    latencies = []
+    rejected = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        service = ReportService(workers, queue_size, tmp_dir)
+        server = make_server(service, port=0, quiet=True)
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        def client(client_id, payload):
+            for n in range(reports_per_client):
+                start = time.perf_counter()
+                query = urllib.parse.urlencode({"student_name": f"Load {client_id}-{n}"})
+                while True:
+                    request = urllib.request.Request(f"{base_url}/reports?{query}", data=payload, method="POST")
+                    try:
+                        with urllib.request.urlopen(request) as response:
+                            job_id = json.load(response)["job_id"]
+                        break
+                    except urllib.error.HTTPError as e:
+                        if e.code != 429:
+                            raise
+                        rejected.append(1)
+                        time.sleep(0.2)
+                while True:
+                    with urllib.request.urlopen(f"{base_url}/reports/{job_id}") as response:
+                        state = json.load(response)["state"]
+                    if state not in ("queued", "running"):
+                        break
+                    time.sleep(0.05)
+                with urllib.request.urlopen(f"{base_url}/reports/{job_id}/pdf") as response:
+                    response.read()
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        clients = [threading.Thread(target=client, args=(i, payload)) for i, payload in enumerate(payloads)]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+        server.server_close()
+        service.close()
+    latencies.sort()
+    report(
+        "report_service",
+        reports=len(latencies),
+        workers=workers,
+        reports_per_s=len(latencies) / elapsed,
+        p50_s=latencies[len(latencies) // 2],
+        p95_s=latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        rejected_429=len(rejected)
+    )
+
+def bench_scheduler(n_bulk=24, n_interactive=4, workers=2):
+    """Interactive report latency while a bulk batch is queued: plain FIFO pool vs ReportScheduler"""
+    import threading
+
+    from report_pool import ReportPool
+    from scheduler import ReportScheduler
+
+    offline_pipeline()
+
+    bulk = [make_submission(seed=i) for i in range(n_bulk)]
+    interactive = make_submission(seed=n_bulk)
+
+    def run(submit):
+        """Queue the bulk batch, then time interactive reports submitted one after another"""
+        remaining = [n_bulk]
+        bulk_done = threading.Event()
+
+        def bulk_finished(_):
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                bulk_done.set()
+
+        start = time.perf_counter()
+        for i, submission in enumerate(bulk):
+            submit(submission, "bulk", f"school-{i % 2}", bulk_finished)
+        latencies = []
+        for _ in range(n_interactive):
+            done = threading.Event()
+            requested = time.perf_counter()
+            submit(interactive, "interactive", "teacher", lambda _: done.set())
+            done.wait()
+            latencies.append(time.perf_counter() - requested)
+        bulk_done.wait()
+        return sum(latencies) / n_interactive, n_bulk / (time.perf_counter() - start)
+
+    with ReportPool(processes=workers) as pool:
+        idle_start = time.perf_counter()
+        pool.generate(interactive)
+        idle_latency = time.perf_counter() - idle_start
+        fifo_latency, fifo_throughput = run(
+            lambda submission, priority, tenant, callback: pool.submit(submission, callback=callback)
+        )
+        scheduler = ReportScheduler(pool)
+        scheduled_latency, scheduled_throughput = run(
+            lambda submission, priority, tenant, callback: scheduler.submit(
+                submission, "Student", priority, tenant, callback=callback
+            )
+        )
+    report(
+        "scheduler",
+        bulk_reports=n_bulk,
+        idle_interactive_s=idle_latency,
+        fifo_interactive_s=fifo_latency,
+        scheduled_interactive_s=scheduled_latency,
+        fifo_bulk_per_s=fifo_throughput,
+        scheduled_bulk_per_s=scheduled_throughput
+    )
+
+def bench_report_template(n_students=20, questions_per_subject=100, with_charts=False):
+    """Per-report PDF assembly across a cohort of one test: every block drawn per report vs one shared
+    template whose static blocks are recorded once and replayed"""
+    import main
+
+    parsed = [main.parse_json_data(make_submission(questions_per_subject, seed=i)) for i in range(n_students)]
+    feedback_sections = main.split_feedback_sections(
+        "### Intro\nBenchmark feedback.\n### Actionable Suggestions\n**Physics:**\n- Revise Electrostatics"
+    )
+    image_list = main.generate_all_charts(parsed[0]["questions_df"]) if with_charts else []
+    timings = {}
+    main._report_templates.clear()
+    for mode in ("per_report", "shared"):
+        start = time.perf_counter()
+        for parsed_data in parsed:
+            template = main.report_template(parsed_data["test_info"], parsed_data["questions_df"]) if mode == "shared" else None
+            main.generate_analysis_pdf(
+                parsed_data["questions_df"], parsed_data["subject_data"], feedback_sections, {},
+                image_list, parsed_data["test_info"], "Student", None, template
+            )
+        timings[f"{mode}_ms"] = (time.perf_counter() - start) / n_students * 1000
+    # Every student sat the same test on a different date, so one template should serve them all
+    template = next(iter(main._report_templates.values()))
+    report("report_template", students=n_students, templates=len(main._report_templates),
+           static_blocks=len(template.blocks), charts=len(image_list), **timings)
+
+def bench_pdf_table(n_rows=1000, repeats=3):
+    """PDF.add_table on a long chapter table vs the per-cell iterrows loop it replaced"""
+    import numpy as np
+    import pandas as pd
+    from main import PDF, CHAPTER_TABLE_COLUMNS
+
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame({
+        "Chapter": [f"Chapter {i}" for i in range(n_rows)],
+        "Questions": rng.integers(1, 50, n_rows),
+        "Correct": rng.integers(0, 50, n_rows),
+        "Accuracy (%)": rng.random(n_rows) * 100,
+        "Avg Time (s)": rng.random(n_rows) * 300
+    })
+    widths = [60, 30, 30, 30, 30]
+
+    def per_cell(pdf):
+        pdf.set_font("Helvetica", "", 8)
+        for i, row in data.iterrows():
+            pdf.set_fill_color(*((255, 255, 255) if i % 2 == 0 else (250, 250, 250)))
+            for header, width in zip(CHAPTER_TABLE_COLUMNS, widths):
+                value = row[header]
+                value = f"{value:.2f}" if isinstance(value, (float, np.floating)) else str(value)
+                pdf.cell(width, 7, value, border=1, align="C", fill=True)
+            pdf.ln()
+
+    def columnar(pdf):
+        pdf.add_table(data, CHAPTER_TABLE_COLUMNS)
+
+    timings = {}
+    for name, draw in (("iterrows", per_cell), ("add_table", columnar)):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            pdf = PDF()
+            pdf.set_auto_page_break(auto=True, margin=15)
+            pdf.add_page()
+            draw(pdf)
+        timings[f"{name}_ms"] = (time.perf_counter() - start) / repeats * 1000
+    report("pdf_table", rows=n_rows, pages=pdf.page_no(), **timings)
+
+def bench_html_report(questions_per_subject=100, repeats=3):
+    """Report rendering with charts: PNG charts + PDF vs SVG charts + self-contained HTML (plain and gzipped)"""
+    import main
+
+    parsed_data = main.parse_json_data(make_submission(questions_per_subject))
+    questions_df, subject_data, test_info = parsed_data["questions_df"], parsed_data["subject_data"], parsed_data["test_info"]
+    feedback_sections = main.split_feedback_sections(
+        "### Intro\nBenchmark feedback.\n### Actionable Suggestions\n**Physics:**\n- Revise Electrostatics"
+    )
+    renderers = {
+        "pdf": lambda images: main.generate_analysis_pdf(
+            questions_df, subject_data, feedback_sections, {}, images, test_info
+        ),
+        "html": lambda images: main.generate_analysis_html(
+            questions_df, subject_data, feedback_sections, {}, images, test_info
+        ),
+        "html_gz": lambda images: main.generate_analysis_html(
+            questions_df, subject_data, feedback_sections, {}, images, test_info, compress=True
+        )
+    }
+    results = {}
+    for name, render in renderers.items():
+        image_format = "png" if name == "pdf" else "svg"
+        start = time.perf_counter()
+        for _ in range(repeats):
+            output = render(main.generate_all_charts(questions_df, image_format))
+        results[f"{name}_ms"] = (time.perf_counter() - start) / repeats * 1000
+        results[f"{name}_kb"] = len(output) / 1024
+    report("html_report", questions=len(questions_df), **results)
+
+def bench_interactive_charts(questions_per_subject=100, repeats=3):
+    """Visualizations section per view: server PNG charts vs pre-aggregated Vega-Lite tables (time and payload)"""
+    import pyarrow as pa
+    import main
+    from interactive_charts import interactive_charts
+
+    questions_df = main.parse_json_data(make_submission(questions_per_subject))["questions_df"]
+
+    def arrow_bytes(data):
+        # Streamlit ships chart data as an Arrow IPC stream
+        sink = pa.BufferOutputStream()
+        table = pa.Table.from_pandas(data)
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().size
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        charts = main.generate_all_charts(questions_df)
+    png_ms = (time.perf_counter() - start) / repeats * 1000
+    png_kb = sum(len(image_data) for _, _, image_data in charts) / 1024
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        specs = interactive_charts(questions_df)
+    vega_ms = (time.perf_counter() - start) / repeats * 1000
+    vega_kb = sum(arrow_bytes(data) + len(json.dumps(spec)) for _, _, data, spec in specs) / 1024
+    report("interactive_charts", questions=len(questions_df), charts=len(specs),
+           png_ms=png_ms, png_kb=png_kb, vega_lite_ms=vega_ms, vega_lite_kb=vega_kb)
+
+def bench_dashboard_reruns(questions_per_subject=100, repeats=5):
+    """Dashboard latency per interaction under AppTest: full script rerun vs rerunning only the widget's fragment"""
+    from functools import partial
+    from streamlit.testing.v1 import AppTest
+    import streamlit.testing.v1.local_script_runner as script_runner
+
+    # AppTest recompiles the script on every run; the server compiles it once per session
+    script_cache = script_runner.ScriptCache()
+    # AppTest always reruns the whole script; the browser reruns only the fragment that holds the
+    # widget. Record which fragment rendered each widget and replay that rerun request.
+    messages = []
+    parse_tree = script_runner.parse_tree_from_messages
+
+    def capture(msgs):
+        messages[:] = msgs
+        return parse_tree(msgs)
+
+    def fragment_of(widget):
+        for msg in messages:
+            if msg.WhichOneof("type") == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                element = msg.delta.new_element
+                if getattr(getattr(element, element.WhichOneof("type")), "id", None) == widget.id:
+                    return msg.delta.fragment_id or None
+        return None
+
+    def timed(interact, fragment_id=None):
+        rerun_data = script_runner.RerunData
+        if fragment_id is not None:
+            script_runner.RerunData = partial(rerun_data, fragment_id=fragment_id)
+        try:
+            start = time.perf_counter()
+            interact().run(timeout=120)
+            return (time.perf_counter() - start) * 1000
+        finally:
+            script_runner.RerunData = rerun_data
+
+    submission = json.dumps(make_submission(questions_per_subject)).encode("utf-8")
+    script = os.path.abspath(os.path.join(os.path.dirname(__file__), "main.py"))
+    cwd = os.getcwd()
+    script_runner.parse_tree_from_messages = capture
+    script_runner.ScriptCache = lambda: script_cache
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            at = AppTest.from_file(script, default_timeout=120).run()
+            at.sidebar.file_uploader[0].set_value(("submission.json", submission, "application/json")).run()
+            interactions = {
+                "student_name": (lambda i: at.sidebar.text_input[0], lambda w, i: w.input(f"Student {i}")),
+                "section": (lambda i: at.sidebar.radio[0], lambda w, i: w.set_value(w.options[i % 2 * 2])),
+                "report_format": (lambda i: at.main.radio[0], lambda w, i: w.set_value(w.options[i % 2]))
+            }
+            results = {}
+            for name, (find, change) in interactions.items():
+                if name == "report_format":
+                    at.sidebar.radio[0].set_value(at.sidebar.radio[0].options[-1]).run()
+                full, fragment = [], []
+                for i in range(1, repeats + 1):
+                    full.append(timed(lambda: change(find(i), i)))
+                    fragment_id = fragment_of(find(i))
+                    if fragment_id is not None:
+                        fragment.append(timed(lambda: change(find(i), i + repeats), fragment_id))
+                        at.run()
+                results[f"{name}_full_ms"] = sorted(full)[len(full) // 2]
+                if fragment:
+                    results[f"{name}_fragment_ms"] = sorted(fragment)[len(fragment) // 2]
+        finally:
+            os.chdir(cwd)
+            script_runner.parse_tree_from_messages = parse_tree
+            script_runner.ScriptCache = type(script_cache)
+    report("dashboard_reruns", questions=questions_per_subject * len(SUBJECT_IDS), **results)
+
+def bench_session_memory(n_sessions=200, questions_per_subject=100, total_budget_mb=8):
+    """Per-session memory of a loaded submission, and a SessionMemory budget across many sessions"""
+    import main
+    from columnar_cache import load_parsed, write_parsed
+    from session_memory import SessionMemory, value_nbytes
+
+    parsed = main.parse_json_data(make_submission(questions_per_subject))
+    full_bytes = value_nbytes(parsed)
+    parsed["raw_data"] = main.extract_chapter_source(parsed["raw_data"])
+    slim_bytes = value_nbytes(parsed)
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = os.path.join(tmp, "parsed")
+        write_parsed("bench", parsed, parsed["raw_data"], cache_dir)
+        # The budget fits the parsed submission but not the scratch value too, so each put spills one
+        loaded_bytes = value_nbytes(load_parsed("bench", cache_dir=cache_dir))
+        memory = SessionMemory(session_budget=loaded_bytes + 32 * 1024, total_budget=total_budget_mb * 1024 * 1024,
+                               spill_dir=os.path.join(tmp, "spill"))
+        start = time.perf_counter()
+        for i in range(n_sessions):
+            session_parsed = load_parsed("bench", cache_dir=cache_dir)
+            memory.put(f"session-{i}", "analysis_data", session_parsed,
+                       reload=lambda: load_parsed("bench", cache_dir=cache_dir))
+            memory.put(f"session-{i}", "scratch", os.urandom(64 * 1024))
+        put_ms = (time.perf_counter() - start) / n_sessions * 1000
+        stats = memory.stats()
+        # analysis_data was dropped (reloaded from the columnar cache); reading it spills scratch (pickled)
+        session = f"session-{n_sessions - 1}"
+        start = time.perf_counter()
+        memory.get(session, "analysis_data")
+        reload_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        memory.get(session, "scratch")
+        unpickle_ms = (time.perf_counter() - start) * 1000
+    report("session_memory", full_kb=full_bytes / 1024, slim_kb=slim_bytes / 1024, sessions=n_sessions,
+           resident_sessions=stats["sessions"], resident_mb=stats["memory_bytes"] / 2**20,
+           spilled_kb=stats["spilled_bytes"] / 1024, put_ms=put_ms, reload_ms=reload_ms, unpickle_ms=unpickle_ms)
+
+BENCHMARKS = {
+    "report_pool": bench_report_pool,
+    "shared_frame": bench_shared_frame,
+    "json_decode": bench_json_decode,
+    "item_analysis": bench_item_analysis,
+    "question_store": bench_question_store,
+    "analytics_store": bench_analytics_store,
+    "sharded_batch": bench_sharded_batch,
+    "report_service": bench_report_service,
+    "scheduler": bench_scheduler,
+    "report_template": bench_report_template,
+    "pdf_table": bench_pdf_table,
+    "html_report": bench_html_report,
+    "interactive_charts": bench_interactive_charts,
+    "dashboard_reruns": bench_dashboard_reruns,
+    "session_memory": bench_session_memory
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run report pipeline benchmarks")
+    parser.add_argument("names", nargs="*", help=f"Benchmarks to run (default: all): {', '.join(BENCHMARKS)}")
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+    for name in args.names or BENCHMARKS:
+        BENCHMARKS[name]()
@@ -0,0 +1,167 @@
+"""Incremental cohort aggregates.
+
+AggregateStore keeps, per (subject, chapter, level), the question count, the number correct
+and the Welford mean/M2 of timeTaken. A submission is folded in with one vectorized groupby
+and a Chan-style combine per group, so keeping class-wide statistics current costs
+O(questions per submission). Partial stores from different workers merge the same way, and
+a submission that was added can be removed again (e.g. a re-graded or withdrawn attempt).
+
+Usage: python cohort_aggregates.py STORE.json SUBMISSION [SUBMISSION ...] [--remove]
+"""
+import argparse
+import json
+import os
+
+import pandas as pd
+
+AGGREGATE_STORE_PATH = os.environ.get("FAST_EDA_AGGREGATES", os.path.join(".cache", "cohort_aggregates.json"))
+GROUP_KEYS = ["subject", "chapter", "level"]
+
+def _combine(a, b):
+    """Combine two (count, correct, mean, m2) states"""
+    count = a[0] + b[0]
+    if count == 0:
+        return [0, 0, 0.0, 0.0]
+    delta = b[2] - a[2]
+    mean = a[2] + delta * b[0] / count
+    m2 = a[3] + b[3] + delta * delta * a[0] * b[0] / count
+    return [count, a[1] + b[1], mean, m2]
+
+def _subtract(total, part):
+    """Remove a previously combined (count, correct, mean, m2) state; None when nothing is left"""
+    count = total[0] - part[0]
+    if count <= 0:
+        return None
+    mean = (total[0] * total[2] - part[0] * part[2]) / count
+    delta = part[2] - mean
+    m2 = total[3] - part[3] - delta * delta * count * part[0] / total[0]
+    return [count, total[1] - part[1], mean, max(m2, 0.0)]
+
+def submission_partials(questions_df):
+    """Per-group (count, correct, mean, m2) of one submission, computed in a single groupby"""
+    if questions_df.empty:
+        return {}
+    grouped = questions_df.groupby(GROUP_KEYS).agg(
+        count=("timeTaken", "size"),
+        correct=("isCorrect", "sum"),
+        mean=("timeTaken", "mean"),
+        var=("timeTaken", "var")
+    )
+    # Sample variance is NaN for single-question groups, whose M2 is 0
+    grouped["m2"] = (grouped["var"] * (grouped["count"] - 1)).fillna(0.0)
+    return {
+        key: [int(row.count), int(row.correct), float(row.mean), float(row.m2)]
+        for key, row in zip(grouped.index, grouped.itertuples(index=False))
+    }
+
+class AggregateStore:
+    """Running cohort statistics per subject/chapter/level supporting add, remove and merge"""
+
+    def __init__(self):
+        self.groups = {}
+        self.submissions = 0
+
+    def add(self, questions_df):
+        """Fold one parsed submission into the aggregates"""
+        for key, part in submission_partials(questions_df).items():
+            self.groups[key] = _combine(self.groups.get(key, [0, 0, 0.0, 0.0]), part)
+        self.submissions += 1
+
+    def remove(self, questions_df):
+        """Take a previously added submission back out of the aggregates
+
+        Every group is checked before any is changed, so a submission that was never added
+        raises KeyError and leaves the store as it was.
+        """
+        partials = submission_partials(questions_df)
+        for key, part in partials.items():
+            if key not in self.groups or self.groups[key][0] < part[0]:
+                raise KeyError(f"Group {key} was never added to the store")
+        if self.submissions < 1:
+            raise KeyError("The store holds no submissions")
+        for key, part in partials.items():
+            remaining = _subtract(self.groups[key], part)
+            if remaining is None:
+                del self.groups[key]
+            else:
+                self.groups[key] = remaining
+        self.submissions -= 1
+
+    def merge(self, other):
+        """Fold the partial state of another worker into this store"""
+        for key, part in other.groups.items():
+            self.groups[key] = _combine(self.groups.get(key, [0, 0, 0.0, 0.0]), part)
+        self.submissions += other.submissions
+        return self
+
+    def to_frame(self):
+        """One row per subject/chapter/level group"""
+        rows = [
+            {"subject": key[0], "chapter": key[1], "level": key[2],
+             "count": state[0], "correct": state[1], "mean_time": state[2], "m2": state[3]}
+            for key, state in self.groups.items()
+        ]
+        return pd.DataFrame(rows, columns=GROUP_KEYS + ["count", "correct", "mean_time", "m2"])
+
+    def summary(self, by=("subject",)):
+        """Roll groups up to the given keys with accuracy, mean and variance of timeTaken"""
+        frame = self.to_frame()
+        by = list(by)
+        if frame.empty:
+            return pd.DataFrame(columns=by + ["count", "correct", "accuracy", "mean_time", "var_time"])
+        frame["weighted_time"] = frame["count"] * frame["mean_time"]
+        totals = frame.groupby(by)[["count", "correct", "weighted_time"]].sum()
+        totals["mean_time"] = totals["weighted_time"] / totals["count"]
+        # Between-group spread: sum of n * (group mean - rolled-up mean)^2, added to the within-group M2
+        frame = frame.join(totals["mean_time"].rename("rollup_mean"), on=by)
+        frame["m2_total"] = frame["m2"] + frame["count"] * (frame["mean_time"] - frame["rollup_mean"]) ** 2
+        totals["var_time"] = frame.groupby(by)["m2_total"].sum() / totals["count"]
+        totals["accuracy"] = totals["correct"] / totals["count"] * 100
+        return totals[["count", "correct", "accuracy", "mean_time", "var_time"]].reset_index()
+
+    def to_dict(self):
+        return {"submissions": self.submissions, "groups": [list(key) + state for key, state in self.groups.items()]}
+
+    @classmethod
+    def from_dict(cls, state):
+        store = cls()
+        store.submissions = state["submissions"]
+        store.groups = {tuple(row[:3]): list(row[3:]) for row in state["groups"]}
+        return store
+
+    def save(self, path=AGGREGATE_STORE_PATH):
+        """Write the store atomically as JSON"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=AGGREGATE_STORE_PATH):
+        """Load a saved store, or an empty one when none exists yet"""
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+if __name__ == "__main__":
+    import json_backend
+    from main import parse_json_data
+
+    parser = argparse.ArgumentParser(description="Fold submissions into (or out of) the cohort aggregate store")
+    parser.add_argument("store", help="Aggregate store file to create or update")
+    parser.add_argument("submissions", nargs="+", help="Submission JSON files (optionally compressed)")
+    parser.add_argument("--remove", action="store_true", help="Remove the submissions instead of adding them")
+    args = parser.parse_args()
+    store = AggregateStore.load(args.store)
+    for path in args.submissions:
+        with open(path, "rb") as f:
+            parsed_data = parse_json_data(json_backend.validate_submission(json_backend.load(f)))
+        if parsed_data:
+            if args.remove:
+                store.remove(parsed_data["questions_df"])
+            else:
+                store.add(parsed_data["questions_df"])
+    store.save(args.store)
+    print(store.summary().to_string(index=False))
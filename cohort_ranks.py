@@ -0,0 +1,149 @@
+"""Cohort percentile ranks built on mergeable KLL sketches.
+
+Each submission contributes one value per metric: overall accuracy, accuracy per subject and
+average timeTaken per chapter. Sketches are updated per submission, merged across workers and
+saved as JSON, so ranking a student never sorts the full cohort.
+
+Usage: python cohort_ranks.py OUTPUT.json SUBMISSION [SUBMISSION ...] [--workers N]
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from quantile_sketch import KLLSketch
+
+COHORT_SKETCH_PATH = os.environ.get("FAST_EDA_COHORT_SKETCHES", os.path.join(".cache", "cohort_sketches.json"))
+
+def submission_metrics(questions_df):
+    """Per-submission values that are ranked against the cohort"""
+    if questions_df.empty:
+        return {"overall_accuracy": None, "subject_accuracy": {}, "chapter_avg_time": {}}
+    return {
+        "overall_accuracy": float(questions_df["isCorrect"].mean() * 100),
+        "subject_accuracy": (questions_df.groupby("subject")["isCorrect"].mean() * 100).to_dict(),
+        "chapter_avg_time": questions_df.groupby("chapter")["timeTaken"].mean().to_dict()
+    }
+
+class CohortSketches:
+    """KLL sketches for overall accuracy, per-subject accuracy and per-chapter average time"""
+
+    def __init__(self, k=200):
+        self.k = k
+        self.overall_accuracy = KLLSketch(k)
+        self.subject_accuracy = {}
+        self.chapter_avg_time = {}
+
+    def _sketch(self, group, key):
+        if key not in group:
+            group[key] = KLLSketch(self.k)
+        return group[key]
+
+    def add_submission(self, questions_df):
+        """Fold one parsed submission into the cohort"""
+        metrics = submission_metrics(questions_df)
+        if metrics["overall_accuracy"] is None:
+            return
+        self.overall_accuracy.update(metrics["overall_accuracy"])
+        for subject, accuracy in metrics["subject_accuracy"].items():
+            self._sketch(self.subject_accuracy, subject).update(accuracy)
+        for chapter, avg_time in metrics["chapter_avg_time"].items():
+            self._sketch(self.chapter_avg_time, chapter).update(avg_time)
+
+    def merge(self, other):
+        """Fold the sketches of another worker into this one"""
+        self.overall_accuracy.merge(other.overall_accuracy)
+        for group, other_group in ((self.subject_accuracy, other.subject_accuracy),
+                                   (self.chapter_avg_time, other.chapter_avg_time)):
+            for key, sketch in other_group.items():
+                self._sketch(group, key).merge(sketch)
+        return self
+
+    @property
+    def n(self):
+        return self.overall_accuracy.n
+
+    def percentile_ranks(self, questions_df):
+        """Percentile (0-100) of this submission's metrics within the cohort.
+
+        Accuracy ranks are "share of the cohort at or below this accuracy". Chapter time ranks
+        are "share of the cohort at or below this average time", so a low rank means faster.
+        """
+        metrics = submission_metrics(questions_df)
+        ranks = {"cohort_size": self.n, "overall_accuracy": None, "subject_accuracy": {}, "chapter_avg_time": {}}
+        if metrics["overall_accuracy"] is None or self.n == 0:
+            return ranks
+        ranks["overall_accuracy"] = self.overall_accuracy.rank(metrics["overall_accuracy"]) * 100
+        for subject, accuracy in metrics["subject_accuracy"].items():
+            if subject in self.subject_accuracy:
+                ranks["subject_accuracy"][subject] = self.subject_accuracy[subject].rank(accuracy) * 100
+        for chapter, avg_time in metrics["chapter_avg_time"].items():
+            if chapter in self.chapter_avg_time:
+                ranks["chapter_avg_time"][chapter] = self.chapter_avg_time[chapter].rank(avg_time) * 100
+        return ranks
+
+    def to_dict(self):
+        return {
+            "k": self.k,
+            "overall_accuracy": self.overall_accuracy.to_dict(),
+            "subject_accuracy": {key: sketch.to_dict() for key, sketch in self.subject_accuracy.items()},
+            "chapter_avg_time": {key: sketch.to_dict() for key, sketch in self.chapter_avg_time.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        cohort = cls(k=state["k"])
+        cohort.overall_accuracy = KLLSketch.from_dict(state["overall_accuracy"])
+        cohort.subject_accuracy = {key: KLLSketch.from_dict(s) for key, s in state["subject_accuracy"].items()}
+        cohort.chapter_avg_time = {key: KLLSketch.from_dict(s) for key, s in state["chapter_avg_time"].items()}
+        return cohort
+
+    def save(self, path=COHORT_SKETCH_PATH):
+        """Write the sketches atomically as JSON"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=COHORT_SKETCH_PATH):
+        """Load saved sketches, or None when no cohort has been built yet"""
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+def _sketch_files(paths):
+    """Build partial sketches for a chunk of submission files inside one worker"""
+    import json_backend
+    from main import parse_json_data
+
+    cohort = CohortSketches()
+    for path in paths:
+        with open(path, "rb") as f:
+            parsed_data = parse_json_data(json_backend.validate_submission(json_backend.load(f)))
+        if parsed_data:
+            cohort.add_submission(parsed_data["questions_df"])
+    return cohort
+
+def build_cohort(paths, workers=1, base=None):
+    """Sketch many submission files, merging the partial sketches of each worker"""
+    cohort = base or CohortSketches()
+    if workers <= 1:
+        return cohort.merge(_sketch_files(paths))
+    chunks = [paths[i::workers] for i in range(workers)]
+    with ProcessPoolExecutor(workers) as executor:
+        for partial in executor.map(_sketch_files, chunks):
+            cohort.merge(partial)
+    return cohort
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or extend cohort percentile sketches")
+    parser.add_argument("output", help="Sketch file to create or extend")
+    parser.add_argument("submissions", nargs="+", help="Submission JSON files (optionally compressed)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    cohort = build_cohort(args.submissions, args.workers, CohortSketches.load(args.output))
+    cohort.save(args.output)
+    print(f"Cohort sketches for {cohort.n} submissions written to {args.output}")
@@ -0,0 +1,114 @@
+"""Columnar cache of parsed submissions.
+
+The questions and subject tables produced by parse_json_data are written as Arrow IPC
+files under a directory keyed by the SHA-256 of the source file and CACHE_VERSION.
+load_parsed() memory-maps them back, so repeat analyses skip JSON decoding. Bump
+CACHE_VERSION whenever parse_json_data's output or the cached table layout changes, so
+entries written by older code are parsed again instead of being served stale.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import pyarrow as pa
+
+CACHE_DIR = os.environ.get("FAST_EDA_CACHE_DIR", os.path.join(".cache", "parsed"))
+CACHE_VERSION = 1
+TEST_INFO_KEY = b"test_info"
+SYLLABUS_KEY = b"syllabus"
+STUDENT_ID_KEY = b"student_id"
+HASH_CHUNK_BYTES = 1024 * 1024
+
+def source_hash(source_bytes):
+    """Cache key for the raw bytes of an uploaded or batch file"""
+    return hashlib.sha256(source_bytes).hexdigest()
+
+def source_hash_file(fp):
+    """source_hash of a binary file object's whole contents, read in chunks; leaves it rewound"""
+    fp.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: fp.read(HASH_CHUNK_BYTES), b""):
+        digest.update(chunk)
+    fp.seek(0)
+    return digest.hexdigest()
+
+def cache_path(key, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, f"v{CACHE_VERSION}", key[:2], key)
+
+def _write_table(table, path):
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+def _read_table(path):
+    """Memory-map an Arrow IPC file; buffers stay on disk until a column is converted"""
+    with pa.memory_map(path, "r") as source:
+        return pa.ipc.open_file(source).read_all()
+
+def _chapter_rows(chapter_source):
+    """Flatten the chapter source used by get_gemini_chapters into (subject_id, title) columns"""
+    subject_ids = []
+    titles = []
+    for section in chapter_source.get("sections", []):
+        for question in section.get("questions", []):
+            subject_id = question.get("subjectId", {})
+            if isinstance(subject_id, dict):
+                subject_id = subject_id.get("$oid", "Unknown")
+            for chapter in question.get("questionId", {}).get("chapters", []):
+                subject_ids.append(str(subject_id))
+                titles.append(chapter.get("title", ""))
+    return pa.table({"subject_id": pa.array(subject_ids, pa.string()), "title": pa.array(titles, pa.string())})
+
+def _chapter_source(table, syllabus):
+    """Rebuild the slim raw_data that get_gemini_chapters reads from the cached chapter rows"""
+    questions = [
+        {"subjectId": {"$oid": subject_id}, "questionId": {"chapters": [{"title": title}]}}
+        for subject_id, title in zip(table.column("subject_id").to_pylist(), table.column("title").to_pylist())
+    ]
+    return {"test": {"syllabus": syllabus}, "sections": [{"questions": questions}]}
+
+def write_parsed(key, parsed_data, chapter_source, cache_dir=CACHE_DIR):
+    """Write the questions, subject and chapter tables of one parsed submission"""
+    target = cache_path(key, cache_dir)
+    if os.path.isdir(target):
+        return target
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".tmp-", dir=os.path.dirname(target))
+    try:
+        questions = pa.Table.from_pandas(parsed_data["questions_df"], preserve_index=False)
+        questions = questions.replace_schema_metadata({
+            **(questions.schema.metadata or {}),
+            TEST_INFO_KEY: json.dumps(parsed_data["test_info"]).encode("utf-8"),
+            SYLLABUS_KEY: chapter_source.get("test", {}).get("syllabus", "").encode("utf-8"),
+            STUDENT_ID_KEY: (parsed_data.get("student_id") or "").encode("utf-8")
+        })
+        _write_table(questions, os.path.join(tmp_dir, "questions.arrow"))
+        _write_table(pa.Table.from_pandas(parsed_data["subject_data"], preserve_index=False),
+                     os.path.join(tmp_dir, "subjects.arrow"))
+        _write_table(_chapter_rows(chapter_source), os.path.join(tmp_dir, "chapters.arrow"))
+        os.replace(tmp_dir, target)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        # Another writer may have published the same key first
+        if not os.path.isdir(target):
+            raise
+    return target
+
+def load_parsed(key, cache_dir=CACHE_DIR):
+    """Load a cached submission in the parse_json_data result shape, or None on a cache miss"""
+    target = cache_path(key, cache_dir)
+    if not os.path.isdir(target):
+        return None
+    questions = _read_table(os.path.join(target, "questions.arrow"))
+    metadata = questions.schema.metadata or {}
+    subjects = _read_table(os.path.join(target, "subjects.arrow"))
+    chapters = _read_table(os.path.join(target, "chapters.arrow"))
+    return {
+        "questions_df": questions.to_pandas(),
+        "subject_data": subjects.to_pandas(),
+        "test_info": json.loads(metadata[TEST_INFO_KEY]),
+        "student_id": metadata.get(STUDENT_ID_KEY, b"").decode("utf-8") or None,
+        "raw_data": _chapter_source(chapters, metadata.get(SYLLABUS_KEY, b"").decode("utf-8"))
+    }
@@ -0,0 +1,198 @@
+"""Longitudinal index of each student's test attempts.
+
+A small SQLite database holds one row per (student, test) attempt with its date and totals,
+plus per-chapter question/correct/time counts for the attempt. Trends and improvement deltas
+are answered with indexed SQL (window functions over attempts ordered by date), so the
+dashboard and feedback generator can show progress without reloading old submission files.
+
+Usage: python history_index.py INDEX.sqlite SUBMISSION [SUBMISSION ...]
+"""
+import argparse
+import os
+import sqlite3
+from datetime import datetime, timezone
+
+import pandas as pd
+
+HISTORY_INDEX_PATH = os.environ.get("FAST_EDA_HISTORY", os.path.join(".cache", "history.sqlite"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attempts (
+    attempt_id INTEGER PRIMARY KEY,
+    student_id TEXT NOT NULL,
+    test_id TEXT NOT NULL,
+    test_name TEXT,
+    taken_at TEXT NOT NULL,
+    questions INTEGER NOT NULL,
+    correct INTEGER NOT NULL,
+    time_taken INTEGER NOT NULL,
+    total_marks REAL,
+    UNIQUE (student_id, test_id)
+);
+CREATE INDEX IF NOT EXISTS attempts_by_student_date ON attempts (student_id, taken_at);
+CREATE TABLE IF NOT EXISTS chapter_stats (
+    attempt_id INTEGER NOT NULL REFERENCES attempts (attempt_id) ON DELETE CASCADE,
+    subject TEXT NOT NULL,
+    chapter TEXT NOT NULL,
+    questions INTEGER NOT NULL,
+    correct INTEGER NOT NULL,
+    time_taken INTEGER NOT NULL,
+    PRIMARY KEY (attempt_id, subject, chapter)
+);
+CREATE INDEX IF NOT EXISTS chapter_stats_by_chapter ON chapter_stats (chapter, attempt_id);
+"""
+
+# Each chapter's accuracy in the student's latest attempt next to the attempt before it
+IMPROVEMENT_SQL = """
+WITH ranked AS (
+    SELECT c.subject, c.chapter, a.taken_at, a.test_name,
+           100.0 * c.correct / c.questions AS accuracy,
+           1.0 * c.time_taken / c.questions AS avg_time,
+           ROW_NUMBER() OVER (PARTITION BY c.subject, c.chapter ORDER BY a.taken_at DESC, a.attempt_id DESC) AS recency
+    FROM chapter_stats c JOIN attempts a USING (attempt_id)
+    WHERE a.student_id = ?
+)
+SELECT cur.subject, cur.chapter, cur.test_name,
+       prev.accuracy AS previous_accuracy, cur.accuracy AS latest_accuracy,
+       cur.accuracy - prev.accuracy AS accuracy_delta,
+       prev.avg_time AS previous_avg_time, cur.avg_time AS latest_avg_time,
+       cur.avg_time - prev.avg_time AS avg_time_delta
+FROM ranked cur JOIN ranked prev
+  ON prev.subject = cur.subject AND prev.chapter = cur.chapter AND prev.recency = 2
+WHERE cur.recency = 1
+ORDER BY accuracy_delta
+"""
+
+class HistoryIndex:
+    """SQLite-backed history of attempts per student, keyed by student and test"""
+
+    def __init__(self, path=HISTORY_INDEX_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @classmethod
+    def open_existing(cls, path=HISTORY_INDEX_PATH):
+        """Open the index if it has been built, otherwise None"""
+        return cls(path) if os.path.exists(path) else None
+
+    def record_attempt(self, student_id, parsed_data):
+        """Insert or replace one parsed attempt; returns its attempt_id"""
+        questions_df = parsed_data["questions_df"]
+        test_info = parsed_data["test_info"]
+        taken_at = test_info.get("taken_at") or datetime.now(timezone.utc).isoformat()
+        chapters = questions_df.groupby(["subject", "chapter"]).agg(
+            questions=("isCorrect", "size"),
+            correct=("isCorrect", "sum"),
+            time_taken=("timeTaken", "sum")
+        ).reset_index()
+        with self.conn:
+            # Re-recording an attempt (re-upload or re-grade) replaces its chapter rows via the cascade
+            self.conn.execute(
+                "DELETE FROM attempts WHERE student_id = ? AND test_id = ?",
+                (str(student_id), str(test_info.get("test_id") or test_info["name"]))
+            )
+            cursor = self.conn.execute(
+                "INSERT INTO attempts (student_id, test_id, test_name, taken_at, questions, correct, time_taken, total_marks)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    str(student_id), str(test_info.get("test_id") or test_info["name"]), test_info["name"], taken_at,
+                    int(len(questions_df)), int(questions_df["isCorrect"].sum()), int(questions_df["timeTaken"].sum()),
+                    test_info.get("total_marks")
+                )
+            )
+            attempt_id = cursor.lastrowid
+            self.conn.executemany(
+                "INSERT INTO chapter_stats VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (attempt_id, row.subject, row.chapter, int(row.questions), int(row.correct), int(row.time_taken))
+                    for row in chapters.itertuples(index=False)
+                ]
+            )
+        return attempt_id
+
+    def attempts(self, student_id):
+        """All attempts of a student in date order with accuracy and marks"""
+        return pd.read_sql_query(
+            "SELECT test_id, test_name, taken_at, questions, correct,"
+            " 100.0 * correct / MAX(questions, 1) AS accuracy,"
+            " correct * total_marks / MAX(questions, 1) AS marks, time_taken"
+            " FROM attempts WHERE student_id = ? ORDER BY taken_at, attempt_id",
+            self.conn, params=(str(student_id),)
+        )
+
+    def chapter_trend(self, student_id, chapter=None):
+        """Per-attempt accuracy and average time for each chapter (or one chapter) in date order"""
+        query = (
+            "SELECT a.taken_at, a.test_name, c.subject, c.chapter, c.questions, c.correct,"
+            " 100.0 * c.correct / c.questions AS accuracy, 1.0 * c.time_taken / c.questions AS avg_time"
+            " FROM chapter_stats c JOIN attempts a USING (attempt_id) WHERE a.student_id = ?"
+        )
+        params = [str(student_id)]
+        if chapter is not None:
+            query += " AND c.chapter = ?"
+            params.append(chapter)
+        return pd.read_sql_query(query + " ORDER BY c.subject, c.chapter, a.taken_at", self.conn, params=params)
+
+    def improvement(self, student_id):
+        """Latest vs previous accuracy and average time for every chapter seen in both attempts"""
+        return pd.read_sql_query(IMPROVEMENT_SQL, self.conn, params=(str(student_id),))
+
+    def progress_summary(self, student_id, limit=5):
+        """Short plain-text progress summary for the feedback prompt, or None without earlier attempts"""
+        attempts = self.attempts(student_id)
+        if len(attempts) < 2:
+            return None
+        lines = [
+            f"- {row.test_name} ({row.taken_at[:10]}): {row.accuracy:.2f}% accuracy, {row.correct}/{row.questions} correct"
+            for row in attempts.itertuples(index=False)
+        ]
+        deltas = self.improvement(student_id)
+        if not deltas.empty:
+            improved = deltas[deltas["accuracy_delta"] > 0].sort_values("accuracy_delta", ascending=False).head(limit)
+            declined = deltas[deltas["accuracy_delta"] < 0].head(limit)
+            if not improved.empty:
+                lines.append("- Most improved chapters since the previous test:")
+                lines.extend(
+                    f"  - {row.chapter} ({row.subject}): {row.previous_accuracy:.2f}% -> {row.latest_accuracy:.2f}%"
+                    for row in improved.itertuples(index=False)
+                )
+            if not declined.empty:
+                lines.append("- Chapters that declined:")
+                lines.extend(
+                    f"  - {row.chapter} ({row.subject}): {row.previous_accuracy:.2f}% -> {row.latest_accuracy:.2f}%"
+                    for row in declined.itertuples(index=False)
+                )
+        return "\n".join(lines)
+
+if __name__ == "__main__":
+    import json_backend
+    from main import parse_json_data
+
+    parser = argparse.ArgumentParser(description="Record submissions in the per-student history index")
+    parser.add_argument("index", help="History index file to create or update")
+    parser.add_argument("submissions", nargs="+", help="Submission JSON files (optionally compressed)")
+    args = parser.parse_args()
+    recorded = 0
+    with HistoryIndex(args.index) as index:
+        for path in args.submissions:
+            with open(path, "rb") as f:
+                parsed_data = parse_json_data(json_backend.validate_submission(json_backend.load(f)))
+            if parsed_data and parsed_data.get("student_id"):
+                index.record_attempt(parsed_data["student_id"], parsed_data)
+                recorded += 1
+            else:
+                print(f"Skipping {path}: no student id in the submission")
+    print(f"Recorded {recorded} attempts in {args.index}")
@@ -0,0 +1,154 @@
+"""Vega-Lite versions of the dashboard charts, built from small pre-aggregated tables.
+
+generate_all_charts renders 17 PNGs at 300 DPI on the server for every visit to the
+Visualizations section. Here the server only reduces questions_df to what each chart draws
+(histogram bins, category counts, crosstab counts, time quartiles per category) and the
+browser renders it with Vega-Lite, so the payload grows with the number of categories
+rather than with pixels, and tooltips, zoom and pan come for free.
+"""
+import numpy as np
+import pandas as pd
+
+TIME_TITLE = "Time Taken (s)"
+
+def time_histogram(questions_df, bins=30):
+    """Bin edges and counts of timeTaken, like the 30-bin histplot"""
+    counts, edges = np.histogram(questions_df["timeTaken"], bins=bins)
+    return pd.DataFrame({"bin_start": edges[:-1], "bin_end": edges[1:], "count": counts})
+
+def category_counts(questions_df, column):
+    """Questions per category in order of first appearance"""
+    counts = questions_df.groupby(column, sort=False, observed=True).size()
+    return counts.rename("count").reset_index()
+
+def crosstab_counts(questions_df, index, columns):
+    """Long-form question counts for every (index, columns) pair, zeros included"""
+    counts = pd.crosstab(questions_df[index], questions_df[columns]).stack()
+    return counts.rename("count").reset_index().astype({index: str, columns: str})
+
+def time_quartiles(questions_df, column):
+    """Min, quartiles and max of timeTaken per category: the box-plot summary of each violin"""
+    quartiles = questions_df.groupby(column, sort=False, observed=True)["timeTaken"].quantile([0, 0.25, 0.5, 0.75, 1])
+    summary = quartiles.unstack()
+    summary.columns = ["min", "q1", "median", "q3", "max"]
+    summary["count"] = questions_df.groupby(column, sort=False, observed=True).size()
+    return summary.reset_index()
+
+def question_times(questions_df, column=None):
+    """Question index and time taken, plus the category that colors the line"""
+    columns = ["timeTaken"] + ([column] if column else [])
+    return questions_df[columns].rename_axis("index").reset_index()
+
+def histogram_spec(title):
+    return {
+        "title": title,
+        "mark": {"type": "bar", "tooltip": True},
+        "encoding": {
+            "x": {"field": "bin_start", "type": "quantitative", "bin": {"binned": True}, "title": TIME_TITLE},
+            "x2": {"field": "bin_end"},
+            "y": {"field": "count", "type": "quantitative", "title": "Count"}
+        }
+    }
+
+def count_spec(title, column, label):
+    return {
+        "title": title,
+        "mark": {"type": "bar", "tooltip": True},
+        "encoding": {
+            "y": {"field": column, "type": "nominal", "sort": None, "title": label},
+            "x": {"field": "count", "type": "quantitative", "title": "Count"},
+            "color": {"field": column, "type": "nominal", "legend": None}
+        }
+    }
+
+def line_spec(title, column=None):
+    encoding = {
+        "x": {"field": "index", "type": "quantitative", "title": "Question Index"},
+        "y": {"field": "timeTaken", "type": "quantitative", "title": TIME_TITLE}
+    }
+    if column:
+        encoding["color"] = {"field": column, "type": "nominal"}
+    return {
+        "title": title,
+        "mark": {"type": "line", "point": True, "tooltip": True},
+        "encoding": encoding,
+        "params": [{"name": "zoom", "select": "interval", "bind": "scales"}]
+    }
+
+def heatmap_spec(title, index, columns, index_title, columns_title):
+    axes = {
+        "y": {"field": index, "type": "nominal", "title": index_title},
+        "x": {"field": columns, "type": "nominal", "title": columns_title}
+    }
+    return {
+        "title": title,
+        "encoding": axes,
+        "layer": [
+            {"mark": {"type": "rect", "tooltip": True},
+             "encoding": {"color": {"field": "count", "type": "quantitative", "scale": {"scheme": "yelloworangered"}}}},
+            {"mark": {"type": "text"},
+             "encoding": {"text": {"field": "count", "type": "quantitative"}}}
+        ]
+    }
+
+def box_spec(title, column, label):
+    y = {"field": column, "type": "nominal", "sort": None, "title": label}
+    return {
+        "title": title,
+        "encoding": {"y": y},
+        "layer": [
+            {"mark": {"type": "rule"},
+             "encoding": {"x": {"field": "min", "type": "quantitative", "title": TIME_TITLE}, "x2": {"field": "max"}}},
+            {"mark": {"type": "bar", "size": 14, "tooltip": {"content": "data"}},
+             "encoding": {"x": {"field": "q1", "type": "quantitative"}, "x2": {"field": "q3"},
+                          "color": {"field": column, "type": "nominal", "legend": None}}},
+            {"mark": {"type": "tick", "color": "white", "size": 14},
+             "encoding": {"x": {"field": "median", "type": "quantitative"}}}
+        ]
+    }
+
+def interactive_charts(questions_df):
+    """(name, title, data, spec) for each chart in generate_all_charts, in the same order"""
+    has_section = "section" in questions_df.columns
+    charts = [("time_taken_histogram", time_histogram(questions_df),
+               histogram_spec("Distribution of Time Taken per Question"))]
+    if has_section:
+        charts.append(("section_count", category_counts(questions_df, "section"),
+                       count_spec("Questions per Section", "section", "Section")))
+    charts += [
+        ("chapter_count", category_counts(questions_df, "chapter"),
+         count_spec("Questions per Chapter", "chapter", "Chapter")),
+        ("level_count", category_counts(questions_df, "level"),
+         count_spec("Questions per Difficulty Level", "level", "Level")),
+        ("status_count", category_counts(questions_df, "status"),
+         count_spec("Questions per Answer Status", "status", "Status")),
+        ("time_taken_index", question_times(questions_df), line_spec("Time Taken per Question Over Time")),
+        ("time_taken_chapter", question_times(questions_df, "chapter"), line_spec("Time Taken by Chapter", "chapter")),
+        ("time_taken_level", question_times(questions_df, "level"), line_spec("Time Taken by Difficulty Level", "level"))
+    ]
+    if has_section:
+        charts += [
+            ("time_taken_section", question_times(questions_df, "section"), line_spec("Time Taken by Section", "section")),
+            ("section_vs_chapter_heatmap", crosstab_counts(questions_df, "section", "chapter"),
+             heatmap_spec("Section vs Chapter (Question Count)", "section", "chapter", "Section", "Chapter"))
+        ]
+    charts += [
+        ("chapter_vs_level_heatmap", crosstab_counts(questions_df, "chapter", "level"),
+         heatmap_spec("Chapter vs Level (Question Count)", "chapter", "level", "Chapter", "Level")),
+        ("level_vs_status_heatmap", crosstab_counts(questions_df, "level", "status"),
+         heatmap_spec("Level vs Status (Question Count)", "level", "status", "Level", "Status")),
+        ("status_vs_correctness_heatmap", crosstab_counts(questions_df, "status", "isCorrect"),
+         heatmap_spec("Status vs Correctness (Question Count)", "status", "isCorrect", "Status", "Correct"))
+    ]
+    if has_section:
+        charts.append(("section_vs_timeTaken_violin", time_quartiles(questions_df, "section"),
+                       box_spec("Time Taken Distribution by Section", "section", "Section")))
+    charts += [
+        ("chapter_vs_timeTaken_violin", time_quartiles(questions_df, "chapter"),
+         box_spec("Time Taken Distribution by Chapter", "chapter", "Chapter")),
+        ("level_vs_timeTaken_violin", time_quartiles(questions_df, "level"),
+         box_spec("Time Taken Distribution by Level", "level", "Level")),
+        ("status_vs_timeTaken_violin", time_quartiles(questions_df, "status"),
+         box_spec("Time Taken Distribution by Status", "status", "Status"))
+    ]
+    return [(name, spec["title"], data, spec) for name, data, spec in charts]
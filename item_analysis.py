@@ -0,0 +1,215 @@
+"""Student x question response matrix and vectorized item analysis.
+
+ResponseMatrix stores a cohort's answers to one test compactly: correctness and attempt flags
+are bit-packed (one bit per student per question), and time taken plus the marked option are
+kept only for attempted questions, as a CSR-style sparse int16/int8 matrix. Item statistics
+(difficulty index, point-biserial discrimination, distractor rates, mean time) are computed
+with whole-matrix numpy operations, so a 10k-student x 300-question test takes seconds.
+"""
+import numpy as np
+import pandas as pd
+
+TIME_MAX = np.iinfo(np.int16).max
+
+def _oid(value, default):
+    if isinstance(value, dict):
+        return value.get("$oid", default)
+    return default if value is None else str(value)
+
+class ResponseMatrix:
+    """Bit-packed correctness/attempts plus sparse int16 times and marked options"""
+
+    def __init__(self, student_ids, question_ids, question_meta, option_ids, option_correct,
+                 correct_bits, attempted_bits, indptr, indices, times, options):
+        self.student_ids = student_ids
+        self.question_ids = question_ids
+        self.question_meta = question_meta
+        self.option_ids = option_ids
+        self.option_correct = option_correct
+        self.correct_bits = correct_bits
+        self.attempted_bits = attempted_bits
+        self.indptr = indptr
+        self.indices = indices
+        self.times = times
+        self.options = options
+
+    @property
+    def shape(self):
+        return len(self.student_ids), len(self.question_ids)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.correct_bits, self.attempted_bits, self.indptr,
+                                      self.indices, self.times, self.options))
+
+    @classmethod
+    def from_submissions(cls, submissions, student_ids=None):
+        """Build the matrix from decoded submissions (dicts, or lists whose first item is one)"""
+        question_index = {}
+        question_meta = []
+        option_index = []
+        option_correct = []
+        rows, cols, correct, times, options = [], [], [], [], []
+        ids = []
+        for row, data in enumerate(submissions):
+            if isinstance(data, list):
+                data = data[0]
+            ids.append(student_ids[row] if student_ids is not None else row)
+            for section_idx, section in enumerate(data.get("sections", [])):
+                for q_idx, q in enumerate(section.get("questions", [])):
+                    question = q.get("questionId", {})
+                    qid = _oid(question.get("_id"), f"{section_idx}:{q_idx}")
+                    col = question_index.get(qid)
+                    if col is None:
+                        col = question_index[qid] = len(question_meta)
+                        question_meta.append({
+                            "subjectId": _oid(q.get("subjectId"), "Unknown"),
+                            "chapter": question.get("chapters", [{"title": "Unknown"}])[0]["title"],
+                            "level": question.get("level", "Unknown")
+                        })
+                        option_index.append({})
+                        option_correct.append([])
+                    marked = q.get("markedOptions", [])
+                    if marked:
+                        option_id = _oid(marked[0].get("_id"), str(marked[0].get("option", "")))
+                        option = option_index[col].get(option_id)
+                        if option is None:
+                            option = option_index[col][option_id] = len(option_correct[col])
+                            option_correct[col].append(bool(marked[0].get("isCorrect", False)))
+                        is_correct = bool(marked[0].get("isCorrect", False))
+                    elif q.get("inputValue", {}).get("value", None) is not None:
+                        option = -1
+                        is_correct = bool(q["inputValue"].get("isCorrect", False))
+                    else:
+                        continue
+                    rows.append(row)
+                    cols.append(col)
+                    correct.append(is_correct)
+                    times.append(int(q.get("timeTaken", 0)))
+                    options.append(option)
+
+        n_students, n_questions = len(ids), len(question_meta)
+        rows = np.asarray(rows, dtype=np.int32)
+        cols = np.asarray(cols, dtype=np.int32)
+        correct_dense = np.zeros((n_students, n_questions), dtype=bool)
+        attempted_dense = np.zeros((n_students, n_questions), dtype=bool)
+        attempted_dense[rows, cols] = True
+        correct_dense[rows, cols] = np.asarray(correct, dtype=bool)
+        # Entries arrive grouped by student, so row counts give the CSR pointer directly
+        indptr = np.zeros(n_students + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n_students), out=indptr[1:])
+        return cls(
+            student_ids=ids,
+            question_ids=list(question_index),
+            question_meta=question_meta,
+            option_ids=[list(index) for index in option_index],
+            option_correct=option_correct,
+            correct_bits=np.packbits(correct_dense, axis=1),
+            attempted_bits=np.packbits(attempted_dense, axis=1),
+            indptr=indptr,
+            indices=cols,
+            times=np.clip(np.asarray(times, dtype=np.int64), 0, TIME_MAX).astype(np.int16),
+            options=np.asarray(options, dtype=np.int8)
+        )
+
+    @classmethod
+    def from_store(cls, store):
+        """Build the matrix from a question_store.QuestionStore without reparsing any JSON"""
+        from question_store import NOT_ATTEMPTED
+
+        responses = store.responses
+        attempted = responses["option"] != NOT_ATTEMPTED
+        rows = responses["student"][attempted]
+        cols = responses["question"][attempted]
+        n_students, n_questions = len(store.student_ids), len(store.questions)
+        # Store option codes are global; renumber them per question as the matrix expects
+        option_ids = [[] for _ in range(n_questions)]
+        option_correct = [[] for _ in range(n_questions)]
+        local_option = np.empty(len(store.option_ids), dtype=np.int8)
+        for code, ((question, option_id), is_correct) in enumerate(zip(store.option_ids, store.option_correct)):
+            local_option[code] = len(option_ids[question])
+            option_ids[question].append(option_id)
+            option_correct[question].append(is_correct)
+        options = responses["option"][attempted]
+        marked = options >= 0
+        local = np.full(len(options), -1, dtype=np.int8)
+        local[marked] = local_option[options[marked]]
+        correct_dense = np.zeros((n_students, n_questions), dtype=bool)
+        attempted_dense = np.zeros((n_students, n_questions), dtype=bool)
+        attempted_dense[rows, cols] = True
+        correct_dense[rows, cols] = responses["isCorrect"][attempted]
+        indptr = np.zeros(n_students + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n_students), out=indptr[1:])
+        questions = store.questions
+        return cls(
+            student_ids=list(store.student_ids),
+            question_ids=questions["questionId"].tolist(),
+            question_meta=questions[["subjectId", "chapter", "level"]].astype(object).to_dict("records"),
+            option_ids=option_ids,
+            option_correct=option_correct,
+            correct_bits=np.packbits(correct_dense, axis=1),
+            attempted_bits=np.packbits(attempted_dense, axis=1),
+            indptr=indptr,
+            indices=cols.astype(np.int32),
+            times=np.clip(responses["timeTaken"][attempted], 0, TIME_MAX).astype(np.int16),
+            options=local
+        )
+
+    def correct_matrix(self, dtype=np.float32):
+        """Dense students x questions correctness (unattempted counts as incorrect)"""
+        return np.unpackbits(self.correct_bits, axis=1, count=self.shape[1]).astype(dtype)
+
+    def attempted_matrix(self):
+        return np.unpackbits(self.attempted_bits, axis=1, count=self.shape[1]).astype(bool)
+
+def item_statistics(matrix):
+    """Per-question difficulty index, point-biserial discrimination, attempt rate and mean time"""
+    n_students, n_questions = matrix.shape
+    scores = matrix.correct_matrix(np.float64)
+    attempts = np.unpackbits(matrix.attempted_bits, axis=1, count=n_questions).sum(axis=0)
+    difficulty = scores.mean(axis=0)
+    # Item-rest correlation: correlate each item with the total score excluding that item
+    rest = scores.sum(axis=1, keepdims=True) - scores
+    item_centered = scores - difficulty
+    rest_centered = rest - rest.mean(axis=0)
+    covariance = (item_centered * rest_centered).mean(axis=0)
+    denominator = scores.std(axis=0) * rest.std(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        discrimination = np.where(denominator > 0, covariance / denominator, np.nan)
+        time_sum = np.bincount(matrix.indices, weights=matrix.times, minlength=n_questions)
+        mean_time = np.where(attempts > 0, time_sum / np.maximum(attempts, 1), np.nan)
+    meta = pd.DataFrame(matrix.question_meta)
+    return pd.DataFrame({
+        "questionId": matrix.question_ids,
+        "subjectId": meta.get("subjectId"),
+        "chapter": meta.get("chapter"),
+        "level": meta.get("level"),
+        "students": n_students,
+        "attempts": attempts,
+        "attempt_rate": attempts / max(n_students, 1),
+        "difficulty_index": difficulty,
+        "point_biserial": discrimination,
+        "mean_time": mean_time
+    })
+
+def distractor_rates(matrix):
+    """Share of attempting students choosing each marked option, per question"""
+    n_questions = matrix.shape[1]
+    marked = matrix.options >= 0
+    width = max((len(ids) for ids in matrix.option_ids), default=0)
+    if width == 0:
+        return pd.DataFrame(columns=["questionId", "optionId", "isCorrect", "count", "rate"])
+    counts = np.bincount(
+        matrix.indices[marked].astype(np.int64) * width + matrix.options[marked],
+        minlength=n_questions * width
+    ).reshape(n_questions, width)
+    attempts = np.bincount(matrix.indices, minlength=n_questions)
+    question_col, option_col = np.nonzero(counts)
+    option_ids = [matrix.option_ids[q][o] for q, o in zip(question_col, option_col)]
+    return pd.DataFrame({
+        "questionId": [matrix.question_ids[q] for q in question_col],
+        "optionId": option_ids,
+        "isCorrect": [matrix.option_correct[q][o] for q, o in zip(question_col, option_col)],
+        "count": counts[question_col, option_col],
+        "rate": counts[question_col, option_col] / attempts[question_col]
+    })
@@ -0,0 +1,269 @@
+"""Pluggable JSON decoding and submission schema check.
+
+loads() uses orjson when it is installed, then pysimdjson, and falls back to the standard
+library. Every backend raises json.JSONDecodeError on malformed input so callers keep a single
+except clause. load() recognises gzip, bz2 and zstd input by its magic bytes and decompresses
+it as a stream; when ijson is installed it also parses that stream incrementally, so neither
+the compressed nor the decompressed document is ever held whole and peak memory is the
+decoded objects plus one read buffer. validate_submission() runs a schema check compiled once
+at import time and rejects malformed submissions before any DataFrame or chart work starts.
+"""
+import bz2
+import gzip
+import io
+import json
+import sys
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+if orjson is not None:
+    BACKEND = "orjson"
+elif simdjson is not None:
+    BACKEND = "simdjson"
+else:
+    BACKEND = "json"
+
+# load() prefers the incremental parser: slower than orjson, but it never buffers the document
+STREAM_BACKEND = "ijson" if ijson is not None else BACKEND
+STREAM_BUFFER_BYTES = 64 * 1024
+
+class SubmissionSchemaError(ValueError):
+    """Raised when a decoded submission does not have the structure parse_json_data expects"""
+
+def _loads_orjson(data):
+    return orjson.loads(data)
+
+def _loads_simdjson(data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    try:
+        return simdjson.Parser().parse(data, recursive=True)
+    except ValueError as e:
+        raise json.JSONDecodeError(str(e), data.decode("utf-8", errors="replace"), 0) from e
+
+def _loads_json(data):
+    return json.loads(data)
+
+class _SharedKeyDict(dict):
+    """dict whose keys are interned as ijson inserts them, so the thousands of question objects
+    share one copy of each field name the way orjson's key cache does"""
+
+    def __setitem__(self, key, value, _intern=sys.intern, _setitem=dict.__setitem__):
+        _setitem(self, _intern(key), value)
+
+def _load_ijson(stream):
+    """Decode a binary stream incrementally; trailing data after the document is an error like in json.loads"""
+    try:
+        documents = list(ijson.items(
+            stream, "", use_float=True, map_type=_SharedKeyDict, buf_size=STREAM_BUFFER_BYTES
+        ))
+    except ijson.JSONError as e:
+        raise json.JSONDecodeError(str(e), "", 0) from e
+    return documents[0]
+
+def _loads_ijson(data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return _load_ijson(io.BytesIO(data))
+
+DECODERS = {
+    "orjson": _loads_orjson,
+    "simdjson": _loads_simdjson,
+    "ijson": _loads_ijson,
+    "json": _loads_json
+}
+
+def available_backends():
+    """Names of the decoders usable in this environment, fastest first"""
+    modules = (("orjson", orjson), ("simdjson", simdjson), ("ijson", ijson), ("json", json))
+    return [name for name, module in modules if module is not None]
+
+def loads(data, backend=None):
+    """Decode JSON from bytes or str with the fastest available backend"""
+    return DECODERS[backend or BACKEND](data)
+
+COMPRESSION_MAGIC = (
+    (b"\x1f\x8b", "gzip"),
+    (b"BZh", "bz2"),
+    (b"\x28\xb5\x2f\xfd", "zstd")
+)
+
+# Extensions accepted for uploads besides plain .json
+COMPRESSED_EXTENSIONS = ["gz", "bz2", "zst"]
+
+def detect_compression(head):
+    """Name of the compression format a file starts with, or None for plain data"""
+    for magic, name in COMPRESSION_MAGIC:
+        if head.startswith(magic):
+            return name
+    return None
+
+def open_decompressed(fp):
+    """Wrap a binary file object so reads return decompressed bytes, whatever the input format"""
+    if hasattr(fp, "peek"):
+        head = fp.peek(4)[:4]
+    else:
+        position = fp.tell()
+        head = fp.read(4)
+        fp.seek(position)
+    compression = detect_compression(head)
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=fp, mode="rb")
+    if compression == "bz2":
+        return bz2.BZ2File(fp, mode="rb")
+    if compression == "zstd":
+        if zstandard is None:
+            raise ValueError("Reading .zst files requires the zstandard package")
+        return zstandard.ZstdDecompressor().stream_reader(fp, read_across_frames=True)
+    return fp
+
+def load(fp, backend=None):
+    """Decode JSON from a binary or text file object, decompressing gzip/bz2/zstd input on the fly
+
+    The default backend is STREAM_BACKEND: with ijson the decompressed stream goes straight
+    into the parser. Any other backend needs the whole decompressed document in memory first.
+    The caller's file object is left open.
+    """
+    backend = backend or STREAM_BACKEND
+    if isinstance(fp, io.TextIOBase):
+        return loads(fp.read(), backend)
+    stream = open_decompressed(fp)
+    if backend == "ijson":
+        return _load_ijson(stream)
+    return loads(stream.read(), backend)
+
+# Structure parse_json_data relies on; everything not listed here is optional and unchecked
+QUESTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "questionId": {
+            "type": "object",
+            "properties": {
+                "chapters": {
+                    "type": "array",
+                    "minItems": 1,
+                    "items": {"type": "object", "required": ["title"], "properties": {"title": {"type": "string"}}}
+                },
+                "level": {"type": "string"}
+            }
+        },
+        "subjectId": {"type": ["object", "string"]},
+        "markedOptions": {"type": "array", "items": {"type": "object"}},
+        "inputValue": {"type": ["object", "null"]},
+        "timeTaken": {"type": ["number", "string"]}
+    }
+}
+
+SUBMISSION_SCHEMA = {
+    "type": "object",
+    "required": ["sections"],
+    "properties": {
+        "test": {
+            "type": "object",
+            "properties": {
+                "title": {"type": "string"},
+                "totalQuestions": {"type": "number"},
+                "totalMarks": {"type": "number"},
+                "duration": {"type": "number"},
+                "syllabus": {"type": "string"}
+            }
+        },
+        "subjects": {
+            "type": "array",
+            "items": {"type": "object", "required": ["subjectId"], "properties": {"subjectId": {"type": "object"}}}
+        },
+        "sections": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "title": {"type": "string"},
+                    "questions": {"type": "array", "items": QUESTION_SCHEMA}
+                }
+            }
+        }
+    }
+}
+
+_TYPE_CHECKS = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None
+}
+
+def compile_schema(schema):
+    """Compile a small JSON-schema subset (type, required, properties, items, minItems) into a checker"""
+    checks = []
+    types = schema.get("type")
+    if types is not None:
+        types = [types] if isinstance(types, str) else list(types)
+        type_checks = [_TYPE_CHECKS[t] for t in types]
+        expected = " or ".join(types)
+
+        def check_type(value, path):
+            if not any(check(value) for check in type_checks):
+                raise SubmissionSchemaError(f"{path}: expected {expected}, got {type(value).__name__}")
+        checks.append(check_type)
+    required = schema.get("required", [])
+    properties = [(name, compile_schema(sub)) for name, sub in schema.get("properties", {}).items()]
+    if required or properties:
+        def check_object(value, path):
+            if not isinstance(value, dict):
+                return
+            for name in required:
+                if name not in value:
+                    raise SubmissionSchemaError(f"{path}: missing required field '{name}'")
+            for name, check in properties:
+                if name in value:
+                    check(value[name], f"{path}.{name}")
+        checks.append(check_object)
+    min_items = schema.get("minItems")
+    items = compile_schema(schema["items"]) if "items" in schema else None
+    if min_items is not None or items is not None:
+        def check_array(value, path):
+            if not isinstance(value, list):
+                return
+            if min_items is not None and len(value) < min_items:
+                raise SubmissionSchemaError(f"{path}: expected at least {min_items} item(s)")
+            if items is not None:
+                for i, item in enumerate(value):
+                    items(item, f"{path}[{i}]")
+        checks.append(check_array)
+
+    def validate(value, path="$"):
+        for step in checks:
+            step(value, path)
+    return validate
+
+_check_submission = compile_schema(SUBMISSION_SCHEMA)
+
+def validate_submission(json_data):
+    """Validate a decoded upload (a submission or a list whose first item is one) and return the submission"""
+    if isinstance(json_data, list):
+        if not json_data:
+            raise SubmissionSchemaError("$: expected at least 1 submission")
+        _check_submission(json_data[0], "$[0]")
+        return json_data[0]
+    _check_submission(json_data)
+    return json_data
@@ -2,16 +2,34 @@ import streamlit as st
 import json
 import pandas as pd
 import seaborn as sns
-import matplotlib.pyplot as plt
+import matplotlib
+from matplotlib.figure import Figure
 import numpy as np
-from fpdf import FPDF
+from fpdf import FPDF, FPDF_VERSION
+from fpdf.enums import PDFResourceType
 from io import BytesIO
 import base64
+import gzip
+import html
 import re
 from bs4 import BeautifulSoup
 import uuid
 import google.generativeai as genai
 import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from columnar_cache import source_hash_file, load_parsed, write_parsed
+import json_backend
+from cohort_ranks import CohortSketches
+from history_index import HistoryIndex
+from analytics_store import AnalyticsStore
+from artifact_store import ArtifactStore, artifact_key
+from session_memory import SessionMemory
+from interactive_charts import interactive_charts
+from submission_meta import submission_datetime, format_test_date, student_id, test_id
+from json_backend import validate_submission, SubmissionSchemaError, COMPRESSED_EXTENSIONS
 
 # Configure Gemini API
 GEMINI_API_KEY = "GEMINI_API_KEY"  # Replace with your Gemini API key
@@ -60,8 +78,8 @@ st.markdown("""
 # Initialize session state
 if 'data_loaded' not in st.session_state:
     st.session_state.data_loaded = False
-if 'analysis_data' not in st.session_state:
-    st.session_state.analysis_data = {}
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
 def sanitize_text(text):
     """Sanitize text for PDF generation"""
@@ -93,7 +111,8 @@ def parse_json_data(json_data):
         # Extract test details
         test_info = data.get("test", {})
         test_name = test_info.get("title", "QPT 1")
-        test_date = "11 May 2025"
+        taken_at = submission_datetime(data)
+        test_date = format_test_date(taken_at)
         total_questions = test_info.get("totalQuestions", 75)
         total_marks = test_info.get("totalMarks", 300)
         test_duration = test_info.get("duration", 3600)
@@ -156,223 +175,248 @@ def parse_json_data(json_data):
                 'date': test_date,
                 'total_questions': total_questions,
                 'total_marks': total_marks,
-                'duration': test_duration
+                'duration': test_duration,
+                'test_id': test_id(data),
+                'taken_at': taken_at.isoformat() if taken_at else None
             },
+            'student_id': student_id(data),
             'raw_data': data
         }
     except Exception as e:
         st.error(f"Error parsing JSON data: {str(e)}")
         return None
 
-def generate_all_charts(questions_df):
-    """Generate all visualization charts and return as bytes for Streamlit"""
+# Chart palette, applied per Axes so rendering never touches pyplot/rcParams globals
+CHART_PALETTE = sns.color_palette("husl")
+
+# SVG charts keep text as <text> elements (much smaller than glyph paths) and get stable ids.
+# Applied with rc_context around each SVG save, so the app's global rcParams stay untouched;
+# rc_context swaps the globals in and out, so concurrent SVG saves take turns.
+SVG_RC = {"svg.fonttype": "none", "svg.hashsalt": "fast-eda"}
+_svg_rc_lock = threading.Lock()
+
+@contextmanager
+def chart_figure(figsize):
+    """Yield a standalone Figure and Axes for one chart and release the figure on exit"""
+    fig = Figure(figsize=figsize)
+    try:
+        ax = fig.add_subplot()
+        ax.set_prop_cycle(color=CHART_PALETTE)
+        yield fig, ax
+    finally:
+        fig.clear()
+
+def figure_to_bytes(fig, image_format="png"):
+    """Encode a figure as PNG (300 DPI) or SVG bytes without version or date metadata"""
+    buffer = BytesIO()
+    if image_format == "svg":
+        with _svg_rc_lock, matplotlib.rc_context(SVG_RC):
+            fig.savefig(buffer, format="svg", bbox_inches="tight", metadata={"Date": None, "Creator": None})
+    else:
+        fig.savefig(buffer, format="png", dpi=300, bbox_inches="tight", metadata={"Software": None})
+    return buffer.getvalue()
+
+def hue_palette(values):
+    """Colors for a hue column, matching seaborn's handling of the husl chart palette"""
+    n_colors = values.nunique()
+    if n_colors <= len(CHART_PALETTE):
+        return CHART_PALETTE[:n_colors]
+    return sns.husl_palette(n_colors)
+
+def generate_all_charts(questions_df, image_format="png", on_warning=None):
+    """Generate all visualization charts and return as bytes for Streamlit (PNG) or the HTML report (SVG)"""
     charts = []
-    plt.style.use('default')
-    sns.set_palette("husl")
     
     try:
         # 1. Histogram of timeTaken
-        fig, ax = plt.subplots(figsize=(6, 4))
-        sns.histplot(data=questions_df, x="timeTaken", bins=30, ax=ax)
-        ax.set_title("Distribution of Time Taken per Question")
-        ax.set_xlabel("Time Taken (s)")
-        ax.set_ylabel("Count")
-        buffer = BytesIO()
-        fig.savefig(buffer, format="png", dpi=300, bbox_inches="tight")
-        plt.close(fig)
-        charts.append(("time_taken_histogram.png", "This graph shows how long you spent on each question, with taller bars for longer times. It helps you spot which questions slowed you down so you can practice going faster.", buffer.getvalue()))
+        with chart_figure(figsize=(6, 4)) as (fig, ax):
+            sns.histplot(data=questions_df, x="timeTaken", bins=30, ax=ax)
+            ax.set_title("Distribution of Time Taken per Question")
+            ax.set_xlabel("Time Taken (s)")
+            ax.set_ylabel("Count")
+            image_data = figure_to_bytes(fig, image_format)
+        charts.append(("time_taken_histogram.png", "This graph shows how long you spent on each question, with taller bars for longer times. It helps you spot which questions slowed you down so you can practice going faster.", image_data))
 
         # 2. Countplot of section
         if "section" in questions_df.columns:
-            fig, ax = plt.subplots(figsize=(6, 4))
-            sns.countplot(y="section", data=questions_df, ax=ax)
-            ax.set_title("Questions per Section")
-            ax.set_xlabel("Count")
-            ax.set_ylabel("Section")
-            buffer = BytesIO()
-            fig.savefig(buffer, format="png", dpi=300, bbox_inches="tight")
-            plt.close(fig)
-            charts.append(("section_count.png", "This chart counts how many questions were in each test section. It shows which sections had more questions, helping you focus your study.", buffer.getvalue()))
+            with chart_figure(figsize=(6, 4)) as (fig, ax):
+                sns.countplot(y="section", data=questions_df, ax=ax)
+                ax.set_title("Questions per Section")
+                ax.set_xlabel("Count")
+                ax.set_ylabel("Section")
+                image_data = figure_to_bytes(fig, image_format)
+            charts.append(("section_count.png", "This chart counts how many questions were in each test section. It shows which sections had more questions, helping you focus your study.", image_data))
 
         # 3. Countplot of chapter
-        fig, ax = plt.subplots(figsize=(6, 8))
-        sns.countplot(y="chapter", data=questions_df, ax=ax)
-        ax.set_title("Questions per Chapter")
-        ax.set_xlabel("Count")
-        ax.set_ylabel("Chapter")
-        buffer = BytesIO()
-        fig.savefig(buffer, format="png", dpi=300, bbox_inches="tight")
-        plt.close(fig)
-        charts.append(("chapter_count.png", "This graph shows how many questions came from each chapter. It helps you know which chapters need more study if they had lots of questions.", buffer.getvalue()))
+        with chart_figure(figsize=(6, 8)) as (fig, ax):
+            sns.countplot(y="chapter", data=questions_df, ax=ax)
+            ax.set_title("Questions per Chapter")
+            ax.set_xlabel("Count")
+            ax.set_ylabel("Chapter")
+            image_data = figure_to_bytes(fig, image_format)
+        charts.append(("chapter_count.png", "This graph shows how many questions came from each chapter. It helps you know which chapters need more study if they had lots of questions.", image_data))
 
         # 4. Countplot of level
-        fig, ax = plt.subplots(figsize=(6, 4))
-        sns.countplot(y="level", data=questions_df, ax=ax)
-        ax.set_title("Questions per Difficulty Level")
-        ax.set_xlabel("Count")
-        ax.set_ylabel("Level")
-        buffer = BytesIO()
-        fig.savefig(buffer, format="png", dpi=300, bbox_inches="tight")
-        plt.close(fig)
-        charts.append(("level_count.png", "This chart counts easy, medium, and hard questions. It shows which difficulty levels you faced most, so you can practice the tough ones.", buffer.getvalue()))
+        with chart_figure(figsize=(6, 4)) as (fig, ax):
+            sns.countplot(y="level", data=questions_df, ax=ax)
+            ax.set_title("Questions per Difficulty Level")
+            ax.set_xlabel("Count")
+            ax.set_ylabel("Level")
+            image_data = figure_to_bytes(fig, image_format)
+        charts.append(("level_count.png", "This chart counts easy, medium, and hard questions. It shows which difficulty levels you faced most, so you can practice the tough ones.", image_data))
 
         # 5. Countplot of status
-        fig, ax = plt.subplots(figsize=(6, 4))
-        sns.countplot(y="status", data=questions_df, ax=ax)
-        ax.set_title("Questions per Answer Status")
-        ax.set_xlabel("Count")
-        ax.set_ylabel("Status")
-        buffer = BytesIO()
-        fig.savefig(buffer, format="png", dpi=300, bbox_inches="tight")
-        plt.close(fig)
-        charts.append(("status_count.png", "This graph shows how many questions you got right, wrong, or skipped. Lots of skipped questions mean you might need to manage time better.", buffer.getvalue()))
+        with chart_figure(figsize=(6, 4)) as (fig, ax):
+            sns.countplot(y="status", data=questions_df, ax=ax)
+            ax.set_title("Questions per Answer Status")
+            ax.set_xlabel("Count")
+            ax.set_ylabel("Status")
+            image_data = figure_to_bytes(fig, image_format)
+        charts.append(("status_count.png", "This graph shows how many questions you got right, wrong, or skipped. Lots of skipped questions mean you might need to manage time better.", image_data))
 
         # 6. Lineplot timeTaken vs index
-        fig, ax = plt.subplots(figsize=(8, 4))
-        sns.lineplot(data=questions_df.reset_index(), x="index", y="timeTaken", ax=ax)
-        ax.set_title("Time Taken per Question Over Time")
-        ax.set_xlabel("Question Index")
-        ax.set_ylabel("Time Taken (s)")
-        buffer = BytesIO()
-        fig.savefig(buffer, format="png", dpi=300, bbox_inches="tight")
-        plt.close(fig)
-        charts.append(("time_taken_index.png", "This line shows how long each question took as you went through the test. If the line goes up, later questions took longer, suggesting tiredness or difficulty.", buffer.getvalue()))
+        with chart_figure(figsize=(8, 4)) as (fig, ax):
+            sns.lineplot(data=questions_df.reset_index(), x="index", y="timeTaken", ax=ax)
+            ax.set_title("Time Taken per Question Over Time")
+            ax.set_xlabel("Question Index")
+            ax.set_ylabel("Time Taken (s)")
+            image_data = figure_to_bytes(fig, image_format)
+        charts.append(("time_taken_index.png", "This line shows how long each question took as you went through the test. If the line goes up, later questions took longer, suggesting tiredness or difficulty.", image_data))
 
         # 7. Lineplot timeTaken by chapter
-        fig, ax = plt.subplots(figsize=(8, 4))
-        sns.lineplot(data=questions_df, x=questions_df.index, y="timeTaken", hue="chapter", legend=False, ax=ax)
-        ax.set_title("Time Taken by Chapter")
-        ax.set_xlabel("Question Index")
-        ax.set_ylabel("Time Taken (s)")
-        buffer = BytesIO()
-        fig.savefig(buffer, format="png", dpi=300, bbox_inches="tight")
-        plt.close(fig)
-        charts.append(("time_taken_chapter.png", "This graph shows time spent on questions from each chapter. High lines mean those chapters took longer, so practice them to get faster.", buffer.getvalue()))
+        with chart_figure(figsize=(8, 4)) as (fig, ax):
+            sns.lineplot(data=questions_df, x=questions_df.index, y="timeTaken", hue="chapter", palette=hue_palette(questions_df["chapter"]), legend=False, ax=ax)
+            ax.set_title("Time Taken by Chapter")
+            ax.set_xlabel("Question Index")
+            ax.set_ylabel("Time Taken (s)")
+            image_data = figure_to_bytes(fig, image_format)
+        charts.append(("time_taken_chapter.png", "This graph shows time spent on questions from each chapter. High lines mean those chapters took longer, so practice them to get faster.", image_data))
 
         # 8. Lineplot timeTaken by level
-        fig, ax = plt.subplots(figsize=(8, 4))
-        sns.lineplot(data=questions_df, x=questions_df.index, y="timeTaken", hue="level", legend=False, ax=ax)
-        ax.set_title("Time Taken by Difficulty Level")
-        ax.set_xlabel("Question Index")
-        ax.set_ylabel("Time Taken (s)")
-        buffer = BytesIO()
-        fig.savefig(buffer, format="png", dpi=300, bbox_inches="tight")
-        plt.close(fig)
-        charts.append(("time_taken_level.png", "This graph shows time spent on easy, medium, and hard questions. If hard questions have high lines, practice them to speed up.", buffer.getvalue()))
+        with chart_figure(figsize=(8, 4)) as (fig, ax):
+            sns.lineplot(data=questions_df, x=questions_df.index, y="timeTaken", hue="level", palette=hue_palette(questions_df["level"]), legend=False, ax=ax)
+            ax.set_title("Time Taken by Difficulty Level")
+            ax.set_xlabel("Question Index")
+            ax.set_ylabel("Time Taken (s)")
+            image_data = figure_to_bytes(fig, image_format)
+        charts.append(("time_taken_level.png", "This graph shows time spent on easy, medium, and hard questions. If hard questions have high lines, practice them to speed up.", image_data))
 
         # 9. Lineplot timeTaken by section
         if "section" in questions_df.columns:
-            fig, ax = plt.subplots(figsize=(8, 4))
-            sns.lineplot(data=questions_df, x=questions_df.index, y="timeTaken", hue="section", legend=False, ax=ax)
-            ax.set_title("Time Taken by Section")
-            ax.set_xlabel("Question Index")
-            ax.set_ylabel("Time Taken (s)")
-            buffer = BytesIO()
-            fig.savefig(buffer, format="png", dpi=300, bbox_inches="tight")
-            plt.close(fig)
-            charts.append(("time_taken_section.png", "This graph shows time spent on each test section. High lines mean you were slower in those sections, so practice to improve pacing.", buffer.getvalue()))
+            with chart_figure(figsize=(8, 4)) as (fig, ax):
+                sns.lineplot(data=questions_df, x=questions_df.index, y="timeTaken", hue="section", palette=hue_palette(questions_df["section"]), legend=False, ax=ax)
+                ax.set_title("Time Taken by Section")
+                ax.set_xlabel("Question Index")
+                ax.set_ylabel("Time Taken (s)")
+                image_data = figure_to_bytes(fig, image_format)
+            charts.append(("time_taken_section.png", "This graph shows time spent on each test section. High lines mean you were slower in those sections, so practice to improve pacing.", image_data))
 
         # 10. Heatmap: section vs chapter
         if "section" in questions_df.columns:
             heatmap_df1 = questions_df.pivot_table(index="section", columns="chapter", values="isCorrect", aggfunc="count", fill_value=0)
-            fig, ax = plt.subplots(figsize=(10, 6))
-            sns.heatmap(heatmap_df1, annot=True, fmt="d", cmap="YlOrRd", ax=ax)
-            ax.set_title("Section vs Chapter (Question Count)")
-            ax.set_ylabel("Section")
-            ax.set_xlabel("Chapter")
-            buffer = BytesIO()
-            fig.savefig(buffer, format="png", dpi=300, bbox_inches="tight")
-            plt.close(fig)
-            charts.append(("section_vs_chapter_heatmap.png", "This grid shows how many questions each section had from each chapter. Darker boxes mean more questions, guiding your study focus.", buffer.getvalue()))
+            with chart_figure(figsize=(10, 6)) as (fig, ax):
+                sns.heatmap(heatmap_df1, annot=True, fmt="d", cmap="YlOrRd", ax=ax)
+                ax.set_title("Section vs Chapter (Question Count)")
+                ax.set_ylabel("Section")
+                ax.set_xlabel("Chapter")
+                image_data = figure_to_bytes(fig, image_format)
+            charts.append(("section_vs_chapter_heatmap.png", "This grid shows how many questions each section had from each chapter. Darker boxes mean more questions, guiding your study focus.", image_data))
 
         # 11. Heatmap: chapter vs level
         heatmap_df2 = questions_df.pivot_table(index="chapter", columns="level", values="isCorrect", aggfunc="count", fill_value=0)
-        fig, ax = plt.subplots(figsize=(10, 8))
-        sns.heatmap(heatmap_df2, annot=True, fmt="d", cmap="YlOrRd", ax=ax)
-        ax.set_title("Chapter vs Level (Question Count)")
-        ax.set_ylabel("Chapter")
-        ax.set_xlabel("Level")
-        buffer = BytesIO()
-        fig.savefig(buffer, format="png", dpi=300, bbox_inches="tight")
-        plt.close(fig)
-        charts.append(("chapter_vs_level_heatmap.png", "This grid shows how many easy, medium, or hard questions each chapter had. Darker boxes highlight chapters with tough questions to practice.", buffer.getvalue()))
+        with chart_figure(figsize=(10, 8)) as (fig, ax):
+            sns.heatmap(heatmap_df2, annot=True, fmt="d", cmap="YlOrRd", ax=ax)
+            ax.set_title("Chapter vs Level (Question Count)")
+            ax.set_ylabel("Chapter")
+            ax.set_xlabel("Level")
+            image_data = figure_to_bytes(fig, image_format)
+        charts.append(("chapter_vs_level_heatmap.png", "This grid shows how many easy, medium, or hard questions each chapter had. Darker boxes highlight chapters with tough questions to practice.", image_data))
 
         # 12. Heatmap: level vs status
         heatmap_df3 = questions_df.pivot_table(index="level", columns="status", values="isCorrect", aggfunc="count", fill_value=0)
-        fig, ax = plt.subplots(figsize=(8, 6))
-        sns.heatmap(heatmap_df3, annot=True, fmt="d", cmap="YlOrRd", ax=ax)
-        ax.set_title("Level vs Status (Question Count)")
-        ax.set_ylabel("Level")
-        ax.set_xlabel("Status")
-        buffer = BytesIO()
-        fig.savefig(buffer, format="png", dpi=300, bbox_inches="tight")
-        plt.close(fig)
-        charts.append(("level_vs_status_heatmap.png", "This grid shows if easy, medium, or hard questions were right, wrong, or skipped. Darker boxes for wrong answers show where to improve.", buffer.getvalue()))
+        with chart_figure(figsize=(8, 6)) as (fig, ax):
+            sns.heatmap(heatmap_df3, annot=True, fmt="d", cmap="YlOrRd", ax=ax)
+            ax.set_title("Level vs Status (Question Count)")
+            ax.set_ylabel("Level")
+            ax.set_xlabel("Status")
+            image_data = figure_to_bytes(fig, image_format)
+        charts.append(("level_vs_status_heatmap.png", "This grid shows if easy, medium, or hard questions were right, wrong, or skipped. Darker boxes for wrong answers show where to improve.", image_data))
 
         # 13. Heatmap: status vs isCorrect
         heatmap_df4 = questions_df.pivot_table(index="status", columns="isCorrect", values="timeTaken", aggfunc="count", fill_value=0)
-        fig, ax = plt.subplots(figsize=(6, 4))
-        sns.heatmap(heatmap_df4, annot=True, fmt="d", cmap="YlOrRd", ax=ax)
-        ax.set_title("Status vs Correctness (Question Count)")
-        ax.set_ylabel("Status")
-        ax.set_xlabel("Correct")
-        buffer = BytesIO()
-        fig.savefig(buffer, format="png", dpi=300, bbox_inches="tight")
-        plt.close(fig)
-        charts.append(("status_vs_correctness_heatmap.png", "This grid shows if answered questions were correct or incorrect. Darker boxes for incorrect answers highlight areas to review.", buffer.getvalue()))
+        with chart_figure(figsize=(6, 4)) as (fig, ax):
+            sns.heatmap(heatmap_df4, annot=True, fmt="d", cmap="YlOrRd", ax=ax)
+            ax.set_title("Status vs Correctness (Question Count)")
+            ax.set_ylabel("Status")
+            ax.set_xlabel("Correct")
+            image_data = figure_to_bytes(fig, image_format)
+        charts.append(("status_vs_correctness_heatmap.png", "This grid shows if answered questions were correct or incorrect. Darker boxes for incorrect answers highlight areas to review.", image_data))
 
         # 14. Violinplot: section vs timeTaken
         if "section" in questions_df.columns:
-            fig, ax = plt.subplots(figsize=(8, 5))
-            sns.violinplot(data=questions_df, y="section", x="timeTaken", scale="width", ax=ax)
-            ax.set_title("Time Taken Distribution by Section")
-            ax.set_xlabel("Time Taken (s)")
-            ax.set_ylabel("Section")
-            buffer = BytesIO()
-            fig.savefig(buffer, format="png", dpi=300, bbox_inches="tight")
-            plt.close(fig)
-            charts.append(("section_vs_timeTaken_violin.png", "This chart shows time spent on questions in each section, with wider shapes for varied times. It helps you see where your pacing was uneven.", buffer.getvalue()))
+            with chart_figure(figsize=(8, 5)) as (fig, ax):
+                sns.violinplot(data=questions_df, y="section", x="timeTaken", scale="width", ax=ax)
+                ax.set_title("Time Taken Distribution by Section")
+                ax.set_xlabel("Time Taken (s)")
+                ax.set_ylabel("Section")
+                image_data = figure_to_bytes(fig, image_format)
+            charts.append(("section_vs_timeTaken_violin.png", "This chart shows time spent on questions in each section, with wider shapes for varied times. It helps you see where your pacing was uneven.", image_data))
 
         # 15. Violinplot: chapter vs timeTaken
-        fig, ax = plt.subplots(figsize=(8, 10))
-        sns.violinplot(data=questions_df, y="chapter", x="timeTaken", scale="width", ax=ax)
-        ax.set_title("Time Taken Distribution by Chapter")
-        ax.set_xlabel("Time Taken (s)")
-        ax.set_ylabel("Chapter")
-        buffer = BytesIO()
-        fig.savefig(buffer, format="png", dpi=300, bbox_inches="tight")
-        plt.close(fig)
-        charts.append(("chapter_vs_timeTaken_violin.png", "This chart shows time spent on questions from each chapter, with wider shapes for varied times. It highlights chapters where you were slower.", buffer.getvalue()))
+        with chart_figure(figsize=(8, 10)) as (fig, ax):
+            sns.violinplot(data=questions_df, y="chapter", x="timeTaken", scale="width", ax=ax)
+            ax.set_title("Time Taken Distribution by Chapter")
+            ax.set_xlabel("Time Taken (s)")
+            ax.set_ylabel("Chapter")
+            image_data = figure_to_bytes(fig, image_format)
+        charts.append(("chapter_vs_timeTaken_violin.png", "This chart shows time spent on questions from each chapter, with wider shapes for varied times. It highlights chapters where you were slower.", image_data))
 
         # 16. Violinplot: level vs timeTaken
-        fig, ax = plt.subplots(figsize=(8, 5))
-        sns.violinplot(data=questions_df, y="level", x="timeTaken", scale="width", ax=ax)
-        ax.set_title("Time Taken Distribution by Level")
-        ax.set_xlabel("Time Taken (s)")
-        ax.set_ylabel("Level")
-        buffer = BytesIO()
-        fig.savefig(buffer, format="png", dpi=300, bbox_inches="tight")
-        plt.close(fig)
-        charts.append(("level_vs_timeTaken_violin.png", "This chart shows time spent on easy, medium, and hard questions, with wider shapes for varied times. It shows which difficulty levels slowed you down.", buffer.getvalue()))
+        with chart_figure(figsize=(8, 5)) as (fig, ax):
+            sns.violinplot(data=questions_df, y="level", x="timeTaken", scale="width", ax=ax)
+            ax.set_title("Time Taken Distribution by Level")
+            ax.set_xlabel("Time Taken (s)")
+            ax.set_ylabel("Level")
+            image_data = figure_to_bytes(fig, image_format)
+        charts.append(("level_vs_timeTaken_violin.png", "This chart shows time spent on easy, medium, and hard questions, with wider shapes for varied times. It shows which difficulty levels slowed you down.", image_data))
 
         # 17. Violinplot: status vs timeTaken
-        fig, ax = plt.subplots(figsize=(8, 5))
-        sns.violinplot(data=questions_df, y="status", x="timeTaken", scale="width", ax=ax)
-        ax.set_title("Time Taken Distribution by Status")
-        ax.set_xlabel("Time Taken (s)")
-        ax.set_ylabel("Status")
-        buffer = BytesIO()
-        fig.savefig(buffer, format="png", dpi=300, bbox_inches="tight")
-        plt.close(fig)
-        charts.append(("status_vs_timeTaken_violin.png", "This chart shows time spent on correct, incorrect, or skipped questions, with wider shapes for varied times. It highlights if wrong answers took too long.", buffer.getvalue()))
+        with chart_figure(figsize=(8, 5)) as (fig, ax):
+            sns.violinplot(data=questions_df, y="status", x="timeTaken", scale="width", ax=ax)
+            ax.set_title("Time Taken Distribution by Status")
+            ax.set_xlabel("Time Taken (s)")
+            ax.set_ylabel("Status")
+            image_data = figure_to_bytes(fig, image_format)
+        charts.append(("status_vs_timeTaken_violin.png", "This chart shows time spent on correct, incorrect, or skipped questions, with wider shapes for varied times. It highlights if wrong answers took too long.", image_data))
 
     except Exception as e:
-        st.error(f"Error generating charts: {str(e)}")
+        (on_warning or st.error)(f"Error generating charts: {str(e)}")
     
     return charts
 
-def get_gemini_chapters(json_data):
-    """Extract chapters with subject bifurcation using Gemini or fallback"""
+def extract_chapter_source(json_data):
+    """Keep only the fields get_gemini_chapters reads: syllabus, subject IDs and chapter titles
+
+    Chapter extraction only collects unique (subject, chapter) pairs, so one question is kept
+    per distinct subject and chapter list.
+    """
+    questions = {}
+    for section in json_data.get("sections", []):
+        for q in section.get("questions", []):
+            subject_id = q.get("subjectId", {})
+            titles = tuple(chapter.get("title", "") for chapter in q.get("questionId", {}).get("chapters", []))
+            questions.setdefault((json.dumps(subject_id, sort_keys=True, default=str), titles), {
+                "subjectId": subject_id,
+                "questionId": {"chapters": [{"title": title} for title in titles]}
+            })
+    return {
+        "test": {"syllabus": json_data.get("test", {}).get("syllabus", "")},
+        "sections": [{"questions": list(questions.values())}]
+    }
+
+def get_gemini_chapters(json_data, on_warning=None):
+    """Extract chapters with subject bifurcation using Gemini or fallback; on_warning receives fallback notices"""
+    warn = on_warning or st.warning
     syllabus = json_data.get("test", {}).get("syllabus", "")
     sections = json_data.get("sections", [])
     subject_map = {
@@ -409,14 +453,14 @@ Extract all unique chapter titles and associate them with their subject (Physics
         try:
             chapter_dict = json.loads(response.text.strip("```json\n").strip("\n```"))
         except json.JSONDecodeError as e:
-            st.warning(f"Gemini returned invalid JSON: {str(e)}. Falling back to manual chapter extraction.")
+            warn(f"Gemini returned invalid JSON: {str(e)}. Falling back to manual chapter extraction.")
             chapter_dict = {"Physics": [], "Chemistry": [], "Mathematics": []}
         for subject in ["Physics", "Chemistry", "Mathematics"]:
             if subject not in chapter_dict:
                 chapter_dict[subject] = []
             chapter_dict[subject] = sorted(list(set(chapter_dict[subject])))
     except Exception as e:
-        st.warning(f"Gemini chapter extraction failed: {str(e)}. Falling back to manual chapter extraction.")
+        warn(f"Gemini chapter extraction failed: {str(e)}. Falling back to manual chapter extraction.")
         chapter_dict = {"Physics": [], "Chemistry": [], "Mathematics": []}
     
     # Fallback chapter extraction
@@ -456,8 +500,9 @@ Extract all unique chapter titles and associate them with their subject (Physics
         chapter_dict[subject] = sorted(list(set(chapter_dict[subject])))
     return chapter_dict
 
-def generate_feedback(questions_df, subject_data, chapter_dict, test_info, student_name="Student"):
-    """Generate personalized feedback using Gemini or fallback"""
+def generate_feedback(questions_df, subject_data, chapter_dict, test_info, student_name="Student", progress_text=None,
+                      on_warning=None):
+    """Generate personalized feedback using Gemini or fallback; on_warning receives the Gemini error"""
     total = len(questions_df)
     correct = questions_df["isCorrect"].sum()
     accuracy = (correct / total) * 100 if total > 0 else 0
@@ -494,6 +539,11 @@ def generate_feedback(questions_df, subject_data, chapter_dict, test_info, stude
     slow_questions = questions_df[questions_df["timeTaken"] > questions_df["timeTaken"].quantile(0.75)]
     slow_acc = slow_questions["isCorrect"].mean() * 100 if not slow_questions.empty else 0
 
+    progress_data = f"\n- Progress Across Earlier Tests:\n{progress_text}" if progress_text else ""
+    progress_instruction = "\n  - **Progress Over Time**: Compare with earlier tests, naming chapters that improved or declined." if progress_text else ""
+    progress_heading = "\n#### Progress Over Time\n..." if progress_text else ""
+    progress_fallback = f"\n#### Progress Over Time\n{progress_text}\n" if progress_text else ""
+
     prompt = f"""
 You are an expert educational assistant creating a personalized feedback report for {student_name} based on their performance in {test_info['name']} ({test_info['date']}). Use the provided data to craft a motivating, data-driven narrative with highly specific, chapter-focused actionable suggestions. Avoid generic advice.
 
@@ -513,7 +563,7 @@ You are an expert educational assistant creating a personalized feedback report
 - Chapter-wise Performance:
 {chapter_summary_text}
 - Chapters by Subject:
-{json.dumps(chapter_dict, indent=2)}
+{json.dumps(chapter_dict, indent=2)}{progress_data}
 
 **Instructions**:
 - **Intro (100–150 words)**: Greet {student_name}, acknowledge effort, highlight strengths (e.g., strongest chapter), and encourage improvement in weaker chapters.
@@ -522,7 +572,7 @@ You are an expert educational assistant creating a personalized feedback report
   - **Chapter-wise**: Analyze performance by chapter, focusing on weakest and strongest chapters per subject, and identify patterns (e.g., low accuracy or high time).
   - **Difficulty-wise**: Evaluate accuracy and time across difficulty levels (easy, medium, hard).
   - **Time vs. Accuracy**: Analyze time spent vs. accuracy, noting trends (e.g., slower questions with lower accuracy).
-  - **Overall Metrics**: Summarize marks, time utilization, and accuracy.
+  - **Overall Metrics**: Summarize marks, time utilization, and accuracy.{progress_instruction}
 - **Actionable Suggestions (200–250 words)**: Generate 4–5 specific, data-driven suggestions per subject (Physics, Chemistry, Mathematics), focusing on chapters:
   - Each suggestion must:
     - Start with '-'.
@@ -544,7 +594,7 @@ You are an expert educational assistant creating a personalized feedback report
 #### Time and Accuracy Insights
 ...
 #### Overall Metrics
-...
+...{progress_heading}
 ### Actionable Suggestions
 **Physics:**
 - ...
@@ -561,7 +611,7 @@ You are an expert educational assistant creating a personalized feedback report
             raise ValueError("Gemini returned empty feedback")
         return sanitize_text(feedback_text)
     except Exception as e:
-        st.error(f"Gemini API Error: {str(e)}")
+        (on_warning or st.error)(f"Gemini API Error: {str(e)}")
         suggestions = []
         for subject in ["Physics", "Chemistry", "Mathematics"]:
             subject_chapters = chapter_summary[chapter_summary["subject"] == subject]
@@ -602,16 +652,121 @@ Dear {student_name}, great effort on {test_info['name']}! Your performance in {s
 #### Overall Metrics
 - Marks: {correct * (test_info['total_marks'] / test_info['total_questions']):.2f}/{test_info['total_marks']}
 - Accuracy: {accuracy:.2f}%
-
+{progress_fallback}
 ### Actionable Suggestions
 {suggestions_text}
 """
         return sanitize_text(fallback)
 
+def format_column(values):
+    """Cell strings for a whole column: floats to two decimals, everything else via str()"""
+    values = np.asarray(values)
+    if values.dtype.kind == "f":
+        return np.char.mod("%.2f", values)
+    if values.dtype.kind == "O":
+        return np.array([f"{value:.2f}" if isinstance(value, (float, np.floating)) else str(value) for value in values], dtype=str)
+    return values.astype(str)
+
+# Core fonts registered up front in this order, so font numbers agree between every report and
+# the scratch pages static blocks are recorded on; Courier only serves as the recording sentinel
+REPORT_FONTS = [("Courier", ""), ("Helvetica", "I"), ("Helvetica", "B"), ("Helvetica", "")]
+
+class StaticBlock:
+    """Content stream of a block whose output never varies, recorded once and replayed at any height"""
+
+    def __init__(self, draw, args, ops, top, advance, end_x, state, fonts):
+        self.draw = draw
+        self.args = args
+        self.ops = ops
+        self.top = top
+        self.advance = advance
+        self.end_x = end_x
+        self.state = state
+        self.fonts = fonts
+
+    @classmethod
+    def record(cls, draw, args):
+        """Draw the block at the top of a scratch page and keep the content it emitted"""
+        scratch = PDF()
+        scratch.add_page()
+        # Sentinel state, so every setting the block relies on is emitted inside its own stream
+        scratch.set_font("Courier", "", 1)
+        scratch.set_text_color(1, 2, 3)
+        scratch.set_fill_color(1, 2, 3)
+        scratch.set_draw_color(1, 2, 3)
+        scratch.set_line_width(0.01)
+        contents = scratch.pages[scratch.page].contents
+        start, top = len(contents), scratch.y
+        draw(scratch, *args)
+        ops = bytes(contents[start:])
+        fonts = {int(i): scratch.fonts_by_index[int(i)] for i in re.findall(rb"/F(\d+) ", ops)}
+        state = (scratch.font_family, scratch.font_style, scratch.font_size_pt,
+                 scratch.text_color, scratch.fill_color, scratch.draw_color, scratch.line_width)
+        return cls(draw, args, ops, top, scratch.y - top, scratch.x, state, fonts)
+
+    def replay(self, pdf):
+        """Append the recorded stream moved to pdf's current position, then leave pdf in the block's end state"""
+        if any(pdf.fonts_by_index.get(i) != key for i, key in self.fonts.items()):
+            self.draw(pdf, *self.args)
+            return
+        # PDF space grows upwards: moving the block down the page is a negative translation
+        pdf._out(b"q 1 0 0 1 0 %.2f cm\n%bQ" % ((self.top - pdf.y) * pdf.k, self.ops))
+        for i in self.fonts:
+            pdf._resource_catalog.add(PDFResourceType.FONT, i, pdf.page)
+        # q/Q restored the graphics state the document had, which is also what FPDF still tracks
+        family, style, size, text_color, fill_color, draw_color, line_width = self.state
+        pdf.set_font(family, style, size)
+        pdf.set_text_color(text_color)
+        pdf.set_fill_color(fill_color)
+        pdf.set_draw_color(draw_color)
+        pdf.set_line_width(line_width)
+        pdf.set_xy(self.end_x, pdf.y + self.advance)
+
+class StaticBlocks:
+    """The static blocks of one report template, each recorded the first time a report draws it"""
+
+    def __init__(self):
+        self._blocks = {}
+        self._lock = threading.Lock()
+
+    def get(self, draw, args):
+        key = (draw.__name__, args)
+        block = self._blocks.get(key)
+        if block is None:
+            with self._lock:
+                block = self._blocks.get(key)
+                if block is None:
+                    block = self._blocks[key] = StaticBlock.record(draw, args)
+        return block
+
+    def __len__(self):
+        return len(self._blocks)
+
 class PDF(FPDF):
-    def __init__(self, logo_path=None):
+    def __init__(self, logo_path=None, blocks=None):
         super().__init__()
         self.logo_path = logo_path
+        # StaticBlocks of the report's template; None draws every block from scratch
+        self.blocks = blocks
+        for family, style in REPORT_FONTS:
+            self.set_font(family, style)
+
+    @property
+    def fonts_by_index(self):
+        return {font.i: key for key, font in self.fonts.items()}
+
+    def static_block(self, fit, draw, *args):
+        """Draw a block whose output depends only on args, replaying it when the document has a template
+
+        fit is the height that has to fit on the page before the block starts, as for FPDF.cell.
+        """
+        if self.blocks is None:
+            draw(self, *args)
+            return
+        block = self.blocks.get(draw, args)
+        if self.will_page_break(fit):
+            self.add_page()
+        block.replay(self)
 
     def header(self):
         if self.page_no() > 1:
@@ -629,6 +784,9 @@ class PDF(FPDF):
         self.cell(0, 10, f"Page {self.page_no() - 1}", align="C", ln=1)
 
     def section_title(self, title):
+        self.static_block(8, PDF._section_title, title)
+
+    def _section_title(self, title):
         self.set_fill_color(240, 245, 255)
         self.set_font("Helvetica", "B", 14)
         self.set_text_color(33, 102, 172)
@@ -636,41 +794,152 @@ class PDF(FPDF):
         self.ln(4)
 
     def plain_section_title(self, title):
+        self.static_block(8, PDF._plain_section_title, title)
+
+    def _plain_section_title(self, title):
         self.set_font("Helvetica", "", 14)
         self.set_text_color(40, 40, 40)
         self.cell(0, 8, title, align="L", ln=1)
         self.ln(6)
 
     def subtitle(self, title):
+        self.static_block(6, PDF._subtitle, title)
+
+    def _subtitle(self, title):
         self.set_font("Helvetica", "B", 11)
         self.set_text_color(60, 60, 120)
         self.cell(0, 6, title, align="L", ln=1)
         self.ln(2)
 
-    def add_table(self, data, headers, widths, headers_map, title=""):
-        if title:
-            self.subtitle(title)
+    def _char_widths(self, strings):
+        """Per-character widths of a 1-D str array in the current core font, one row per string"""
+        if strings.size == 0 or strings.dtype.itemsize == 0:
+            return np.zeros((len(strings), 0))
+        char_widths = np.array([self.current_font.cw.get(chr(code), 0) for code in range(256)], dtype=float)
+        char_widths[0] = 0  # NumPy pads shorter strings with NUL
+        codes = strings.view(np.uint32).reshape(len(strings), -1)
+        # Core fonts only cover Latin-1; anything beyond is measured like "?"
+        codes = np.where(codes > 255, ord("?"), codes)
+        return char_widths[codes] * self.font_size / 1000
+
+    def string_widths(self, strings):
+        """Widths of many strings in the current core font, computed in one NumPy pass"""
+        return self._char_widths(np.ascontiguousarray(strings, dtype=str)).sum(axis=1)
+
+    def fit_strings(self, strings, width):
+        """Strings cut short with "..." where they are wider than width (one per string or shared),
+        and their widths"""
+        strings = np.ascontiguousarray(strings, dtype=str)
+        char_widths = self._char_widths(strings)
+        text_widths = char_widths.sum(axis=1)
+        width = np.broadcast_to(width, text_widths.shape)
+        over = np.flatnonzero(text_widths > width)
+        if len(over) == 0:
+            return strings, text_widths
+        # Characters that fit in front of the ellipsis, from the running widths of every overflowing string
+        room = width[over, None] - self.get_string_width("...")
+        keep = (np.cumsum(char_widths[over], axis=1) <= room).sum(axis=1)
+        strings = strings.astype(object)
+        strings[over] = [strings[i][:n].rstrip() + "..." for i, n in zip(over, keep)]
+        text_widths[over] = self.string_widths(strings[over].astype(str))
+        return strings, text_widths
+
+    def cover_title(self):
+        self.static_block(20, PDF._cover_title)
+
+    def _cover_title(self):
+        self.set_font("Arial", "B", 24)
+        self.set_text_color(33, 102, 172)
+        self.cell(0, 20, "[Book] Student Performance Report", align="C", ln=1)
+        self.ln(60)
+
+    def cover_credit(self):
+        self.static_block(10, PDF._cover_credit)
+
+    def _cover_credit(self):
+        self.set_font("Arial", "", 12)
+        self.set_text_color(60, 60, 60)
+        self.cell(0, 10, "Generated by MathonGo AI", align="C", ln=1)
+
+    def _table_header(self, headers, widths):
+        self.static_block(8, PDF._draw_table_header, tuple(headers), tuple(widths))
+
+    def _draw_table_header(self, headers, widths):
         self.set_font("Helvetica", "B", 9)
         self.set_fill_color(230, 230, 230)
         self.set_draw_color(160, 160, 160)
-        for header in headers:
-            self.cell(widths[headers.index(header)], 8, header, border=1, align="C", fill=True)
+        self.set_line_width(0.3)
+        self.set_text_color(40, 40, 40)
+        for header, width in zip(headers, widths):
+            self.cell(width, 8, header, border=1, align="C", fill=True)
         self.ln()
         self.set_font("Helvetica", "", 8)
-        for i, row in data.iterrows():
-            fill_color = (255, 255, 255) if i % 2 == 0 else (250, 250, 250)
-            self.set_fill_color(*fill_color)
-            for header, width in zip(headers, widths):
-                col_key = headers_map.get(header, header)
-                if col_key not in data.columns:
-                    value = "N/A"
-                else:
-                    value = row[col_key]
-                    value = f"{value:.2f}" if isinstance(value, (float, np.floating)) else str(value)
-                self.cell(width, 7, value, border=1, align="C", fill=True)
-            self.ln()
+
+    def add_table(self, data, headers, widths=None, headers_map=None, title=""):
+        """Draw a table from a DataFrame or a dict of column arrays
+
+        Every column is formatted in one vectorized pass, widths are derived from the content
+        when not given, and the header row is repeated after each page break. Rows are drawn as
+        one filled rectangle plus text runs, with column rules added once per page. Values
+        and headers wider than their column are cut short with "...".
+        """
+        headers_map = headers_map or {}
+        if title:
+            self.subtitle(title)
+        keys = [headers_map.get(header, header) for header in headers]
+        n_rows = len(data) if isinstance(data, pd.DataFrame) else len(next(iter(data.values()), []))
+        cells = [format_column(data[key]) if key in data else np.full(n_rows, "N/A") for key in keys]
+        self.set_font("Helvetica", "", 8)
+        text_widths = [self.string_widths(column) for column in cells]
+        if widths is None:
+            widths = self._content_widths(headers, text_widths)
+        room = np.asarray(widths) - 2 * self.c_margin
+        cells, text_widths = zip(*(
+            self.fit_strings(column, room[i]) if len(column) and text_widths[i].max() > room[i] else (column, text_widths[i])
+            for i, column in enumerate(cells)
+        ))
+        self.set_font("Helvetica", "B", 9)
+        headers = [str(header) for header in self.fit_strings(headers, room)[0]]
+        self.set_font("Helvetica", "", 8)
+        self._table_header(headers, widths)
+        edges = self.l_margin + np.concatenate(([0], np.cumsum(widths)))
+        x_text = [edges[i] + (widths[i] - text_widths[i]) / 2 for i in range(len(widths))]
+        row_height = 7
+        baseline = row_height / 2 + 0.3 * self.font_size
+        segment_top = self.y
+        for row in range(n_rows):
+            if self.will_page_break(row_height):
+                self._column_rules(edges, segment_top, self.y)
+                self.add_page()
+                self._table_header(headers, widths)
+                segment_top = self.y
+            y = self.y
+            self.set_fill_color(*((255, 255, 255) if row % 2 == 0 else (250, 250, 250)))
+            self.rect(edges[0], y, edges[-1] - edges[0], row_height, style="DF")
+            for column, x in zip(cells, x_text):
+                self.text(x[row], y + baseline, column[row])
+            self.set_y(y + row_height)
+        self._column_rules(edges, segment_top, self.y)
         self.ln(6)
 
+    def _column_rules(self, edges, top, bottom):
+        for x in edges[1:-1]:
+            self.line(x, top, x, bottom)
+
+    def _content_widths(self, headers, text_widths):
+        """Column widths that fit the widest value or header, scaled down to the page width"""
+        self.set_font("Helvetica", "B", 9)
+        header_widths = self.string_widths(headers)
+        self.set_font("Helvetica", "", 8)
+        padding = 2 * self.c_margin + 2
+        widths = np.array([
+            max(header_widths[i], column.max() if len(column) else 0) + padding
+            for i, column in enumerate(text_widths)
+        ])
+        if widths.sum() > self.epw:
+            widths *= self.epw / widths.sum()
+        return widths.tolist()
+
     def add_image(self, image_data, caption, description):
         try:
             if isinstance(image_data, bytes):
@@ -691,7 +960,7 @@ class PDF(FPDF):
                 self.multi_cell(0, 6, f"[Image Missing: {caption}]")
             self.ln(6)
         except Exception as e:
-            st.error(f"Image error: {str(e)}")
+            # Reported in the document itself: this also runs on report worker threads and processes
             self.set_font("Helvetica", "", 10)
             self.set_text_color(255, 0, 0)
             self.multi_cell(0, 6, f"[Image Error: {str(e)}]")
@@ -725,23 +994,126 @@ class PDF(FPDF):
                 self.multi_cell(0, 6, f"* {line}")
                 self.ln(1)
 
-def generate_analysis_pdf(questions_df, subject_data, feedback_sections, chapter_dict, image_list, test_info, student_name="Student"):
-    """Generate a comprehensive PDF report"""
-    pdf = PDF(logo_path=None)  # No logo for simplicity in Streamlit
-    pdf.set_auto_page_break(auto=True, margin=15)
+# Fixed creation date (SOURCE_DATE_EPOCH when set) so identical inputs give byte-identical PDFs
+REPORT_CREATION_DATE = datetime.fromtimestamp(int(os.environ.get("SOURCE_DATE_EPOCH", "0")), timezone.utc)
+
+CHAPTER_TABLE_COLUMNS = ["Chapter", "Questions", "Correct", "Accuracy (%)", "Avg Time (s)"]
+SUBJECT_TABLE_HEADERS = {
+    "Subject": "Subject",
+    "Correct": "TotalCorrect",
+    "Attempted": "TotalAttempted",
+    "Accuracy (%)": "Accuracy",
+    "Time (s)": "TotalTimeTaken"
+}
+PERFORMANCE_SECTIONS = [
+    ("Subject-wise Analysis", "subject_breakdown"),
+    ("Chapter-wise Analysis", "chapter_breakdown"),
+    ("Difficulty-wise Analysis", "difficulty_breakdown"),
+    ("Time vs. Accuracy", "time_breakdown"),
+    ("Overall Metrics", "overall_breakdown"),
+    ("Progress Over Time", "progress_breakdown")
+]
+
+class ReportTemplate:
+    """Test-level structure of a report, built once and reused for every student who sat the test
+
+    Static blocks (cover title and credit, section titles, subtitles and table headers) are
+    recorded once as PDF content and replayed into each student's document, so per report only
+    the student's values are laid out. The chapter table gets one set of column widths for the
+    whole test, which keeps its header block shared too. Everyone who sat a test answered the
+    same questions, so per-student chapter tables become a bincount over precomputed chapter
+    codes instead of a pandas groupby per report.
+    """
 
-    # Cover Page
-    pdf.add_page()
-    pdf.set_font("Arial", "B", 24)
-    pdf.set_text_color(33, 102, 172)
-    pdf.cell(0, 20, "[Book] Student Performance Report", align="C", ln=1)
-    pdf.ln(60)
-    pdf.set_font("Arial", "B", 16)
-    pdf.set_text_color(60, 60, 60)
-    pdf.cell(0, 10, f"{test_info['name']} - {test_info['date']}", align="C", ln=1)
+    def __init__(self, test_info, questions_df, record_blocks=True):
+        self.test_name = test_info['name']
+        self.duration = test_info['duration']
+        self.title = f"Student Performance Report - {test_info['name']}"
+        self.chapters = pd.Index(sorted(questions_df["chapter"].dropna().unique()))
+        self.chapter_questions = questions_df["chapter"].value_counts()
+        # A one-off template draws its blocks directly: recording them would cost more than it saves
+        self.blocks = StaticBlocks() if record_blocks else None
+        self._chapter_widths = None
+
+    def chapter_widths(self, pdf):
+        """Chapter table column widths fitting every chapter of the test and the widest values a student can reach"""
+        if self._chapter_widths is None:
+            pdf.set_font("Helvetica", "", 8)
+            most_questions = str(self.chapter_questions.max() if len(self.chapter_questions) else 0)
+            values = [self.chapters.astype(str), [most_questions], [most_questions], ["100.00"], [f"{self.duration:.2f}"]]
+            self._chapter_widths = pdf._content_widths(CHAPTER_TABLE_COLUMNS, [pdf.string_widths(v) for v in values])
+        return self._chapter_widths
+
+    def new_document(self, test_date="N/A"):
+        """A PDF with the metadata and the cover page laid out; test_date is the student's attempt date"""
+        pdf = PDF(logo_path=None, blocks=self.blocks)  # No logo for simplicity in Streamlit
+        pdf.set_auto_page_break(auto=True, margin=15)
+        pdf.set_creation_date(REPORT_CREATION_DATE)
+        pdf.set_title(self.title)
+        pdf.set_author("MathonGo AI")
+        pdf.set_creator("Student Performance Analysis Dashboard")
+
+        # Cover Page
+        pdf.add_page()
+        pdf.cover_title()
+        pdf.set_font("Arial", "B", 16)
+        pdf.set_text_color(60, 60, 60)
+        pdf.cell(0, 10, f"{self.test_name} - {test_date}", align="C", ln=1)
+        return pdf
+
+    def chapter_summary(self, questions_df):
+        """Per-chapter counts, accuracy and average time, or None when a chapter is not in the index"""
+        codes = self.chapters.get_indexer(questions_df["chapter"])
+        if (codes < 0).any():
+            return None
+        n_chapters = len(self.chapters)
+        questions = np.bincount(codes, minlength=n_chapters)
+        correct = np.bincount(codes, weights=questions_df["isCorrect"].to_numpy(dtype=float), minlength=n_chapters)
+        time_taken = np.bincount(codes, weights=questions_df["timeTaken"].to_numpy(dtype=float), minlength=n_chapters)
+        present = questions > 0
+        return pd.DataFrame({
+            "Chapter": self.chapters[present],
+            "Questions": questions[present],
+            "Correct": correct[present].astype(int),
+            "Accuracy (%)": correct[present] / questions[present] * 100,
+            "Avg Time (s)": time_taken[present] / questions[present]
+        })
+
+_report_templates = {}
+
+# test_info also carries the student's attempt date, which must not split the cache per student
+TEMPLATE_KEY_FIELDS = ("test_id", "name", "total_questions", "total_marks", "duration")
+
+def report_template(test_info, questions_df):
+    """Template for a test, shared by every report of that test built in this process"""
+    key = json.dumps([test_info.get(field) for field in TEMPLATE_KEY_FIELDS], default=str)
+    template = _report_templates.get(key)
+    if template is None:
+        if len(_report_templates) >= 32:
+            _report_templates.clear()
+        template = _report_templates[key] = ReportTemplate(test_info, questions_df)
+    return template
+
+def chapter_summary_table(questions_df, template=None):
+    """Chapter-wise table for the PDF, sorted by accuracy"""
+    chapter_summary = template.chapter_summary(questions_df) if template is not None else None
+    if chapter_summary is None:
+        chapter_summary = questions_df.groupby(["chapter"]).agg({
+            "isCorrect": ["count", "sum", "mean"],
+            "timeTaken": ["mean"]
+        }).reset_index()
+        chapter_summary.columns = CHAPTER_TABLE_COLUMNS
+        chapter_summary["Accuracy (%)"] = chapter_summary["Accuracy (%)"] * 100
+    return chapter_summary.sort_values(by=["Accuracy (%)"], ascending=[False], kind="stable")
+
+def generate_analysis_pdf(questions_df, subject_data, feedback_sections, chapter_dict, image_list, test_info, student_name="Student", percentiles=None, template=None):
+    """Generate a comprehensive PDF report; a ReportTemplate for the test skips the static layout work"""
+    if template is None:
+        template = ReportTemplate(test_info, questions_df, record_blocks=False)
+    pdf = template.new_document(test_info['date'])
     pdf.set_font("Arial", "", 12)
     pdf.cell(0, 10, f"For: {student_name}", align="C", ln=1)
-    pdf.cell(0, 10, "Generated by MathonGo AI", align="C", ln=1)
+    pdf.cover_credit()
 
     # Summary Statistics
     pdf.add_page()
@@ -766,6 +1138,17 @@ def generate_analysis_pdf(questions_df, subject_data, feedback_sections, chapter
         pdf.multi_cell(0, 6, stat)
         pdf.ln(4)
 
+    # Cohort percentile ranks
+    percentile_df = percentile_table(percentiles)
+    if not percentile_df.empty:
+        pdf.add_table(
+            data=percentile_df,
+            headers=["Metric", "Percentile"],
+            widths=[130, 40],
+            headers_map={"Metric": "Metric", "Percentile": "Percentile"},
+            title=f"Cohort Percentile Ranks ({percentiles['cohort_size']} students)"
+        )
+
     # Personalized Feedback
     pdf.section_title("2. Personalized Feedback")
     pdf.set_font("Arial", "", 10)
@@ -779,14 +1162,8 @@ def generate_analysis_pdf(questions_df, subject_data, feedback_sections, chapter
     # Performance Breakdown
     pdf.section_title("3. Performance Analysis")
     pdf.set_font("Arial", "", 10)
-    for section, key in [
-        ("Subject-wise Analysis", "subject_breakdown"),
-        ("Chapter-wise Analysis", "chapter_breakdown"),
-        ("Difficulty-wise Analysis", "difficulty_breakdown"),
-        ("Time vs. Accuracy", "time_breakdown"),
-        ("Overall Metrics", "overall_breakdown")
-    ]:
-        text = sanitize_text(feedback_sections[key])
+    for section, key in PERFORMANCE_SECTIONS:
+        text = sanitize_text(feedback_sections.get(key, ""))
         if text.strip():
             pdf.subtitle(section)
             pdf.multi_cell(0, 5, text)
@@ -794,16 +1171,10 @@ def generate_analysis_pdf(questions_df, subject_data, feedback_sections, chapter
 
     # Subject-wise table
     pdf.add_table(
-        data=subject_data[["Subject", "TotalCorrect", "TotalAttempted", "Accuracy", "TotalTimeTaken"]],
-        headers=["Subject", "Correct", "Attempted", "Accuracy (%)", "Time (s)"],
+        data=subject_data,
+        headers=list(SUBJECT_TABLE_HEADERS),
         widths=[50, 30, 30, 30, 30],
-        headers_map={
-            "Subject": "Subject",
-            "Correct": "TotalCorrect",
-            "Attempted": "TotalAttempted",
-            "Accuracy (%)": "Accuracy",
-            "Time (%)": "TotalTimeTaken"
-        },
+        headers_map=SUBJECT_TABLE_HEADERS,
         title="Subject-wise Performance"
     )
 
@@ -813,19 +1184,13 @@ def generate_analysis_pdf(questions_df, subject_data, feedback_sections, chapter
 
     # Chapter-wise Analysis
     pdf.section_title("5. Chapter-wise Analysis")
-    chapter_summary = questions_df.groupby(["chapter"]).agg({
-        "isCorrect": ["count", "sum", "mean"],
-        "timeTaken": ["mean"]
-    }).reset_index()
-    chapter_summary.columns = ["Chapter", "Questions", "Correct", "Accuracy (%)", "Avg Time (s)"]
-    chapter_summary["Accuracy (%)"] = chapter_summary["Accuracy (%)"] * 100
-    chapter_summary = chapter_summary.sort_values(by=["Accuracy (%)"], ascending=[False])
+    chapter_summary = chapter_summary_table(questions_df, template)
 
     if not chapter_summary.empty:
         pdf.add_table(
             data=chapter_summary,
-            headers=["Chapter", "Questions", "Correct", "Accuracy (%)", "Avg Time (s)"],
-            widths=[60, 30, 30, 30, 30],
+            headers=CHAPTER_TABLE_COLUMNS,
+            widths=template.chapter_widths(pdf),
             headers_map={
                 "Chapter": "Chapter",
                 "Questions": "Questions",
@@ -855,6 +1220,368 @@ def generate_analysis_pdf(questions_df, subject_data, feedback_sections, chapter
     pdf_buffer.seek(0)
     return pdf_buffer.getvalue()
 
+HTML_REPORT_STYLE = """
+body { font-family: Helvetica, Arial, sans-serif; color: #282828; max-width: 900px; margin: 0 auto; padding: 1.5rem; }
+h1 { color: #2166ac; text-align: center; }
+.cover { text-align: center; color: #3c3c3c; margin-bottom: 2rem; }
+h2 { color: #2166ac; background: #f0f5ff; padding: 0.3rem 0.6rem; margin-top: 2rem; }
+h3 { color: #3c3c78; font-size: 1rem; }
+table { border-collapse: collapse; margin: 0.5rem 0 1.5rem; font-size: 0.85rem; }
+th, td { border: 1px solid #a0a0a0; padding: 0.3rem 0.7rem; text-align: center; }
+th { background: #e6e6e6; }
+tr:nth-child(even) td { background: #fafafa; }
+figure { margin: 1.5rem 0; }
+figure svg { max-width: 100%; height: auto; }
+figcaption { font-style: italic; color: #5a5a5a; text-align: center; }
+"""
+
+def html_table(data, headers, headers_map=None, title=""):
+    """HTML table with the same headers and cell formatting as PDF.add_table"""
+    headers_map = headers_map or {}
+    n_rows = len(data)
+    columns = [
+        format_column(data[key]) if key in data else np.full(n_rows, "N/A")
+        for key in (headers_map.get(header, header) for header in headers)
+    ]
+    head = "".join(f"<th>{html.escape(header)}</th>" for header in headers)
+    body = "".join(
+        "<tr>" + "".join(f"<td>{html.escape(value)}</td>" for value in row) + "</tr>" for row in zip(*columns)
+    )
+    caption = f"<h3>{html.escape(title)}</h3>" if title else ""
+    return f"{caption}<table><thead><tr>{head}</tr></thead><tbody>{body}</tbody></table>"
+
+def html_paragraphs(text):
+    return "".join(f"<p>{html.escape(line)}</p>" for line in text.split("\n") if line.strip())
+
+def html_suggestions(suggestions_text):
+    """Subject headings and bullet lists, following PDF.add_suggestions"""
+    parts = []
+    in_list = False
+    for line in suggestions_text.split("\n"):
+        line = line.strip()
+        if line.startswith("**") and line.endswith("**"):
+            if in_list:
+                parts.append("</ul>")
+            parts.append(f"<h3>{html.escape(line.strip('*').rstrip(':'))}</h3><ul>")
+            in_list = True
+        elif line and in_list:
+            parts.append(f"<li>{html.escape(line.lstrip('-* ').strip())}</li>")
+    if in_list:
+        parts.append("</ul>")
+    return "".join(parts) or "<p>[No suggestions provided]</p>"
+
+def inline_svg(svg_bytes):
+    """SVG markup for embedding in HTML, without the XML prolog and doctype"""
+    svg = svg_bytes.decode("utf-8")
+    return svg[svg.find("<svg"):]
+
+def generate_analysis_html(questions_df, subject_data, feedback_sections, chapter_dict, image_list, test_info, student_name="Student", percentiles=None, compress=False):
+    """Generate the report as one self-contained HTML page; image_list must hold SVG charts
+
+    Returns UTF-8 bytes, or gzip bytes (with a fixed mtime, so output stays deterministic)
+    when compress is set.
+    """
+    stats = generate_summary_stats(questions_df, subject_data, test_info)
+    parts = [
+        "<h1>Student Performance Report</h1>",
+        f"<div class=\"cover\"><h3>{html.escape(test_info['name'])} - {html.escape(str(test_info['date']))}</h3>",
+        f"<p>For: {html.escape(student_name)}<br>Generated by MathonGo AI</p></div>",
+        "<h2>1. Summary Statistics</h2><ul>",
+        f"<li>Total Questions: {stats['total_questions']}</li>",
+        f"<li>Correct Answers: {stats['correct_answers']}</li>",
+        f"<li>Accuracy: {stats['accuracy']:.2f}%</li>",
+        f"<li>Average Time per Question: {stats['avg_time']:.2f}s</li>",
+        f"<li>Marks Scored: {stats['marks_scored']:.1f}/{stats['total_marks']}</li>",
+        f"<li>Time Used: {stats['time_percentage']:.2f}% of {test_info['duration']}s</li></ul>"
+    ]
+    percentile_df = percentile_table(percentiles)
+    if not percentile_df.empty:
+        parts.append(html_table(
+            percentile_df, ["Metric", "Percentile"],
+            title=f"Cohort Percentile Ranks ({percentiles['cohort_size']} students)"
+        ))
+    parts.append("<h2>2. Personalized Feedback</h2>")
+    parts.append(html_paragraphs(feedback_sections["intro"]) or "<p>[No feedback provided]</p>")
+    parts.append("<h2>3. Performance Analysis</h2>")
+    for section, key in PERFORMANCE_SECTIONS:
+        text = feedback_sections.get(key, "")
+        if text.strip():
+            parts.append(f"<h3>{section}</h3>{html_paragraphs(text)}")
+    parts.append(html_table(subject_data, list(SUBJECT_TABLE_HEADERS), SUBJECT_TABLE_HEADERS, "Subject-wise Performance"))
+    parts.append("<h2>4. Actionable Suggestions</h2>")
+    parts.append(html_suggestions(feedback_sections["actionable_suggestions"]))
+    parts.append("<h2>5. Chapter-wise Analysis</h2>")
+    chapter_summary = chapter_summary_table(questions_df, report_template(test_info, questions_df))
+    if chapter_summary.empty:
+        parts.append("<p>[No chapters found in the test data]</p>")
+    else:
+        parts.append(html_table(chapter_summary, CHAPTER_TABLE_COLUMNS, title="Performance by Chapter"))
+    parts.append("<h2>6. Visual Insights</h2>")
+    for image_name, description, image_data in image_list:
+        caption = os.path.splitext(image_name)[0].replace("_", " ").title()
+        parts.append(
+            f"<figure>{inline_svg(image_data)}<figcaption>{html.escape(caption)}</figcaption>"
+            f"<p>{html.escape(description)}</p></figure>"
+        )
+    title = html.escape(f"Student Performance Report - {test_info['name']}")
+    document = (
+        f"<!DOCTYPE html><html lang=\"en\"><head><meta charset=\"utf-8\">"
+        f"<meta name=\"viewport\" content=\"width=device-width, initial-scale=1\"><title>{title}</title>"
+        f"<style>{HTML_REPORT_STYLE}</style></head><body>{''.join(parts)}</body></html>"
+    ).encode("utf-8")
+    return gzip.compress(document, mtime=0) if compress else document
+
+def split_feedback_sections(feedback_raw):
+    """Split markdown feedback into the sections used by the PDF report"""
+    feedback_sections = {
+        "intro": "",
+        "subject_breakdown": "",
+        "chapter_breakdown": "",
+        "difficulty_breakdown": "",
+        "time_breakdown": "",
+        "overall_breakdown": "",
+        "progress_breakdown": "",
+        "actionable_suggestions": ""
+    }
+    current_section = ""
+    for line in feedback_raw.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("### Intro"):
+            current_section = "intro"
+        elif line.startswith("### Performance Breakdown"):
+            current_section = ""
+        elif line.startswith("#### Subject-wise Analysis"):
+            current_section = "subject_breakdown"
+        elif line.startswith("#### Chapter-wise Analysis"):
+            current_section = "chapter_breakdown"
+        elif line.startswith("#### Difficulty-wise Analysis"):
+            current_section = "difficulty_breakdown"
+        elif line.startswith("#### Time and Accuracy Insights"):
+            current_section = "time_breakdown"
+        elif line.startswith("#### Overall Metrics"):
+            current_section = "overall_breakdown"
+        elif line.startswith("#### Progress Over Time"):
+            current_section = "progress_breakdown"
+        elif line.startswith("### Actionable Suggestions"):
+            current_section = "actionable_suggestions"
+        elif current_section:
+            feedback_sections[current_section] += line + "\n"
+    return feedback_sections
+
+def cohort_percentiles(questions_df):
+    """Percentile ranks against the saved cohort sketches, or None when no cohort is available"""
+    cohort = CohortSketches.load()
+    if cohort is None or cohort.n == 0:
+        return None
+    return cohort.percentile_ranks(questions_df)
+
+def percentile_table(percentiles):
+    """Flatten percentile ranks into a Metric/Percentile table for the dashboard and PDF"""
+    rows = []
+    if percentiles and percentiles.get("overall_accuracy") is not None:
+        rows.append({"Metric": "Overall Accuracy", "Percentile": percentiles["overall_accuracy"]})
+        for subject, rank in percentiles["subject_accuracy"].items():
+            rows.append({"Metric": f"{subject} Accuracy", "Percentile": rank})
+        for chapter, rank in percentiles["chapter_avg_time"].items():
+            rows.append({"Metric": f"{chapter} Avg Time (lower = faster)", "Percentile": rank})
+    return pd.DataFrame(rows, columns=["Metric", "Percentile"])
+
+def record_history(parsed_data):
+    """Add the attempt to the per-student history index when the submission names its student"""
+    if parsed_data.get("student_id"):
+        with HistoryIndex() as index:
+            index.record_attempt(parsed_data["student_id"], parsed_data)
+
+def student_history(student_id):
+    """(attempts, improvement, progress text) from the history index, or None without one"""
+    index = HistoryIndex.open_existing() if student_id else None
+    if index is None:
+        return None
+    with index:
+        return index.attempts(student_id), index.improvement(student_id), index.progress_summary(student_id)
+
+def record_analytics(parsed_data, source_key):
+    """Add the parsed submission to the analytics store used for cohort and historical views"""
+    with AnalyticsStore() as store:
+        store.ingest(parsed_data, source_key)
+
+def cohort_comparison(parsed_data):
+    """Student vs cohort accuracy per subject and difficulty for the same test, or None without a cohort"""
+    store = AnalyticsStore.open_existing()
+    if store is None:
+        return None
+    test_info = parsed_data['test_info']
+    same_test = {"test_id": test_info['test_id']} if test_info.get('test_id') else {"test_name": test_info['name']}
+    with store:
+        cohort = store.accuracy(("subject", "level"), **same_test)
+    if cohort.empty or cohort["submissions"].max() < 2:
+        return None
+    student = parsed_data['questions_df'].groupby(["subject", "level"], observed=True)["isCorrect"].mean() * 100
+    comparison = cohort.join(student.rename("student_accuracy"), on=["subject", "level"])
+    comparison = comparison.rename(columns={
+        "subject": "Subject", "level": "Difficulty", "student_accuracy": "Your Accuracy (%)",
+        "accuracy": "Cohort Accuracy (%)", "submissions": "Cohort Size"
+    })
+    return comparison[["Subject", "Difficulty", "Your Accuracy (%)", "Cohort Accuracy (%)", "Cohort Size"]]
+
+REPORT_STAGES = [
+    ("charts", "Rendering charts"),
+    ("chapters", "Extracting chapters"),
+    ("feedback", "Writing personalized feedback"),
+    ("report", "Assembling the report")
+]
+
+# Bump when the report layout or pipeline changes so stale artifacts are not served
+REPORT_FORMAT_VERSION = 3
+
+REPORT_FORMATS = {
+    "pdf": (".pdf", "application/pdf"),
+    "html": (".html", "text/html")
+}
+
+def report_key(source_key, student_name="Student", percentiles=None, progress_text=None, report_format="pdf"):
+    """Artifact key for a report: the submission hash plus every other input and the renderer versions"""
+    return artifact_key(
+        "report", report_format, REPORT_FORMAT_VERSION, FPDF_VERSION, matplotlib.__version__, sns.__version__,
+        source_key, student_name, percentiles, progress_text
+    )
+
+def cached_report(source_key, student_name="Student", percentiles=None, progress_text=None, report_format="pdf"):
+    """Report bytes from the artifact store, or None when this report has not been built yet"""
+    store = ArtifactStore(suffix=REPORT_FORMATS[report_format][0])
+    return store.get(report_key(source_key, student_name, percentiles, progress_text, report_format))
+
+def report_sections(parsed_data, student_name="Student", progress_text=None, on_stage=None, image_format="png",
+                    on_warning=None):
+    """Charts, chapters and split feedback shared by the PDF and HTML reports
+
+    on_warning receives the stages' error and fallback notices instead of st.warning/st.error,
+    for callers that are not on the Streamlit script thread.
+    """
+    stage = on_stage or (lambda name: None)
+    questions_df = parsed_data['questions_df']
+    stage("charts")
+    image_list = generate_all_charts(questions_df, image_format, on_warning)
+    stage("chapters")
+    chapter_dict = get_gemini_chapters(parsed_data['raw_data'], on_warning)
+    stage("feedback")
+    feedback_raw = generate_feedback(
+        questions_df, parsed_data['subject_data'], chapter_dict, parsed_data['test_info'], student_name, progress_text,
+        on_warning
+    )
+    return image_list, chapter_dict, split_feedback_sections(feedback_raw)
+
+def build_report(parsed_data, student_name="Student", percentiles=None, progress_text=None, on_stage=None,
+                 source_key=None, report_format="pdf", on_warning=None):
+    """Run the full report pipeline (charts, chapters, feedback, PDF or HTML) and return the report bytes
+
+    With the submission's source_key the report is served from the artifact store when it was
+    built before (Gemini feedback included) and stored there after a fresh build. A build where
+    a stage fell back (Gemini unavailable, chart errors) is returned but not stored, so the next
+    request tries again instead of serving the degraded report forever.
+    """
+    if source_key is not None:
+        warnings = []
+
+        def warn(message):
+            warnings.append(message)
+            if on_warning is not None:
+                on_warning(message)
+
+        return ArtifactStore(suffix=REPORT_FORMATS[report_format][0]).get_or_build(
+            report_key(source_key, student_name, percentiles, progress_text, report_format),
+            lambda: build_report(parsed_data, student_name, percentiles, progress_text, on_stage,
+                                 report_format=report_format, on_warning=warn),
+            should_store=lambda: not warnings
+        )
+    questions_df = parsed_data['questions_df']
+    subject_data = parsed_data['subject_data']
+    test_info = parsed_data['test_info']
+    image_list, chapter_dict, feedback_sections = report_sections(
+        parsed_data, student_name, progress_text, on_stage, "svg" if report_format == "html" else "png", on_warning
+    )
+    if on_stage is not None:
+        on_stage("report")
+    if report_format == "html":
+        return generate_analysis_html(
+            questions_df, subject_data, feedback_sections, chapter_dict, image_list, test_info, student_name, percentiles
+        )
+    return generate_analysis_pdf(
+        questions_df, subject_data, feedback_sections, chapter_dict, image_list, test_info, student_name, percentiles,
+        report_template(test_info, questions_df)
+    )
+
+@st.cache_resource
+def report_executor():
+    """Threads shared by every session for background report generation"""
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="report")
+
+class ReportJob:
+    """A report building on a background thread; kept in session_state so it survives reruns
+
+    The finished report is kept in the artifact store, not in memory: the job only holds its key.
+    Degraded reports (a stage warned) are not stored, so the job keeps those bytes itself.
+    """
+
+    def __init__(self, key, parsed_data, student_name, percentiles=None, progress_text=None, report_format="pdf"):
+        self.key = key
+        self.student_name = student_name
+        self.report_format = report_format
+        self.stage = None
+        self.artifact_key = None
+        self.error = None
+        self.warnings = []
+        self._report = None
+        self._future = report_executor().submit(self._run, parsed_data, student_name, percentiles, progress_text)
+
+    def _run(self, parsed_data, student_name, percentiles, progress_text):
+        # No st.* calls from this thread: stages report fallbacks through on_warning and the session
+        # only polls the attributes set here
+        source_key = self.key[0]
+        try:
+            report = build_report(
+                parsed_data, student_name, percentiles, progress_text, self._set_stage, source_key, self.report_format,
+                self.warnings.append
+            )
+            if self.warnings:
+                self._report = report
+            self.artifact_key = report_key(source_key, student_name, percentiles, progress_text, self.report_format)
+        except Exception as e:
+            self.error = str(e)
+
+    def _set_stage(self, stage):
+        self.stage = stage
+
+    @property
+    def running(self):
+        return not self._future.done()
+
+    def read(self):
+        """Bytes of the finished report, read from disk when the download is clicked"""
+        if self._report is not None:
+            return self._report
+        return ArtifactStore(suffix=REPORT_FORMATS[self.report_format][0]).get(self.artifact_key)
+
+    def progress(self):
+        """(fraction complete, label) of the stage currently running"""
+        stages = [name for name, _ in REPORT_STAGES]
+        if self.stage not in stages:
+            return 0.0, "Queued"
+        index = stages.index(self.stage)
+        return index / len(stages), REPORT_STAGES[index][1]
+
+@st.fragment(run_every=1.0)
+def report_progress():
+    """Poll the session's running report; a full rerun shows the download once it finishes"""
+    job = st.session_state.get('report_job')
+    if job is None or not job.running:
+        st.rerun()
+    fraction, label = job.progress()
+    st.progress(fraction, text=f"⏳ {label}...")
+    st.caption("You can keep exploring other sections while the report builds.")
+
 def generate_summary_stats(questions_df, subject_data, test_info):
     """Generate summary statistics"""
     total_questions = len(questions_df)
@@ -916,6 +1643,276 @@ def generate_basic_feedback(questions_df, subject_data, stats):
     
     return feedback
 
+@st.cache_resource
+def session_memory():
+    """Budgeted store shared by every session for their parsed submissions"""
+    return SessionMemory()
+
+def load_submission(uploaded_file):
+    """(cache_key, parsed_data) for the upload; parsed once per file, then kept in the session's memory budget"""
+    memory = session_memory()
+    session_id = st.session_state.session_id
+    source = st.session_state.get('analysis_source')
+    same_file = source is not None and source[0] == uploaded_file.file_id
+    if same_file:
+        parsed_data = memory.get(session_id, "analysis_data")
+        if parsed_data is not None:
+            return source[1], parsed_data
+    
+    # Load parsed tables from the columnar cache, parsing the JSON only on a miss
+    cache_key = source[1] if same_file else source_hash_file(uploaded_file)
+    parsed_data = load_parsed(cache_key)
+    cached = parsed_data is not None
+    if parsed_data is None:
+        uploaded_file.seek(0)
+        json_data = json_backend.load(uploaded_file)
+        validate_submission(json_data)
+        parsed_data = parse_json_data(json_data)
+        if parsed_data:
+            # Keep only the chapter fields the report reads; the full submission is not held past parsing
+            parsed_data['raw_data'] = extract_chapter_source(parsed_data['raw_data'])
+            try:
+                write_parsed(cache_key, parsed_data, parsed_data['raw_data'])
+                cached = True
+            except Exception as e:
+                st.warning(f"Could not cache parsed data: {str(e)}")
+            try:
+                record_history(parsed_data)
+            except Exception as e:
+                st.warning(f"Could not update student history: {str(e)}")
+            try:
+                record_analytics(parsed_data, cache_key)
+            except Exception as e:
+                st.warning(f"Could not update analytics store: {str(e)}")
+    
+    if parsed_data:
+        # Spilled or evicted tables are reloaded from the columnar cache instead of being pickled
+        memory.put(session_id, "analysis_data", parsed_data, reload=(lambda: load_parsed(cache_key)) if cached else None)
+        st.session_state.analysis_source = (uploaded_file.file_id, cache_key)
+        st.session_state.data_loaded = True
+    return cache_key, parsed_data
+
+def session_analysis():
+    """(cache_key, parsed_data) of the session's upload
+
+    Sections fetch the data themselves rather than taking it as an argument: Streamlit keeps a
+    fragment's arguments for its reruns, which would pin the tables outside the memory budget.
+    """
+    return load_submission(st.session_state.uploaded_file)
+
+# Each section is a fragment: its widgets rerun only the section, not the upload, parse and sidebar
+
+@st.fragment
+def student_name_input():
+    """Sidebar name box; editing it reruns nothing else, the report section reads it when it runs"""
+    st.text_input("👤 Student Name", value="Student", key="student_name", help="Enter the student's name for the report")
+
+@st.fragment
+def overview_section():
+    """Test info, key metrics and cohort comparisons"""
+    _, parsed_data = session_analysis()
+    questions_df = parsed_data['questions_df']
+    subject_data = parsed_data['subject_data']
+    test_info = parsed_data['test_info']
+    stats = generate_summary_stats(questions_df, subject_data, test_info)
+    
+    st.markdown('<h2 class="section-header">Test Overview</h2>', unsafe_allow_html=True)
+    
+    # Test Info
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.markdown(f"""
+        <div class="metric-card">
+            <h3>📝 {test_info['name']}</h3>
+            <p><strong>Date:</strong> {test_info['date']}</p>
+            <p><strong>Duration:</strong> {test_info['duration']} seconds</p>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    with col2:
+        st.markdown(f"""
+        <div class="metric-card">
+            <h3>📊 Performance</h3>
+            <p><strong>Accuracy:</strong> {stats['accuracy']:.1f}%</p>
+            <p><strong>Score:</strong> {stats['marks_scored']:.1f}/{stats['total_marks']}</p>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    with col3:
+        st.markdown(f"""
+        <div class="metric-card">
+            <h3>⏱️ Time Usage</h3>
+            <p><strong>Avg per Q:</strong> {stats['avg_time']:.1f}s</p>
+            <p><strong>Total Used:</strong> {stats['time_percentage']:.1f}%</p>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    # Key Metrics
+    st.markdown('<h3 class="section-header">Key Metrics</h3>', unsafe_allow_html=True)
+    
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Total Questions", stats['total_questions'])
+    col2.metric("Correct Answers", stats['correct_answers'])
+    col3.metric("Accuracy", f"{stats['accuracy']:.1f}%")
+    col4.metric("Time Efficiency", f"{stats['time_percentage']:.1f}%")
+    
+    # Subject Performance Table
+    if not subject_data.empty:
+        st.markdown('<h3 class="section-header">Subject-wise Performance</h3>', unsafe_allow_html=True)
+        st.dataframe(subject_data, use_container_width=True)
+    
+    # Cohort percentile ranks
+    percentile_df = percentile_table(cohort_percentiles(questions_df))
+    if not percentile_df.empty:
+        st.markdown('<h3 class="section-header">Cohort Percentile Ranks</h3>', unsafe_allow_html=True)
+        st.dataframe(percentile_df.round(1), use_container_width=True, hide_index=True)
+    
+    # Cohort averages from the analytics store
+    comparison_df = cohort_comparison(parsed_data)
+    if comparison_df is not None:
+        st.markdown('<h3 class="section-header">Cohort Comparison</h3>', unsafe_allow_html=True)
+        st.dataframe(comparison_df.round(1), use_container_width=True, hide_index=True)
+    
+    # Progress across earlier tests
+    history = student_history(parsed_data.get('student_id'))
+    if history is not None and len(history[0]) > 1:
+        attempts, improvement, _ = history
+        st.markdown('<h3 class="section-header">Progress Over Time</h3>', unsafe_allow_html=True)
+        st.line_chart(attempts.set_index("taken_at")["accuracy"])
+        if not improvement.empty:
+            st.dataframe(
+                improvement[["subject", "chapter", "previous_accuracy", "latest_accuracy", "accuracy_delta"]].round(1),
+                use_container_width=True, hide_index=True
+            )
+
+@st.fragment
+def visualizations_section():
+    """Charts in tabs; the interactive toggle reruns only this section"""
+    questions_df = session_analysis()[1]['questions_df']
+    st.markdown('<h2 class="section-header">Performance Visualizations</h2>', unsafe_allow_html=True)
+    
+    interactive = st.toggle(
+        "Interactive charts", value=True,
+        help="Draw charts in the browser from small summary tables; turn off for the static images used in the PDF report"
+    )
+    if interactive:
+        # Only the aggregated tables and Vega-Lite specs are sent; the browser renders them
+        charts = interactive_charts(questions_df)
+        chart_tabs = st.tabs([name.replace("_", " ").title() for name, _, _, _ in charts])
+        for tab, (_, _, data, spec) in zip(chart_tabs, charts):
+            with tab:
+                st.vega_lite_chart(data, spec, use_container_width=True)
+    else:
+        # Generate charts
+        with st.spinner("Generating visualizations..."):
+            charts = generate_all_charts(questions_df)
+        
+        if charts:
+            # Display charts in tabs
+            chart_tabs = st.tabs([chart[0].replace(".png", "").replace("_", " ").title() for chart in charts])
+            
+            for i, (_, _, image_data) in enumerate(charts):
+                with chart_tabs[i]:
+                    st.image(image_data, use_column_width=True)
+        else:
+            st.warning("No visualizations could be generated from the data.")
+
+@st.fragment
+def detailed_analysis_section():
+    """Rule-based feedback and the question and chapter tables"""
+    _, parsed_data = session_analysis()
+    questions_df = parsed_data['questions_df']
+    subject_data = parsed_data['subject_data']
+    stats = generate_summary_stats(questions_df, subject_data, parsed_data['test_info'])
+    feedback = generate_basic_feedback(questions_df, subject_data, stats)
+    
+    st.markdown('<h2 class="section-header">Detailed Performance Analysis</h2>', unsafe_allow_html=True)
+    
+    # Feedback sections
+    st.subheader("📝 Introduction")
+    st.write(feedback['intro'])
+    
+    st.subheader("📚 Subject Analysis")
+    st.write(feedback['subject_analysis'])
+    
+    st.subheader("⏰ Time Management")
+    st.write(feedback['time_analysis'])
+    
+    st.subheader("📖 Chapter Analysis")
+    st.write(feedback['chapter_analysis'])
+    
+    # Detailed data tables
+    with st.expander("📊 View Detailed Question Data"):
+        st.dataframe(questions_df, use_container_width=True)
+    
+    # Chapter-wise performance if available
+    if 'chapter' in questions_df.columns and questions_df['chapter'].nunique() > 1:
+        with st.expander("📈 Chapter-wise Performance"):
+            chapter_perf = questions_df.groupby('chapter').agg({
+                'isCorrect': ['count', 'sum', 'mean'],
+                'timeTaken': 'mean'
+            }).round(3)
+            chapter_perf.columns = ['Total Questions', 'Correct', 'Accuracy', 'Avg Time']
+            chapter_perf['Accuracy'] = (chapter_perf['Accuracy'] * 100).round(1)
+            st.dataframe(chapter_perf, use_container_width=True)
+
+@st.fragment
+def report_section():
+    """Report format, generate button and download; reads the student name from session_state"""
+    cache_key, parsed_data = session_analysis()
+    questions_df = parsed_data['questions_df']
+    student_name = st.session_state.get('student_name', "Student")
+    report_job = st.session_state.get('report_job')
+    
+    st.markdown('<h2 class="section-header">Generate Report</h2>', unsafe_allow_html=True)
+    
+    st.write("Click the button below to generate a comprehensive report of the student's performance.")
+    report_format = st.radio(
+        "Format", ["PDF", "HTML"], horizontal=True,
+        captions=["For printing", "Web page: smaller and faster to build"]
+    ).lower()
+    
+    job_key = (cache_key, student_name, report_format)
+    if st.button(f"🔄 Generate {report_format.upper()} Report", type="primary",
+                 disabled=report_job is not None and report_job.running):
+        history = student_history(parsed_data.get('student_id'))
+        report_job = ReportJob(
+            job_key, parsed_data, student_name, cohort_percentiles(questions_df),
+            history[2] if history is not None else None, report_format
+        )
+        st.session_state.report_job = report_job
+    
+    # The finished job stays in session_state, so its download survives reruns and navigation
+    if report_job is not None and report_job.key == job_key:
+        if report_job.running:
+            report_progress()
+        elif report_job.error is not None:
+            st.error(f"❌ Error generating report: {report_job.error}")
+        else:
+            label = report_job.report_format.upper()
+            suffix, mime = REPORT_FORMATS[report_job.report_format]
+            for warning in report_job.warnings:
+                st.warning(warning)
+            st.success(f"✅ {label} report generated successfully!")
+            
+            # Download button
+            st.download_button(
+                label=f"📥 Download {label} Report",
+                data=report_job.read,
+                file_name=f"{report_job.student_name}_Performance_Report{suffix}",
+                mime=mime
+            )
+    elif report_job is not None and report_job.running:
+        st.info("A report for another file, student name or format is still being generated.")
+
+DASHBOARD_SECTIONS = [
+    "📊 Overview",
+    "📈 Visualizations", 
+    "📋 Detailed Analysis",
+    "📄 Generate Report"
+]
+
+
 def main():
     # Header
     st.markdown('<h1 class="main-header">📊 Student Performance Analysis Dashboard</h1>', unsafe_allow_html=True)
@@ -927,212 +1924,64 @@ def main():
     # File uploader
     st.sidebar.subheader("📁 Upload Data")
     uploaded_file = st.sidebar.file_uploader(
-        "Choose a JSON file",
-        type=['json'],
-        help="Upload your student performance JSON file"
+        "Choose a JSON file (.json, .json.gz, .json.bz2 or .json.zst)",
+        type=['json'] + COMPRESSED_EXTENSIONS,
+        help="Upload your student performance JSON file",
+        key="uploaded_file"
     )
     
     # Student name input
-    student_name = st.sidebar.text_input("👤 Student Name", value="Student", help="Enter the student's name for the report")
+    with st.sidebar:
+        student_name_input()
+    
+    report_job = st.session_state.get('report_job')
+    if report_job is not None and report_job.running:
+        st.sidebar.info("📄 Report is being generated in the background")
+    
+    memory = session_memory()
+    memory.evict_idle()
     
     if uploaded_file is not None:
         try:
-            # Load and parse data
-            json_data = json.load(uploaded_file)
-            parsed_data = parse_json_data(json_data)
+            _, parsed_data = load_submission(uploaded_file)
             
             if parsed_data:
-                st.session_state.analysis_data = parsed_data
-                st.session_state.data_loaded = True
                 st.sidebar.success("✅ Data loaded successfully!")
                 
                 # Navigation
-                analysis_sections = [
-                    "📊 Overview",
-                    "📈 Visualizations", 
-                    "📋 Detailed Analysis",
-                    "📄 Generate Report"
-                ]
-                
-                selected_section = st.sidebar.radio("Select Section", analysis_sections)
-                
-                # Get data
-                questions_df = parsed_data['questions_df']
-                subject_data = parsed_data['subject_data']
-                test_info = parsed_data['test_info']
+                selected_section = st.sidebar.radio("Select Section", DASHBOARD_SECTIONS)
                 
-                # Generate stats and feedback
-                stats = generate_summary_stats(questions_df, subject_data, test_info)
-                feedback = generate_basic_feedback(questions_df, subject_data, stats)
+                # Memory held for this session and for every session on this server
+                usage = memory.stats()
+                session_usage = usage["per_session"].get(st.session_state.session_id, {})
+                st.sidebar.caption(
+                    f"🧠 Session memory: {session_usage.get('memory_bytes', 0) / 2**20:.1f} MB in RAM, "
+                    f"{session_usage.get('spilled_bytes', 0) / 2**20:.1f} MB on disk · "
+                    f"{usage['sessions']} sessions using {usage['memory_bytes'] / 2**20:.1f} MB"
+                )
                 
                 # Main content based on selection
                 if selected_section == "📊 Overview":
-                    st.markdown('<h2 class="section-header">Test Overview</h2>', unsafe_allow_html=True)
-                    
-                    # Test Info
-                    col1, col2, col3 = st.columns(3)
-                    with col1:
-                        st.markdown(f"""
-                        <div class="metric-card">
-                            <h3>📝 {test_info['name']}</h3>
-                            <p><strong>Date:</strong> {test_info['date']}</p>
-                            <p><strong>Duration:</strong> {test_info['duration']} seconds</p>
-                        </div>
-                        """, unsafe_allow_html=True)
-                    
-                    with col2:
-                        st.markdown(f"""
-                        <div class="metric-card">
-                            <h3>📊 Performance</h3>
-                            <p><strong>Accuracy:</strong> {stats['accuracy']:.1f}%</p>
-                            <p><strong>Score:</strong> {stats['marks_scored']:.1f}/{stats['total_marks']}</p>
-                        </div>
-                        """, unsafe_allow_html=True)
-                    
-                    with col3:
-                        st.markdown(f"""
-                        <div class="metric-card">
-                            <h3>⏱️ Time Usage</h3>
-                            <p><strong>Avg per Q:</strong> {stats['avg_time']:.1f}s</p>
-                            <p><strong>Total Used:</strong> {stats['time_percentage']:.1f}%</p>
-                        </div>
-                        """, unsafe_allow_html=True)
-                    
-                    # Key Metrics
-                    st.markdown('<h3 class="section-header">Key Metrics</h3>', unsafe_allow_html=True)
-                    
-                    col1, col2, col3, col4 = st.columns(4)
-                    col1.metric("Total Questions", stats['total_questions'])
-                    col2.metric("Correct Answers", stats['correct_answers'])
-                    col3.metric("Accuracy", f"{stats['accuracy']:.1f}%")
-                    col4.metric("Time Efficiency", f"{stats['time_percentage']:.1f}%")
-                    
-                    # Subject Performance Table
-                    if not subject_data.empty:
-                        st.markdown('<h3 class="section-header">Subject-wise Performance</h3>', unsafe_allow_html=True)
-                        st.dataframe(subject_data, use_container_width=True)
-                
+                    overview_section()
                 elif selected_section == "📈 Visualizations":
-                    st.markdown('<h2 class="section-header">Performance Visualizations</h2>', unsafe_allow_html=True)
-                    
-                    # Generate charts
-                    with st.spinner("Generating visualizations..."):
-                        charts = generate_all_charts(questions_df)
-                    
-                    if charts:
-                        # Display charts in tabs
-                        chart_tabs = st.tabs([chart[0].replace(".png", "").replace("_", " ").title() for chart in charts])
-                        
-                        for i, (_, _, image_data) in enumerate(charts):
-                            with chart_tabs[i]:
-                                st.image(image_data, use_column_width=True)
-                    else:
-                        st.warning("No visualizations could be generated from the data.")
-                
+                    visualizations_section()
                 elif selected_section == "📋 Detailed Analysis":
-                    st.markdown('<h2 class="section-header">Detailed Performance Analysis</h2>', unsafe_allow_html=True)
-                    
-                    # Feedback sections
-                    st.subheader("📝 Introduction")
-                    st.write(feedback['intro'])
-                    
-                    st.subheader("📚 Subject Analysis")
-                    st.write(feedback['subject_analysis'])
-                    
-                    st.subheader("⏰ Time Management")
-                    st.write(feedback['time_analysis'])
-                    
-                    st.subheader("📖 Chapter Analysis")
-                    st.write(feedback['chapter_analysis'])
-                    
-                    # Detailed data tables
-                    with st.expander("📊 View Detailed Question Data"):
-                        st.dataframe(questions_df, use_container_width=True)
-                    
-                    # Chapter-wise performance if available
-                    if 'chapter' in questions_df.columns and questions_df['chapter'].nunique() > 1:
-                        with st.expander("📈 Chapter-wise Performance"):
-                            chapter_perf = questions_df.groupby('chapter').agg({
-                                'isCorrect': ['count', 'sum', 'mean'],
-                                'timeTaken': 'mean'
-                            }).round(3)
-                            chapter_perf.columns = ['Total Questions', 'Correct', 'Accuracy', 'Avg Time']
-                            chapter_perf['Accuracy'] = (chapter_perf['Accuracy'] * 100).round(1)
-                            st.dataframe(chapter_perf, use_container_width=True)
-                
+                    detailed_analysis_section()
                 elif selected_section == "📄 Generate Report":
-                    st.markdown('<h2 class="section-header">Generate PDF Report</h2>', unsafe_allow_html=True)
-                    
-                    st.write("Click the button below to generate a comprehensive PDF report of the student's performance.")
-                    
-                    if st.button("🔄 Generate PDF Report", type="primary"):
-                        with st.spinner("Generating PDF report..."):
-                            try:
-                                # Generate charts
-                                image_list = generate_all_charts(questions_df)
-                                # Generate chapter dictionary
-                                chapter_dict = get_gemini_chapters(parsed_data['raw_data'])
-                                # Generate feedback
-                                feedback_raw = generate_feedback(questions_df, subject_data, chapter_dict, test_info, student_name)
-                                feedback_sections = {
-                                    "intro": "",
-                                    "subject_breakdown": "",
-                                    "chapter_breakdown": "",
-                                    "difficulty_breakdown": "",
-                                    "time_breakdown": "",
-                                    "overall_breakdown": "",
-                                    "suggestions": ""
-                                }
-                                current_section = ""
-                                for line in feedback_raw.split("\n"):
-                                    line = line.strip()
-                                    if not line:
-                                        continue
-                                    if line.startswith("### Intro"):
-                                        current_section = "intro"
-                                    elif line.startswith("### Performance Breakdown"):
-                                        current_section = ""
-                                    elif line.startswith("#### Subject-wise Analysis"):
-                                        current_section = "subject_breakdown"
-                                    elif line.startswith("#### Chapter-wise Analysis"):
-                                        current_section = "chapter_breakdown"
-                                    elif line.startswith("#### Difficulty-wise Analysis"):
-                                        current_section = "difficulty_breakdown"
-                                    elif line.startswith("#### Time and Accuracy Insights"):
-                                        current_section = "time_breakdown"
-                                    elif line.startswith("#### Overall Metrics"):
-                                        current_section = "overall_breakdown"
-                                    elif line.startswith("### Actionable Suggestions"):
-                                        current_section = "suggestions"
-                                    elif current_section:
-                                        feedback_sections[current_section] += line + "\n"
-                                
-                                # Generate PDF
-                                pdf_buffer = generate_analysis_pdf(
-                                    questions_df, subject_data, feedback_sections, chapter_dict, image_list, test_info, student_name
-                                )
-                                
-                                st.success("✅ PDF report generated successfully!")
-                                
-                                # Download button
-                                st.download_button(
-                                    label="📥 Download PDF Report",
-                                    data=pdf_buffer.getvalue(),
-                                    file_name=f"{student_name}_Performance_Report.pdf",
-                                    mime="application/pdf"
-                                )
-                                
-                            except Exception as e:
-                                st.error(f"❌ Error generating PDF: {str(e)}")
+                    report_section()
             else:
                 st.error("❌ Failed to parse the JSON data. Please check the file format.")
                 
         except json.JSONDecodeError:
             st.error("❌ Invalid JSON file. Please upload a valid JSON file.")
+        except SubmissionSchemaError as e:
+            st.error(f"❌ Invalid submission structure: {str(e)}")
         except Exception as e:
             st.error(f"❌ Error processing file: {str(e)}")
     
     else:
+        memory.discard(st.session_state.session_id, "analysis_data")
+        
         # Welcome screen
         st.markdown("""
         ## Welcome to the Student Performance Analysis Dashboard! 👋
@@ -0,0 +1,106 @@
+"""Mergeable KLL quantile sketch.
+
+A KLL sketch keeps a hierarchy of compactors; level h holds items of weight 2**h. When the
+sketch is full the lowest over-capacity level is sorted and every other item (random offset)
+is promoted to the next level. Memory stays O(k) regardless of the number of updates, rank
+queries carry an error of roughly 1/k, and two sketches merge by concatenating levels, so
+partial sketches built by separate workers combine into the sketch of the whole cohort.
+"""
+import bisect
+import math
+import random
+
+class KLLSketch:
+    """Streaming quantile sketch supporting update, merge, rank and quantile queries"""
+
+    def __init__(self, k=200, c=2 / 3, seed=None):
+        self.k = k
+        self.c = c
+        self.n = 0
+        self.compactors = [[]]
+        self._rng = random.Random(seed)
+        self._update_max_size()
+
+    def _capacity(self, level):
+        depth = len(self.compactors) - level - 1
+        return int(math.ceil(self.k * self.c ** depth)) + 1
+
+    def _update_max_size(self):
+        self.max_size = sum(self._capacity(level) for level in range(len(self.compactors)))
+        self.size = sum(len(compactor) for compactor in self.compactors)
+
+    def _compress(self):
+        while self.size >= self.max_size:
+            for level, compactor in enumerate(self.compactors):
+                if len(compactor) >= self._capacity(level):
+                    if level + 1 == len(self.compactors):
+                        self.compactors.append([])
+                    compactor.sort()
+                    # Keep a trailing odd item at this level; promote every other item of the rest
+                    keep = [compactor.pop()] if len(compactor) % 2 else []
+                    offset = self._rng.random() < 0.5
+                    self.compactors[level + 1].extend(compactor[offset::2])
+                    self.compactors[level] = keep
+                    self._update_max_size()
+                    break
+
+    def update(self, value):
+        """Add one observation"""
+        self.compactors[0].append(float(value))
+        self.n += 1
+        self.size += 1
+        if self.size >= self.max_size:
+            self._compress()
+
+    def update_many(self, values):
+        """Add a batch of observations"""
+        for value in values:
+            self.update(value)
+
+    def merge(self, other):
+        """Fold another sketch into this one in place and return self"""
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        for level, compactor in enumerate(other.compactors):
+            self.compactors[level].extend(compactor)
+        self.n += other.n
+        self._update_max_size()
+        self._compress()
+        return self
+
+    def _weighted_items(self):
+        return sorted((value, 2 ** level) for level, compactor in enumerate(self.compactors) for value in compactor)
+
+    def rank(self, value):
+        """Estimated fraction of observations less than or equal to value"""
+        if self.n == 0:
+            return float("nan")
+        weight = sum(
+            bisect.bisect_right(sorted(compactor), value) * 2 ** level
+            for level, compactor in enumerate(self.compactors)
+        )
+        return weight / sum(len(compactor) * 2 ** level for level, compactor in enumerate(self.compactors))
+
+    def quantile(self, q):
+        """Estimated value at quantile q (0 <= q <= 1)"""
+        items = self._weighted_items()
+        if not items:
+            return float("nan")
+        total = sum(weight for _, weight in items)
+        cumulative = 0
+        for value, weight in items:
+            cumulative += weight
+            if cumulative >= q * total:
+                return value
+        return items[-1][0]
+
+    def to_dict(self):
+        return {"k": self.k, "c": self.c, "n": self.n, "compactors": self.compactors}
+
+    @classmethod
+    def from_dict(cls, state):
+        sketch = cls(k=state["k"], c=state["c"])
+        sketch.n = state["n"]
+        sketch.compactors = [list(compactor) for compactor in state["compactors"]]
+        sketch._update_max_size()
+        return sketch
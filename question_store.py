@@ -0,0 +1,221 @@
+"""Normalized question-metadata store for cohort batches.
+
+Every submission of a test repeats the full questionId object (chapters, level) for every
+question. QuestionStore parses a batch once into a per-test question table keyed by
+questionId (subject, chapter, level, section held once per question) and thin per-student
+response rows that reference it by integer id. Per-student frames in the parse_json_data
+shape are rebuilt on demand with a take() over the question table.
+"""
+import numpy as np
+import pandas as pd
+
+from submission_meta import submission_datetime, format_test_date, test_id
+from submission_meta import student_id as submission_student_id
+
+SUBJECT_MAP = {
+    "607018ee404ae53194e73d92": "Physics",
+    "607018ee404ae53194e73d90": "Chemistry",
+    "607018ee404ae53194e73d91": "Mathematics"
+}
+
+# Response option codes below zero: question not attempted, or answered with a numeric input
+NOT_ATTEMPTED = -1
+NUMERIC_ANSWER = -2
+
+RESPONSE_DTYPES = {
+    "student": np.int32,
+    "question": np.int32,
+    "isCorrect": bool,
+    "timeTaken": np.int32,
+    "status": np.int16,
+    "option": np.int32
+}
+
+def _oid(value, default):
+    if isinstance(value, dict):
+        return value.get("$oid", default)
+    return default if value is None else str(value)
+
+class QuestionStore:
+    """Question table keyed by questionId plus integer-coded response rows for many students"""
+
+    def __init__(self):
+        self.test_info = None
+        self.syllabus = ""
+        self.student_ids = []
+        self.taken_at = []
+        self.subject_rows = []
+        self._question_index = {}
+        self._question_columns = {"questionId": [], "subjectId": [], "subject": [], "chapter": [], "level": [], "section": []}
+        self._option_index = {}
+        self.option_ids = []
+        self.option_correct = []
+        self._status_index = {}
+        self.status_values = []
+        self._response_chunks = {name: [] for name in RESPONSE_DTYPES}
+        self._questions = None
+
+    def _question_id(self, q, section_idx, q_idx, section_name):
+        question = q.get("questionId", {})
+        key = _oid(question.get("_id"), f"{section_idx}:{q_idx}")
+        index = self._question_index.get(key)
+        if index is None:
+            subject_id = q.get("subjectId", {})
+            if isinstance(subject_id, dict):
+                subject_id = subject_id.get("$oid", "Unknown")
+            else:
+                subject_id = str(subject_id).lower() or "Unknown"
+            index = self._question_index[key] = len(self._question_columns["questionId"])
+            columns = self._question_columns
+            columns["questionId"].append(key)
+            columns["subjectId"].append(subject_id)
+            columns["subject"].append(SUBJECT_MAP.get(subject_id, "Unknown"))
+            columns["chapter"].append(question.get("chapters", [{"title": "Unknown"}])[0]["title"])
+            columns["level"].append(question.get("level", "Unknown"))
+            columns["section"].append(section_name)
+        return index
+
+    def _code(self, index, values, value):
+        code = index.get(value)
+        if code is None:
+            code = index[value] = len(values)
+            values.append(value)
+        return code
+
+    def add_submission(self, json_data, student_id=None):
+        """Parse one submission into response rows, registering unseen questions once"""
+        data = json_data[0] if isinstance(json_data, list) else json_data
+        student = len(self.student_ids)
+        self.student_ids.append(student_id if student_id is not None else (submission_student_id(data) or student))
+        self.taken_at.append(submission_datetime(data))
+        if self.test_info is None:
+            test = data.get("test", {})
+            self.test_info = {
+                "name": test.get("title", "QPT 1"),
+                "total_questions": test.get("totalQuestions", 75),
+                "total_marks": test.get("totalMarks", 300),
+                "duration": test.get("duration", 3600),
+                "test_id": test_id(data)
+            }
+            self.syllabus = test.get("syllabus", "")
+        self.subject_rows.append([
+            {
+                "Subject": SUBJECT_MAP.get(subj["subjectId"].get("$oid", "Unknown"), "Unknown"),
+                "TotalCorrect": subj.get("totalCorrect", 0),
+                "TotalAttempted": subj.get("totalAttempted", 0),
+                "Accuracy": subj.get("accuracy", 0.0),
+                "TotalTimeTaken": subj.get("totalTimeTaken", 0)
+            }
+            for subj in data.get("subjects", [])
+        ])
+        responses = {name: [] for name in RESPONSE_DTYPES}
+        for section_idx, section in enumerate(data.get("sections", [])):
+            section_name = section.get("title", f"Section {section_idx + 1}")
+            for q_idx, q in enumerate(section.get("questions", [])):
+                question = self._question_id(q, section_idx, q_idx, section_name)
+                is_correct = False
+                option = NOT_ATTEMPTED
+                if q.get("markedOptions", []):
+                    marked = q["markedOptions"][0]
+                    is_correct = marked.get("isCorrect", False)
+                    option_key = (question, _oid(marked.get("_id"), str(marked.get("option", ""))))
+                    option = self._option_index.get(option_key)
+                    if option is None:
+                        option = self._option_index[option_key] = len(self.option_ids)
+                        self.option_ids.append(option_key)
+                        self.option_correct.append(bool(is_correct))
+                elif q.get("inputValue", {}).get("value", None) is not None:
+                    is_correct = q["inputValue"].get("isCorrect", False)
+                    option = NUMERIC_ANSWER
+                responses["student"].append(student)
+                responses["question"].append(question)
+                responses["isCorrect"].append(bool(is_correct))
+                responses["timeTaken"].append(int(q.get("timeTaken", 0)))
+                responses["status"].append(self._code(self._status_index, self.status_values,
+                                                      str(q.get("status", "")).lower().strip()))
+                responses["option"].append(option)
+        # Keep each submission as compact arrays rather than growing Python lists
+        for name, values in responses.items():
+            self._response_chunks[name].append(np.asarray(values, dtype=RESPONSE_DTYPES[name]))
+        self._questions = None
+        return student
+
+    @classmethod
+    def from_submissions(cls, submissions, student_ids=None):
+        store = cls()
+        for i, data in enumerate(submissions):
+            store.add_submission(data, None if student_ids is None else student_ids[i])
+        return store
+
+    @property
+    def questions(self):
+        """Question table indexed by integer question id"""
+        if self._questions is None:
+            questions = pd.DataFrame(self._question_columns)
+            for column in ["subjectId", "subject", "chapter", "level", "section"]:
+                questions[column] = questions[column].astype("category")
+            self._questions = questions
+        return self._questions
+
+    @property
+    def responses(self):
+        """Response rows as compact numpy arrays (student, question, isCorrect, timeTaken, status, option)
+
+        option indexes option_ids/option_correct, or is NOT_ATTEMPTED / NUMERIC_ANSWER.
+        """
+        for name, chunks in self._response_chunks.items():
+            if len(chunks) != 1:
+                self._response_chunks[name] = [np.concatenate(chunks) if chunks else np.empty(0, RESPONSE_DTYPES[name])]
+        return {name: chunks[0] for name, chunks in self._response_chunks.items()}
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in self.responses.values()) + int(self.questions.memory_usage(deep=True).sum())
+
+    def student_rows(self, student):
+        """Slice of the response arrays belonging to one student"""
+        students = self.responses["student"]
+        start, stop = np.searchsorted(students, [student, student + 1])
+        return slice(start, stop)
+
+    def questions_df(self, student):
+        """Rebuild one student's questions_df exactly as parse_json_data would return it"""
+        rows = self.student_rows(student)
+        responses = self.responses
+        question = responses["question"][rows]
+        questions = self.questions
+        status_values = np.asarray(self.status_values, dtype=object)
+        return pd.DataFrame({
+            "subject": questions["subject"].to_numpy()[question],
+            "chapter": questions["chapter"].to_numpy()[question],
+            "level": questions["level"].to_numpy()[question],
+            "isCorrect": responses["isCorrect"][rows],
+            "timeTaken": responses["timeTaken"][rows].astype(np.int64),
+            "status": status_values[responses["status"][rows]],
+            "section": questions["section"].to_numpy()[question]
+        })
+
+    def chapter_source(self):
+        """Slim raw_data for get_gemini_chapters, built from the question table"""
+        return {
+            "test": {"syllabus": self.syllabus},
+            "sections": [{"questions": [
+                {"subjectId": {"$oid": subject_id}, "questionId": {"chapters": [{"title": chapter}]}}
+                for subject_id, chapter in zip(self._question_columns["subjectId"], self._question_columns["chapter"])
+            ]}]
+        }
+
+    def parsed(self, student):
+        """One student's data in the parse_json_data result shape"""
+        taken_at = self.taken_at[student]
+        return {
+            "questions_df": self.questions_df(student),
+            "subject_data": pd.DataFrame(self.subject_rows[student]),
+            "test_info": {
+                **self.test_info,
+                "date": format_test_date(taken_at),
+                "taken_at": taken_at.isoformat() if taken_at else None
+            },
+            "student_id": self.student_ids[student],
+            "raw_data": self.chapter_source()
+        }
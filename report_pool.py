@@ -0,0 +1,133 @@
+"""Warm worker pool for the report pipeline.
+
+The parent process pays once for the heavy imports (pandas, seaborn, matplotlib, the
+Gemini client), chart styling, the matplotlib font cache and a dummy render. Workers
+are then forked from that warm parent and reused across many reports. Create the pool
+from a CLI or service process, not from inside a running Streamlit script.
+"""
+import multiprocessing as mp
+from multiprocessing import resource_tracker
+import os
+
+from shared_frame import attach_frame, detach_frame
+
+_pipeline = None
+
+def warm_up():
+    """Import the report pipeline and render a dummy report so every cache is populated"""
+    global _pipeline
+    if _pipeline is not None:
+        return _pipeline
+    import main as pipeline
+
+    questions_df = pipeline.pd.DataFrame({
+        "subject": ["Physics", "Chemistry"],
+        "chapter": ["Warm-up", "Warm-up"],
+        "level": ["easy", "hard"],
+        "isCorrect": [True, False],
+        "timeTaken": [10, 20],
+        "status": ["answered", "answered"],
+        "section": ["Warm-up", "Warm-up"]
+    })
+    subject_data = pipeline.pd.DataFrame([{
+        "Subject": "Physics", "TotalCorrect": 1, "TotalAttempted": 2, "Accuracy": 50.0, "TotalTimeTaken": 30
+    }])
+    test_info = {"name": "Warm-up", "date": "", "total_questions": 2, "total_marks": 8, "duration": 60}
+    # One chart of each seaborn family loads fonts, the Agg renderer and the PNG writer
+    with pipeline.chart_figure(figsize=(2, 2)) as (fig, ax):
+        pipeline.sns.histplot(data=questions_df, x="timeTaken", ax=ax)
+        pipeline.sns.countplot(y="level", data=questions_df, ax=ax)
+        pipeline.sns.violinplot(data=questions_df, y="level", x="timeTaken", ax=ax)
+        image_data = pipeline.figure_to_bytes(fig)
+    pipeline.generate_analysis_pdf(
+        questions_df,
+        subject_data,
+        pipeline.split_feedback_sections(""),
+        {"Physics": [], "Chemistry": [], "Mathematics": []},
+        [("warm_up.png", "", image_data)],
+        test_info
+    )
+    _pipeline = pipeline
+    return _pipeline
+
+def _generate_report(json_data, student_name, source_key=None):
+    """Parse one submission and build its PDF inside a warm worker
+
+    With the hash of the submission file as source_key, a report built before is read back
+    from the artifact store without parsing the submission.
+    """
+    pipeline = warm_up()
+    if source_key is not None:
+        pdf_bytes = pipeline.cached_report(source_key, student_name)
+        if pdf_bytes is not None:
+            return pdf_bytes
+    parsed_data = pipeline.parse_json_data(json_data)
+    if parsed_data is None:
+        raise ValueError("Failed to parse the JSON data")
+    return pipeline.build_report(parsed_data, student_name, source_key=source_key)
+
+def _render_charts(handle, image_format="png"):
+    """Render the chart set for a questions_df published with shared_frame.publish_frame
+
+    The block is unmapped again before returning: workers are long-lived, and a mapping they
+    kept would hold the memory after the publisher unlinks it.
+    """
+    pipeline = warm_up()
+    questions_df = attach_frame(handle)
+    try:
+        return pipeline.generate_all_charts(questions_df, image_format)
+    finally:
+        del questions_df
+        detach_frame(handle)
+
+class ReportPool:
+    """Pool of pre-warmed worker processes that turn submissions into PDF reports"""
+
+    def __init__(self, processes=None, maxtasksperchild=None):
+        self.processes = processes or os.cpu_count() or 1
+        # Workers must share this process's resource tracker: one of their own would unlink
+        # shared frames they attached when the worker exits, while the publisher still uses them
+        resource_tracker.ensure_running()
+        if "fork" in mp.get_all_start_methods():
+            # Warm the parent once; forked workers inherit the loaded modules and caches
+            warm_up()
+            context = mp.get_context("fork")
+            self._pool = context.Pool(processes, maxtasksperchild=maxtasksperchild)
+        else:
+            context = mp.get_context("spawn")
+            self._pool = context.Pool(processes, initializer=warm_up, maxtasksperchild=maxtasksperchild)
+
+    def submit(self, json_data, student_name="Student", callback=None, error_callback=None, source_key=None):
+        """Queue one report and return an AsyncResult resolving to the PDF bytes"""
+        return self._pool.apply_async(
+            _generate_report, (json_data, student_name, source_key), callback=callback, error_callback=error_callback
+        )
+
+    def generate(self, json_data, student_name="Student", source_key=None):
+        """Generate one report and wait for the PDF bytes"""
+        return self.submit(json_data, student_name, source_key=source_key).get()
+
+    def render_charts(self, handle, image_format="png"):
+        """Queue chart rendering for a shared questions_df; only the small handle is pickled"""
+        return self._pool.apply_async(_render_charts, (handle, image_format))
+
+    def map(self, jobs):
+        """Generate reports for (json_data, student_name) pairs, preserving order"""
+        return self._pool.starmap(_generate_report, jobs)
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+    def terminate(self):
+        self._pool.terminate()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.terminate()
@@ -0,0 +1,254 @@
+"""Local HTTP service for report generation.
+
+POST /reports takes a submission JSON body (optionally compressed) and an optional
+?student_name=..., queues the parse/charts/feedback/PDF pipeline on a warm ReportPool and
+answers 202 with a job id. GET /reports/<id> returns the job state and GET /reports/<id>/pdf
+downloads the finished report. Jobs go through a ReportScheduler: ?priority=interactive jobs
+run ahead of the default bulk class and ?tenant=... jobs are shared round-robin within a class.
+Once a class holds --queue-size unfinished jobs, its new submissions are rejected with 429 and
+a Retry-After header instead of piling up in memory.
+Finished PDFs are written under --output and the oldest are dropped beyond --keep.
+
+Usage: python report_service.py [--host H] [--port P] [--workers N] [--queue-size N] [--output DIR] [--keep N]
+"""
+import argparse
+import io
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import json_backend
+from columnar_cache import source_hash
+from scheduler import PRIORITY_CLASSES, ReportScheduler
+
+SERVICE_OUTPUT_DIR = os.environ.get("FAST_EDA_SERVICE_REPORTS", os.path.join(".cache", "service_reports"))
+MAX_BODY_BYTES = 64 * 1024 * 1024
+
+class QueueFull(Exception):
+    """Raised when a priority class already holds its maximum number of unfinished jobs"""
+
+class ReportService:
+    """Job table in front of a scheduled ReportPool: bounded admission, job states and PDF files on disk"""
+
+    def __init__(self, workers=None, queue_size=64, output_dir=SERVICE_OUTPUT_DIR, keep=1000, pool=None, limits=None):
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir = output_dir
+        self.queue_size = queue_size
+        self.keep = keep
+        self._jobs = OrderedDict()
+        self._unfinished = dict.fromkeys(PRIORITY_CLASSES, 0)
+        self._lock = threading.Lock()
+        self._own_pool = pool is None
+        if pool is None:
+            from report_pool import ReportPool
+
+            pool = ReportPool(workers)
+        self._pool = pool
+        self.scheduler = ReportScheduler(pool, limits=limits)
+
+    def submit(self, json_data, student_name="Student", priority="bulk", tenant="default", source_key=None):
+        """Queue a report for a validated submission; returns the job id or raises QueueFull"""
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority class {priority!r}; expected one of {PRIORITY_CLASSES}")
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            if self._unfinished[priority] >= self.queue_size:
+                raise QueueFull(f"{self._unfinished[priority]} {priority} reports already queued")
+            self._unfinished[priority] += 1
+            self._jobs[job_id] = {
+                "state": "queued", "priority": priority, "tenant": tenant, "student_name": student_name,
+                "submitted_at": time.time(), "started_at": None, "finished_at": None, "error": None, "path": None
+            }
+        try:
+            self.scheduler.submit(
+                json_data, student_name, priority, tenant,
+                callback=lambda pdf_bytes: self._finish(job_id, pdf_bytes=pdf_bytes),
+                error_callback=lambda e: self._finish(job_id, error=str(e)),
+                on_start=lambda: self._start(job_id),
+                source_key=source_key
+            )
+        except Exception as e:
+            self._finish(job_id, error=str(e))
+        return job_id
+
+    def _start(self, job_id):
+        with self._lock:
+            self._jobs[job_id].update(state="running", started_at=time.time())
+
+    def _finish(self, job_id, pdf_bytes=None, error=None):
+        # Runs on the pool's result thread, so keep it short: one file write and a table update
+        path = None
+        if error is None:
+            path = os.path.join(self.output_dir, f"{job_id}.pdf")
+            tmp_path = f"{path}.tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(pdf_bytes)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                path, error = None, str(e)
+        with self._lock:
+            self._jobs[job_id].update(
+                state="done" if error is None else "failed", error=error, path=path, finished_at=time.time()
+            )
+            self._unfinished[self._jobs[job_id]["priority"]] -= 1
+            self._evict()
+
+    def _evict(self):
+        """Forget the oldest finished jobs (and delete their PDFs) beyond the retention limit"""
+        finished = len(self._jobs) - sum(self._unfinished.values())
+        for job_id in list(self._jobs):
+            if finished <= self.keep:
+                break
+            job = self._jobs[job_id]
+            if job["state"] in ("queued", "running"):
+                continue
+            if job["path"] is not None and os.path.exists(job["path"]):
+                os.remove(job["path"])
+            del self._jobs[job_id]
+            finished -= 1
+
+    def status(self, job_id):
+        """Public view of a job, or None for unknown ids"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {"job_id": job_id, **{key: value for key, value in job.items() if key != "path"}}
+
+    def pdf_path(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job["path"] if job is not None else None
+
+    def stats(self):
+        with self._lock:
+            counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+            for job in self._jobs.values():
+                counts[job["state"]] += 1
+        return {**counts, "queue_size": self.queue_size, "classes": self.scheduler.stats()}
+
+    def close(self):
+        if self._own_pool:
+            self._pool.close()
+
+class ReportRequestHandler(BaseHTTPRequestHandler):
+    """Routes /reports requests to the server's ReportService"""
+
+    protocol_version = "HTTP/1.1"
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _parts(self):
+        url = urlparse(self.path)
+        return [part for part in url.path.split("/") if part], parse_qs(url.query)
+
+    def do_POST(self):
+        parts, query = self._parts()
+        if parts != ["reports"]:
+            self._send_json(404, {"error": "Not found"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            self._send_json(413, {"error": f"Submission larger than {MAX_BODY_BYTES} bytes"})
+            return
+        body = self.rfile.read(length)
+        try:
+            json_data = json_backend.validate_submission(json_backend.load(io.BytesIO(body)))
+        except Exception as e:
+            self._send_json(400, {"error": f"Invalid submission: {e}"})
+            return
+        student_name = query.get("student_name", ["Student"])[0]
+        priority = query.get("priority", ["bulk"])[0]
+        tenant = query.get("tenant", ["default"])[0]
+        if priority not in PRIORITY_CLASSES:
+            self._send_json(400, {"error": f"priority must be one of {', '.join(PRIORITY_CLASSES)}"})
+            return
+        try:
+            job_id = self.server.service.submit(json_data, student_name, priority, tenant, source_hash(body))
+        except QueueFull as e:
+            self._send_json(429, {"error": str(e)}, {"Retry-After": "5"})
+            return
+        self._send_json(202, {"job_id": job_id, "status_url": f"/reports/{job_id}"}, {"Location": f"/reports/{job_id}"})
+
+    def do_GET(self):
+        parts, _ = self._parts()
+        service = self.server.service
+        if parts == ["health"]:
+            self._send_json(200, service.stats())
+        elif len(parts) == 2 and parts[0] == "reports":
+            job = service.status(parts[1])
+            if job is None:
+                self._send_json(404, {"error": "Unknown job"})
+            else:
+                self._send_json(200, job)
+        elif len(parts) == 3 and parts[0] == "reports" and parts[2] == "pdf":
+            job = service.status(parts[1])
+            path = service.pdf_path(parts[1])
+            if job is None:
+                self._send_json(404, {"error": "Unknown job"})
+            elif job["state"] != "done" or path is None:
+                self._send_json(409, {"error": f"Report is {job['state']}", "job": job})
+            else:
+                with open(path, "rb") as f:
+                    body = f.read()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/pdf")
+                self.send_header("Content-Length", str(len(body)))
+                file_stem = re.sub(r"[^A-Za-z0-9._-]+", "_", job["student_name"])
+                self.send_header("Content-Disposition", f'attachment; filename="{file_stem}_Performance_Report.pdf"')
+                self.end_headers()
+                self.wfile.write(body)
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+def make_server(service, host="127.0.0.1", port=8600, quiet=False):
+    """HTTP server bound to host:port that hands requests to the given ReportService"""
+    server = ThreadingHTTPServer((host, port), ReportRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.quiet = quiet
+    return server
+
+def serve(host="127.0.0.1", port=8600, workers=None, queue_size=64, output_dir=SERVICE_OUTPUT_DIR, keep=1000):
+    """Run the service until interrupted"""
+    service = ReportService(workers, queue_size, output_dir, keep)
+    server = make_server(service, host, port)
+    print(f"Serving reports on http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve report generation over HTTP")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind (default: localhost only)")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--workers", type=int, help="Report worker processes (default: CPU count)")
+    parser.add_argument("--queue-size", type=int, default=64, help="Unfinished jobs per priority class before answering 429")
+    parser.add_argument("--output", default=SERVICE_OUTPUT_DIR, help="Directory for finished PDFs")
+    parser.add_argument("--keep", type=int, default=1000, help="Finished jobs kept before the oldest are dropped")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.queue_size, args.output, args.keep)
@@ -0,0 +1,108 @@
+"""Priority scheduling of report jobs onto a ReportPool.
+
+multiprocessing.Pool runs tasks strictly first in, first out, so a teacher's report queued
+behind a bulk batch waits for the whole batch. ReportScheduler keeps the queue itself and
+only hands the pool as many jobs as it has workers. Free slots go to the interactive class
+first and bulk work uses what is left; each class has a concurrency limit (bulk leaves one
+worker free for interactive work by default), and within a class tenants (schools, classes,
+API clients) are served round-robin so one large batch cannot starve another tenant's jobs.
+"""
+import threading
+from collections import OrderedDict, deque
+
+PRIORITY_CLASSES = ("interactive", "bulk")
+
+def default_limits(slots):
+    """Interactive may use every worker; bulk keeps one free whenever there is more than one"""
+    return {"interactive": slots, "bulk": max(1, slots - 1)}
+
+class ReportScheduler:
+    """Priority classes with per-class concurrency limits and round-robin fairness across tenants"""
+
+    def __init__(self, pool, slots=None, limits=None):
+        self._pool = pool
+        self.slots = slots or pool.processes
+        self.limits = {**default_limits(self.slots), **(limits or {})}
+        self._queues = {priority: OrderedDict() for priority in PRIORITY_CLASSES}
+        self._queued = dict.fromkeys(PRIORITY_CLASSES, 0)
+        self._running = dict.fromkeys(PRIORITY_CLASSES, 0)
+        # Jobs the pool refused, failed once the lock is released
+        self._rejected = []
+        self._lock = threading.Lock()
+
+    def submit(self, json_data, student_name="Student", priority="bulk", tenant="default",
+               callback=None, error_callback=None, on_start=None, source_key=None):
+        """Queue one report; the callbacks run on the pool's result thread like Pool.apply_async"""
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority class {priority!r}; expected one of {PRIORITY_CLASSES}")
+        with self._lock:
+            self._queues[priority].setdefault(tenant, deque()).append(
+                (json_data, student_name, callback, error_callback, on_start, source_key)
+            )
+            self._queued[priority] += 1
+            self._dispatch()
+        self._fail_rejected()
+
+    def _next_job(self, priority):
+        # Take one job from the tenant at the head and move that tenant to the back
+        tenants = self._queues[priority]
+        tenant, jobs = next(iter(tenants.items()))
+        job = jobs.popleft()
+        del tenants[tenant]
+        if jobs:
+            tenants[tenant] = jobs
+        self._queued[priority] -= 1
+        return job
+
+    def _dispatch(self):
+        """Fill free worker slots in priority order; called with the lock held"""
+        while sum(self._running.values()) < self.slots:
+            priority = next((p for p in PRIORITY_CLASSES
+                             if self._queued[p] and self._running[p] < self.limits[p]), None)
+            if priority is None:
+                return
+            json_data, student_name, callback, error_callback, on_start, source_key = self._next_job(priority)
+            self._running[priority] += 1
+            if on_start is not None:
+                on_start()
+            try:
+                self._pool.submit(
+                    json_data, student_name,
+                    callback=self._completion(priority, callback),
+                    error_callback=self._completion(priority, error_callback),
+                    source_key=source_key
+                )
+            except Exception as exc:
+                # The job never reached a worker, so its slot is free again
+                self._running[priority] -= 1
+                self._rejected.append((error_callback, exc))
+
+    def _fail_rejected(self):
+        """Run the error callbacks of jobs the pool refused; called without the lock"""
+        with self._lock:
+            rejected, self._rejected = self._rejected, []
+        for error_callback, exc in rejected:
+            if error_callback is not None:
+                error_callback(exc)
+
+    def _completion(self, priority, handler):
+        def done(value):
+            with self._lock:
+                self._running[priority] -= 1
+                self._dispatch()
+            self._fail_rejected()
+            if handler is not None:
+                handler(value)
+        return done
+
+    def queued(self, priority=None):
+        with self._lock:
+            return self._queued[priority] if priority else sum(self._queued.values())
+
+    def stats(self):
+        with self._lock:
+            return {
+                priority: {"queued": self._queued[priority], "running": self._running[priority],
+                           "limit": self.limits[priority], "tenants": len(self._queues[priority])}
+                for priority in PRIORITY_CLASSES
+            }
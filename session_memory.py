@@ -0,0 +1,185 @@
+"""Per-session memory budget for the dashboard.
+
+Streamlit keeps st.session_state alive for every open browser tab, so large values stored
+there (parsed submissions, finished reports) add up with the number of connected users.
+SessionMemory holds those values instead, keyed by a per-session id, and bounds them:
+
+- each session keeps at most session_budget bytes in RAM; beyond that its least recently
+  used values are spilled. Values registered with a reload callable (for example parsed
+  tables that already sit in the columnar cache) are simply dropped and rebuilt from their
+  disk copy on the next get; anything else is pickled to spill_dir and read back on demand.
+- sessions idle for longer than idle_timeout, and the least recently active sessions once
+  every session together holds more than total_budget bytes, are evicted: their values and
+  spill files are deleted and the dashboard reloads them from disk if the user comes back.
+"""
+import os
+import pickle
+import shutil
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import pandas as pd
+
+SPILL_DIR = os.environ.get("FAST_EDA_SPILL_DIR", os.path.join(".cache", "sessions"))
+SESSION_BUDGET_BYTES = int(os.environ.get("FAST_EDA_SESSION_BUDGET_MB", "32")) * 1024 * 1024
+TOTAL_BUDGET_BYTES = int(os.environ.get("FAST_EDA_MEMORY_BUDGET_MB", "1024")) * 1024 * 1024
+IDLE_TIMEOUT = 30 * 60
+
+def value_nbytes(value):
+    """Approximate memory held by a value: deep size of DataFrames, buffers and nested containers"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(value_nbytes(k) + value_nbytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(value_nbytes(item) for item in value)
+    return sys.getsizeof(value)
+
+class SessionMemory:
+    """Values per session under a per-session and a process-wide byte budget"""
+
+    def __init__(self, session_budget=SESSION_BUDGET_BYTES, total_budget=TOTAL_BUDGET_BYTES,
+                 idle_timeout=IDLE_TIMEOUT, spill_dir=SPILL_DIR):
+        self.session_budget = session_budget
+        self.total_budget = total_budget
+        self.idle_timeout = idle_timeout
+        self.spill_dir = spill_dir
+        # session_id -> {"entries": OrderedDict(name -> entry), "last_seen": float, "reloads": int},
+        # both ordered least recently used first
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, session_id, name, value, reload=None):
+        """Store a value; reload, if given, rebuilds it from an existing disk copy after a spill"""
+        with self._lock:
+            session = self._touch(session_id)
+            self._discard(session, name)
+            session["entries"][name] = {"value": value, "nbytes": value_nbytes(value), "path": None, "reload": reload}
+            self._enforce(session_id, session)
+
+    def get(self, session_id, name, default=None):
+        """The stored value, read back from disk if it was spilled, or default when absent or evicted"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            entry = session["entries"].get(name) if session is not None else None
+            if entry is None:
+                return default
+            self._touch(session_id)
+            session["entries"].move_to_end(name)
+            value = entry["value"]
+            if value is None:
+                value = self._restore(entry)
+                if value is None:
+                    del session["entries"][name]
+                    return default
+                session["reloads"] += 1
+                entry.update(value=value, nbytes=value_nbytes(value))
+                self._enforce(session_id, session)
+            return value
+
+    def discard(self, session_id, name):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._discard(session, name)
+
+    def drop_session(self, session_id):
+        """Forget a session and delete its spill files"""
+        with self._lock:
+            self._evict(session_id)
+
+    def evict_idle(self, now=None):
+        """Evict sessions idle for longer than idle_timeout; returns their ids"""
+        now = time.time() if now is None else now
+        evicted = []
+        with self._lock:
+            for session_id, session in list(self._sessions.items()):
+                if now - session["last_seen"] <= self.idle_timeout:
+                    break
+                self._evict(session_id)
+                evicted.append(session_id)
+        return evicted
+
+    def stats(self, now=None):
+        """Memory per session (RAM and spilled bytes, entries, reloads, idle seconds) and totals"""
+        now = time.time() if now is None else now
+        with self._lock:
+            sessions = {
+                session_id: {
+                    "memory_bytes": self._memory_bytes(session),
+                    "spilled_bytes": sum(e["nbytes"] for e in session["entries"].values() if e["value"] is None),
+                    "entries": len(session["entries"]),
+                    "reloads": session["reloads"],
+                    "idle_s": now - session["last_seen"]
+                }
+                for session_id, session in self._sessions.items()
+            }
+        return {
+            "sessions": len(sessions),
+            "memory_bytes": sum(s["memory_bytes"] for s in sessions.values()),
+            "spilled_bytes": sum(s["spilled_bytes"] for s in sessions.values()),
+            "per_session": sessions
+        }
+
+    def _touch(self, session_id):
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = {"entries": OrderedDict(), "last_seen": 0.0, "reloads": 0}
+        session["last_seen"] = time.time()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    @staticmethod
+    def _memory_bytes(session):
+        return sum(entry["nbytes"] for entry in session["entries"].values() if entry["value"] is not None)
+
+    def _enforce(self, session_id, session):
+        """Spill this session's coldest values, then evict the least recently active other sessions"""
+        for entry in session["entries"].values():
+            if self._memory_bytes(session) <= self.session_budget:
+                break
+            if entry["value"] is not None:
+                self._spill(session_id, entry)
+        total = sum(self._memory_bytes(s) for s in self._sessions.values())
+        for other_id in list(self._sessions):
+            if total <= self.total_budget:
+                break
+            if other_id != session_id:
+                total -= self._memory_bytes(self._sessions[other_id])
+                self._evict(other_id)
+
+    def _spill(self, session_id, entry):
+        if entry["reload"] is None:
+            directory = os.path.join(self.spill_dir, session_id)
+            os.makedirs(directory, exist_ok=True)
+            entry["path"] = os.path.join(directory, f"{uuid.uuid4().hex}.pkl")
+            with open(entry["path"], "wb") as f:
+                pickle.dump(entry["value"], f, protocol=pickle.HIGHEST_PROTOCOL)
+        entry["value"] = None
+
+    @staticmethod
+    def _restore(entry):
+        if entry["path"] is None:
+            return entry["reload"]() if entry["reload"] is not None else None
+        try:
+            with open(entry["path"], "rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        os.remove(entry["path"])
+        entry["path"] = None
+        return value
+
+    def _discard(self, session, name):
+        entry = session["entries"].pop(name, None)
+        if entry is not None and entry["path"] is not None and os.path.exists(entry["path"]):
+            os.remove(entry["path"])
+
+    def _evict(self, session_id):
+        if self._sessions.pop(session_id, None) is not None:
+            shutil.rmtree(os.path.join(self.spill_dir, session_id), ignore_errors=True)
@@ -0,0 +1,437 @@
+"""Sharded batch execution across hosts sharing only a directory.
+
+The batch is split into tasks (chunks of submission files) written to QUEUE/tasks. Each
+node claims a task by creating QUEUE/leases/<task>.<generation>.lease with O_EXCL, renews
+the lease while it works and, when the task is finished, publishes the task's partial
+cohort aggregates and sketches plus a done marker. Nodes walk the task list from different
+offsets so they rarely contend, and an idle node takes over any task whose lease has
+expired (its node died or stalled) by creating the next generation's file, again with
+O_EXCL, so exactly one node wins and lease files are never renamed or reused.
+
+Expiry is judged by each observer on its own monotonic clock (how long the holder's renewal
+counter has stood still), never by comparing timestamps written on different hosts. A node
+that stalls past its lease may still believe it holds the task, so the generation doubles
+as a fencing token: partials are written under it and the done marker, created with a
+hard link that fails if it exists, records which generation's partials count. The first
+node to finish a task wins and a late duplicate discards its partials. The merge step
+folds finished tasks into the existing cohort aggregate store and sketches (once per
+target, tracked in QUEUE/merged.json) and ingests the cached parsed tables into the
+analytics store and history index. The updated stores and ledger are first written together
+to QUEUE/merge-journal.json, so a merge interrupted while saving them is completed by the
+next one instead of adding its tasks twice.
+
+Usage:
+    python sharded_batch.py enqueue QUEUE SUBMISSION [SUBMISSION ...] [--chunk N]
+    python sharded_batch.py work QUEUE OUTPUT_DIR [--node NAME] [--workers N] [--lease S] [--no-reports]
+    python sharded_batch.py merge QUEUE
+    python sharded_batch.py status QUEUE
+"""
+import argparse
+import io
+import json
+import os
+import socket
+import time
+import uuid
+import zlib
+
+import json_backend
+from cohort_aggregates import AGGREGATE_STORE_PATH, AggregateStore
+from cohort_ranks import COHORT_SKETCH_PATH, CohortSketches
+from batch_reports import report_name, report_stems
+from columnar_cache import source_hash, load_parsed, write_parsed
+
+DEFAULT_LEASE_SECONDS = 120
+
+def _dirs(queue_dir):
+    return {name: os.path.join(queue_dir, name) for name in ("tasks", "leases", "done", "partials", "cache")}
+
+def _write_json_atomic(path, payload):
+    tmp_path = f"{path}.tmp-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+def _read_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _apply_journal(journal_path, ledger_path):
+    """Save the stores and ledger recorded in a merge journal, then drop the journal
+
+    Applying a journal twice writes the same files again, so this is safe to repeat after a crash.
+    """
+    journal = _read_json(journal_path)
+    for path, state in journal["stores"]:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        _write_json_atomic(path, state)
+    _write_json_atomic(ledger_path, journal["ledger"])
+    os.remove(journal_path)
+
+def enqueue(queue_dir, inputs, chunk=25):
+    """Split input files into task files; returns the number of tasks written
+
+    Each task records its inputs' report names (see batch_reports.report_stems). Raises
+    ValueError when two inputs, in this call or an earlier one, would share a report.
+    """
+    dirs = _dirs(queue_dir)
+    for path in dirs.values():
+        os.makedirs(path, exist_ok=True)
+    stems = report_stems(inputs)
+    task_names = sorted(os.listdir(dirs["tasks"]))
+    owners = {}
+    for name in task_names:
+        for path, stem in _read_json(os.path.join(dirs["tasks"], name)).get("reports", {}).items():
+            owners[stem] = path
+    for path, stem in stems.items():
+        if owners.get(stem, path) != path:
+            raise ValueError(f"{owners[stem]} and {path} would both be written to {stem}.pdf")
+    inputs = sorted(stems)
+    tasks = [inputs[i:i + chunk] for i in range(0, len(inputs), chunk)]
+    for offset, paths in enumerate(tasks):
+        _write_json_atomic(os.path.join(dirs["tasks"], f"{len(task_names) + offset:06d}.json"),
+                           {"inputs": paths, "reports": {path: stems[path] for path in paths}})
+    return len(tasks)
+
+class Lease:
+    """Exclusive, expiring claim on one task held through generation-numbered files in the leases directory
+
+    Generations are created in order with O_EXCL, so the highest existing one is the current
+    lease and each generation has exactly one holder, the only node that ever writes its file.
+    """
+
+    def __init__(self, leases_dir, task_id, node, duration):
+        self.leases_dir = leases_dir
+        self.task_id = task_id
+        self.node = node
+        self.duration = duration
+        self.token = uuid.uuid4().hex
+        self.generation = None
+        self.renewals = 0
+        self._latest = 0
+
+    def path(self, generation):
+        return os.path.join(self.leases_dir, f"{self.task_id}.{generation:06d}.lease")
+
+    def _payload(self, released=False):
+        return {"node": self.node, "token": self.token, "generation": self.generation,
+                "renewals": self.renewals, "duration": self.duration, "released": released}
+
+    def current(self):
+        """Generation of the newest lease file (0 when the task was never leased) and its payload"""
+        while os.path.exists(self.path(self._latest + 1)):
+            self._latest += 1
+        if self._latest == 0:
+            return 0, None
+        try:
+            return self._latest, _read_json(self.path(self._latest))
+        except (FileNotFoundError, ValueError):
+            # Just created and not written yet
+            return self._latest, None
+
+    def acquire(self, seen):
+        """Take the lease if it is free, released or expired; seen is this node's {task: (state, since)}
+
+        A lease counts as expired once its generation and renewal counter have not changed for
+        the holder's lease duration, measured on this node's monotonic clock from when it first
+        saw that state.
+        """
+        generation, payload = self.current()
+        if generation and not (payload or {}).get("released"):
+            state = (generation, payload.get("renewals") if payload else None)
+            now = time.monotonic()
+            if self.task_id not in seen or seen[self.task_id][0] != state:
+                seen[self.task_id] = (state, now)
+                return False
+            duration = payload.get("duration", self.duration) if payload else self.duration
+            if now - seen[self.task_id][1] < duration:
+                return False
+        return self._create(generation + 1)
+
+    def _create(self, generation):
+        try:
+            fd = os.open(self.path(generation), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        self.generation = self._latest = generation
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self._payload(), f)
+        return True
+
+    def held(self):
+        """True while no other node has taken over; a stalled holder can still be fenced at commit"""
+        return self.generation is not None and self.current()[0] == self.generation
+
+    def renew(self):
+        """Show other nodes this holder is alive; returns False when the lease was taken over"""
+        if not self.held():
+            return False
+        self.renewals += 1
+        _write_json_atomic(self.path(self.generation), self._payload())
+        return True
+
+    def release(self):
+        """Let other nodes claim the task straight away instead of waiting for the lease to expire"""
+        if self.held():
+            _write_json_atomic(self.path(self.generation), self._payload(released=True))
+
+def _task_order(task_names, node):
+    """Start each node at a different task so nodes spread out instead of racing for the first one"""
+    if not task_names:
+        return []
+    offset = zlib.crc32(node.encode("utf-8")) % len(task_names)
+    return task_names[offset:] + task_names[:offset]
+
+def _partial_path(dirs, task_id, generation, kind):
+    return os.path.join(dirs["partials"], f"{task_id}.{generation:06d}.{kind}.json")
+
+def _commit(dirs, task_id, summary):
+    """Publish a task's done marker unless another node already did; the first commit wins"""
+    path = os.path.join(dirs["done"], f"{task_id}.json")
+    tmp_path = f"{path}.tmp-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f)
+    try:
+        # link() fails when the target exists, so the marker is created whole and only once
+        os.link(tmp_path, path)
+        return True
+    except FileExistsError:
+        return False
+    finally:
+        os.remove(tmp_path)
+
+def _run_task(task_id, task, dirs, output_dir, pool, lease, pipeline):
+    """Process one task's files; returns the task summary or None when the lease was lost"""
+    paths = task["inputs"]
+    stems = task.get("reports", {})
+    aggregates = AggregateStore()
+    cohort = CohortSketches()
+    items = []
+    reports = []
+    for path in paths:
+        item = {"path": path, "hash": None, "output": None, "error": None}
+        try:
+            with open(path, "rb") as f:
+                raw = f.read()
+            item["hash"] = source_hash(raw)
+            json_data = json_backend.validate_submission(json_backend.load(io.BytesIO(raw)))
+            parsed_data = pipeline.parse_json_data(json_data)
+            if parsed_data is None:
+                raise ValueError("Failed to parse the JSON data")
+            write_parsed(item["hash"], parsed_data, pipeline.extract_chapter_source(parsed_data["raw_data"]), dirs["cache"])
+            aggregates.add(parsed_data["questions_df"])
+            cohort.add_submission(parsed_data["questions_df"])
+            if pool is not None:
+                item["output"] = os.path.join(output_dir, f"{stems.get(path, report_name(path))}.pdf")
+                reports.append((pool.submit(json_data, report_name(path), source_key=item["hash"]), item))
+        except Exception as e:
+            item["error"] = str(e)
+        items.append(item)
+        if not lease.renew():
+            return None
+    for result, item in reports:
+        while not result.ready():
+            result.wait(min(lease.duration / 4, 5))
+            if not lease.renew():
+                return None
+        try:
+            pdf_bytes = result.get()
+            os.makedirs(os.path.dirname(item["output"]), exist_ok=True)
+            tmp_path = f"{item['output']}.tmp-{os.getpid()}"
+            with open(tmp_path, "wb") as f:
+                f.write(pdf_bytes)
+            os.replace(tmp_path, item["output"])
+        except Exception as e:
+            item["error"] = str(e)
+            item["output"] = None
+    if not lease.held():
+        return None
+    _write_json_atomic(_partial_path(dirs, task_id, lease.generation, "aggregates"), aggregates.to_dict())
+    _write_json_atomic(_partial_path(dirs, task_id, lease.generation, "sketches"), cohort.to_dict())
+    return {"task": task_id, "node": lease.node, "generation": lease.generation, "finished_at": time.time(),
+            "items": items}
+
+def work(queue_dir, output_dir, node=None, workers=None, lease_seconds=DEFAULT_LEASE_SECONDS,
+         reports=True, poll=5.0):
+    """Claim and run tasks until every task is done; returns the number of tasks this node finished"""
+    # Import the pipeline before claiming anything so the first lease is not spent on imports
+    import main
+
+    node = node or f"{socket.gethostname()}-{os.getpid()}"
+    dirs = _dirs(queue_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    pool = None
+    if reports:
+        from report_pool import ReportPool
+
+        pool = ReportPool(workers)
+    finished = 0
+    seen = {}
+    try:
+        while True:
+            task_names = sorted(name[:-5] for name in os.listdir(dirs["tasks"]) if name.endswith(".json"))
+            remaining = [task_id for task_id in task_names if not os.path.exists(os.path.join(dirs["done"], f"{task_id}.json"))]
+            if not remaining:
+                return finished
+            claimed = False
+            for task_id in _task_order(remaining, node):
+                if os.path.exists(os.path.join(dirs["done"], f"{task_id}.json")):
+                    continue
+                lease = Lease(dirs["leases"], task_id, node, lease_seconds)
+                if not lease.acquire(seen):
+                    continue
+                claimed = True
+                # A finished task may have been marked done after the listing above
+                if not os.path.exists(os.path.join(dirs["done"], f"{task_id}.json")):
+                    summary = _run_task(task_id, _read_json(os.path.join(dirs["tasks"], f"{task_id}.json")),
+                                        dirs, output_dir, pool, lease, main)
+                    if summary is not None:
+                        if _commit(dirs, task_id, summary):
+                            finished += 1
+                        else:
+                            # A node that held an earlier generation finished first; its partials count
+                            for kind in ("aggregates", "sketches"):
+                                os.remove(_partial_path(dirs, task_id, lease.generation, kind))
+                lease.release()
+                break
+            if not claimed:
+                # Everything left is leased by live nodes; wait for them to finish or expire
+                time.sleep(poll)
+    finally:
+        if pool is not None:
+            pool.close()
+
+def status(queue_dir):
+    """Task counts: total, done, leased (unfinished with an unreleased lease) and lease takeovers
+
+    Whether a lease has expired depends on watching it over time (see Lease.acquire), so a
+    single status call cannot tell live leases from dead ones.
+    """
+    dirs = _dirs(queue_dir)
+    tasks = [name[:-5] for name in os.listdir(dirs["tasks"]) if name.endswith(".json")]
+    done = {name[:-5] for name in os.listdir(dirs["done"]) if name.endswith(".json")}
+    leased = takeovers = 0
+    for task_id in tasks:
+        generation, payload = Lease(dirs["leases"], task_id, None, 0).current()
+        takeovers += max(generation - 1, 0)
+        leased += task_id not in done and generation > 0 and not (payload or {}).get("released")
+    return {"tasks": len(tasks), "done": len(done), "leased": leased, "takeovers": takeovers}
+
+def _load_or_rebuild(item, dirs, pipeline):
+    """Parsed tables of a finished item from the shared cache, re-parsed from its source when evicted
+
+    Returns None when the cache entry is gone and the source file is missing or has changed.
+    """
+    parsed_data = load_parsed(item["hash"], cache_dir=dirs["cache"])
+    if parsed_data is not None:
+        return parsed_data
+    try:
+        with open(item["path"], "rb") as f:
+            raw = f.read()
+    except OSError:
+        return None
+    if source_hash(raw) != item["hash"]:
+        return None
+    parsed_data = pipeline.parse_json_data(json_backend.validate_submission(json_backend.load(io.BytesIO(raw))))
+    if parsed_data is not None:
+        write_parsed(item["hash"], parsed_data, pipeline.extract_chapter_source(parsed_data["raw_data"]), dirs["cache"])
+    return parsed_data
+
+def merge(queue_dir, aggregates_path=AGGREGATE_STORE_PATH, sketches_path=COHORT_SKETCH_PATH,
+          analytics=True, history=True):
+    """Fold finished tasks into the existing cohort stores and summary indexes
+
+    The stores at aggregates_path and sketches_path are loaded and added to, not replaced.
+    QUEUE/merged.json records which tasks went into which pair of stores, so merging again
+    (say after more tasks finished) only adds the new ones. Returns (aggregates, cohort,
+    missing): the updated stores and the items whose parsed tables could be neither loaded
+    from the cache nor rebuilt from their source, which are left out of the indexes.
+    """
+    dirs = _dirs(queue_dir)
+    ledger_path = os.path.join(queue_dir, "merged.json")
+    journal_path = os.path.join(queue_dir, "merge-journal.json")
+    if os.path.exists(journal_path):
+        _apply_journal(journal_path, ledger_path)
+    ledger = _read_json(ledger_path) if os.path.exists(ledger_path) else {}
+    target = "|".join(os.path.abspath(path) for path in (aggregates_path, sketches_path))
+    merged = set(ledger.get(target, []))
+    aggregates = AggregateStore.load(aggregates_path)
+    cohort = CohortSketches.load(sketches_path) or CohortSketches()
+    new_tasks = []
+    items = []
+    for name in sorted(os.listdir(dirs["done"])):
+        if not name.endswith(".json") or name[:-5] in merged:
+            continue
+        task_id = name[:-5]
+        summary = _read_json(os.path.join(dirs["done"], name))
+        generation = summary["generation"]
+        aggregates.merge(AggregateStore.from_dict(_read_json(_partial_path(dirs, task_id, generation, "aggregates"))))
+        cohort.merge(CohortSketches.from_dict(_read_json(_partial_path(dirs, task_id, generation, "sketches"))))
+        items.extend(item for item in summary["items"] if item["error"] is None)
+        new_tasks.append(task_id)
+    missing = []
+    if items and (analytics or history):
+        import main
+        from analytics_store import AnalyticsStore
+        from history_index import HistoryIndex
+
+        parsed = []
+        for item in items:
+            parsed_data = _load_or_rebuild(item, dirs, main)
+            if parsed_data is None:
+                missing.append(item)
+            else:
+                parsed.append((parsed_data, item["hash"]))
+        # Both indexes replace rows by key, so re-ingesting after an interrupted merge is harmless
+        if analytics:
+            with AnalyticsStore() as store:
+                for i in range(0, len(parsed), 500):
+                    store.ingest_many(parsed[i:i + 500])
+        if history:
+            with HistoryIndex() as index:
+                for parsed_data, _ in parsed:
+                    if parsed_data.get("student_id"):
+                        index.record_attempt(parsed_data["student_id"], parsed_data)
+    ledger[target] = sorted(merged.union(new_tasks))
+    # The journal is the merge's single commit point; the stores and ledger are saved from it
+    _write_json_atomic(journal_path, {
+        "ledger": ledger,
+        "stores": [[aggregates_path, aggregates.to_dict()], [sketches_path, cohort.to_dict()]]
+    })
+    _apply_journal(journal_path, ledger_path)
+    return aggregates, cohort, missing
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a batch across several hosts through a shared work queue")
+    commands = parser.add_subparsers(dest="command", required=True)
+    enqueue_parser = commands.add_parser("enqueue", help="Split submissions into tasks")
+    enqueue_parser.add_argument("queue")
+    enqueue_parser.add_argument("submissions", nargs="+", help="Submission JSON files (optionally compressed)")
+    enqueue_parser.add_argument("--chunk", type=int, default=25, help="Submissions per task")
+    work_parser = commands.add_parser("work", help="Claim and run tasks until the queue is drained")
+    work_parser.add_argument("queue")
+    work_parser.add_argument("output_dir", help="Shared directory for the PDF reports")
+    work_parser.add_argument("--node", help="Node name (default: hostname-pid)")
+    work_parser.add_argument("--workers", type=int, help="Report worker processes on this node")
+    work_parser.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS, help="Lease duration in seconds")
+    work_parser.add_argument("--no-reports", action="store_true", help="Only build aggregates and parsed caches")
+    merge_parser = commands.add_parser("merge", help="Add finished tasks to the cohort stores and indexes")
+    merge_parser.add_argument("queue")
+    merge_parser.add_argument("--aggregates", default=AGGREGATE_STORE_PATH)
+    merge_parser.add_argument("--sketches", default=COHORT_SKETCH_PATH)
+    status_parser = commands.add_parser("status", help="Show task progress")
+    status_parser.add_argument("queue")
+    args = parser.parse_args()
+
+    if args.command == "enqueue":
+        print(f"Enqueued {enqueue(args.queue, args.submissions, args.chunk)} tasks in {args.queue}")
+    elif args.command == "work":
+        finished = work(args.queue, args.output_dir, args.node, args.workers, args.lease, not args.no_reports)
+        print(f"Node finished {finished} tasks")
+    elif args.command == "merge":
+        aggregates, cohort, missing = merge(args.queue, args.aggregates, args.sketches)
+        print(f"{args.aggregates} and {args.sketches} now hold {aggregates.submissions} submissions")
+        for item in missing:
+            print(f"Skipped {item['path']}: parsed cache entry missing and source unavailable or changed")
+    else:
+        print(", ".join(f"{key}={value}" for key, value in status(args.queue).items()))
@@ -0,0 +1,121 @@
+"""Zero-copy handoff of questions_df to worker processes.
+
+publish_frame() copies the parsed columns once into a single multiprocessing.shared_memory
+block and returns a small picklable FrameHandle. Workers pass the handle to attach_frame()
+and get a DataFrame whose numeric columns are read-only views over the shared block, so
+the per-task payload is the handle only, whatever the size of the frame.
+"""
+from collections import namedtuple
+from multiprocessing import shared_memory
+import gc
+import sys
+import weakref
+
+import numpy as np
+import pandas as pd
+
+# One entry per column: (name, dtype string, byte offset, categories or None)
+FrameHandle = namedtuple("FrameHandle", ["shm_name", "n_rows", "columns"])
+
+_ALIGNMENT = 64
+_attached = {}
+# Weak references to the arrays attach_frame built over each block, and blocks waiting to be unmapped
+_views = {}
+_detached = set()
+
+def _column_values(series):
+    """Return (array, categories) for a column; strings are stored as int32 codes"""
+    if series.dtype.kind in "biuf":
+        return np.ascontiguousarray(series.to_numpy()), None
+    codes, uniques = pd.factorize(series)
+    return codes.astype(np.int32), tuple(uniques)
+
+class SharedFrame:
+    """Owner of a published frame; close() releases the shared-memory block"""
+
+    def __init__(self, shm, handle):
+        self._shm = shm
+        self.handle = handle
+
+    def close(self):
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def publish_frame(df):
+    """Copy the columns of a DataFrame into one shared-memory block"""
+    layout = []
+    arrays = []
+    offset = 0
+    for name in df.columns:
+        values, categories = _column_values(df[name])
+        offset = -(-offset // _ALIGNMENT) * _ALIGNMENT
+        layout.append((name, values.dtype.str, offset, categories))
+        arrays.append((values, offset))
+        offset += values.nbytes
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for values, start in arrays:
+        target = np.ndarray(values.shape, dtype=values.dtype, buffer=shm.buf, offset=start)
+        target[:] = values
+    return SharedFrame(shm, FrameHandle(shm.name, len(df), tuple(layout)))
+
+def _open_block(shm_name):
+    """Attach to a shared-memory block, mapped until detach_frame()"""
+    if shm_name not in _attached:
+        if sys.version_info >= (3, 13):
+            _attached[shm_name] = shared_memory.SharedMemory(name=shm_name, track=False)
+        else:
+            _attached[shm_name] = shared_memory.SharedMemory(name=shm_name)
+    return _attached[shm_name]
+
+def attach_frame(handle):
+    """Rebuild a DataFrame over a published block; numeric columns are zero-copy read-only views"""
+    _unmap_unused()
+    _detached.discard(handle.shm_name)
+    shm = _open_block(handle.shm_name)
+    views = _views.setdefault(handle.shm_name, [])
+    columns = {}
+    for name, dtype, offset, categories in handle.columns:
+        values = np.ndarray((handle.n_rows,), dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+        values.flags.writeable = False
+        views.append(weakref.ref(values))
+        if categories is not None:
+            lookup = np.empty(len(categories) + 1, dtype=object)
+            lookup[:-1] = categories
+            lookup[-1] = np.nan
+            values = lookup[values]
+        columns[name] = values
+    return pd.DataFrame(columns, copy=False)
+
+def _unmap_unused():
+    """Unmap detached blocks that no attached array (or view derived from one) still uses"""
+    for shm_name in list(_detached):
+        if any(ref() is not None for ref in _views.get(shm_name, ())):
+            continue
+        _detached.discard(shm_name)
+        _views.pop(shm_name, None)
+        shm = _attached.pop(shm_name, None)
+        if shm is not None:
+            shm.close()
+
+def detach_frame(handle):
+    """Unmap a block in this process once every frame attached from it is gone; returns whether it was
+
+    numpy arrays over the block do not keep the mapping alive, so unmapping under a live frame
+    would leave it reading freed memory. While such arrays are still referenced the block stays
+    mapped, and a later attach_frame or detach_frame call unmaps it once they are collected.
+    """
+    _detached.add(handle.shm_name)
+    _unmap_unused()
+    if handle.shm_name in _detached:
+        # Frames are often only kept alive by reference cycles
+        gc.collect()
+        _unmap_unused()
+    return handle.shm_name not in _attached
@@ -0,0 +1,58 @@
+"""Student, test and date identifiers carried by a submission export"""
+from datetime import datetime, timezone
+
+DATE_FIELDS = ["submittedAt", "endTime", "endedAt", "startTime", "startedAt", "createdAt", "updatedAt"]
+STUDENT_FIELDS = ["userId", "user", "studentId", "student"]
+
+def _oid(value):
+    """String id from a Mongo-style {"$oid": ...} / {"_id": ...} object or a plain value"""
+    if isinstance(value, dict):
+        if "$oid" in value:
+            return str(value["$oid"])
+        if "_id" in value:
+            return _oid(value["_id"])
+        return None
+    if value in (None, ""):
+        return None
+    return str(value)
+
+def parse_timestamp(value):
+    """datetime (UTC) from an ISO string, epoch milliseconds or a {"$date": ...} wrapper"""
+    if isinstance(value, dict):
+        value = value.get("$date")
+        if isinstance(value, dict):
+            value = value.get("$numberLong")
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        if isinstance(value, (int, float)) or (isinstance(value, str) and value.isdigit()):
+            return datetime.fromtimestamp(int(value) / 1000, tz=timezone.utc)
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except (ValueError, OverflowError, OSError):
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def submission_datetime(data):
+    """When the attempt was taken, from the submission or its test, or None if not recorded"""
+    for source in (data, data.get("test", {})):
+        for field in DATE_FIELDS:
+            taken_at = parse_timestamp(source.get(field))
+            if taken_at is not None:
+                return taken_at
+    return None
+
+def format_test_date(taken_at):
+    return taken_at.strftime("%d %B %Y") if taken_at else "N/A"
+
+def student_id(data):
+    """Stable student identifier from the submission, or None if the export has none"""
+    for field in STUDENT_FIELDS:
+        value = _oid(data.get(field))
+        if value:
+            return value
+    return None
+
+def test_id(data):
+    """Test identifier: the test's id when exported, otherwise its title"""
+    test = data.get("test", {})
+    return _oid(test.get("_id")) or _oid(data.get("testId")) or test.get("title", "QPT 1")
@@ -0,0 +1,50 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import make_submission  # noqa: E402
+
+class OfflineModel:
+    """Stands in for the Gemini model: every call fails, so the pipeline takes its fallbacks"""
+
+    def generate_content(self, prompt):
+        raise RuntimeError("Gemini unavailable")
+
+class ManualPool:
+    """Records submitted jobs; the test finishes them one at a time"""
+
+    processes = 2
+
+    def __init__(self):
+        self.running = []
+        self.started = []
+
+    def submit(self, json_data, student_name, callback=None, error_callback=None, source_key=None):
+        self.running.append((student_name, callback, error_callback))
+        self.started.append(student_name)
+
+    def finish(self, name=None, error=None):
+        index = 0 if name is None else [job[0] for job in self.running].index(name)
+        student_name, callback, error_callback = self.running.pop(index)
+        if error is None:
+            callback(b"%PDF")
+        else:
+            error_callback(error)
+
+@pytest.fixture
+def manual_pool():
+    return ManualPool()
+
+@pytest.fixture
+def offline_gemini(monkeypatch):
+    import main
+
+    monkeypatch.setattr(main, "model", OfflineModel())
+
+@pytest.fixture
+def submission():
+    """Build a synthetic submission: submission(questions_per_subject=25, seed=0)"""
+    return lambda questions_per_subject=25, seed=0: make_submission(questions_per_subject, seed)[0]
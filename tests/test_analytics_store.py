@@ -0,0 +1,28 @@
+import sqlite3
+
+import main
+from analytics_store import AnalyticsStore
+
+def test_ingest_holds_the_write_lock_against_another_writer(tmp_path, submission):
+    path = str(tmp_path / "analytics.sqlite")
+    parsed = main.parse_json_data(submission(questions_per_subject=5))
+    with AnalyticsStore(path, backend="sqlite") as store, AnalyticsStore(path, backend="sqlite") as other:
+        other.conn.execute("PRAGMA busy_timeout = 0")
+        statements = []
+
+        def interleave(statement):
+            # Another process tries to write right after this ingest's transaction has begun
+            statements.append(statement)
+            if len(statements) == 2:
+                try:
+                    other.ingest(parsed)
+                except sqlite3.OperationalError:
+                    statements.append("locked out")
+
+        store.conn.set_trace_callback(interleave)
+        ids = store.ingest_many([(parsed, None), (parsed, "s2")])
+        store.conn.set_trace_callback(None)
+        assert "locked out" in statements
+        ids.append(other.ingest(parsed, "s3"))
+        assert len(set(ids)) == store.count() == 3
+        assert store.accuracy(by=())["questions"][0] == 3 * len(parsed["questions_df"])
@@ -0,0 +1,31 @@
+from artifact_store import ArtifactStore, artifact_key
+
+def test_key_ignores_dict_order():
+    assert artifact_key("report", {"a": 1, "b": 2}) == artifact_key("report", {"b": 2, "a": 1})
+
+def test_key_changes_with_every_input():
+    base = artifact_key("report", "pdf", "source", "Student")
+    assert base != artifact_key("report", "html", "source", "Student")
+    assert base != artifact_key("report", "pdf", "source", "Other")
+    assert artifact_key(1) != artifact_key(1.0)
+
+def test_store_round_trip(tmp_path):
+    store = ArtifactStore(directory=str(tmp_path), suffix=".pdf")
+    key = artifact_key("report", 1)
+    assert store.get(key) is None
+    path = store.put(key, b"%PDF")
+    assert path.endswith(".pdf") and store.get(key) == b"%PDF"
+    assert [p.name for p in tmp_path.rglob("*")] == [key[:2], f"{key}.pdf"]
+
+def test_get_or_build_builds_once(tmp_path):
+    store = ArtifactStore(directory=str(tmp_path))
+    builds = []
+    build = lambda: builds.append(1) or b"data"
+    assert store.get_or_build("ab" * 32, build) == b"data"
+    assert store.get_or_build("ab" * 32, build) == b"data"
+    assert len(builds) == 1
+
+def test_get_or_build_skips_unwanted_results(tmp_path):
+    store = ArtifactStore(directory=str(tmp_path))
+    assert store.get_or_build("cd" * 32, lambda: b"degraded", should_store=lambda: False) == b"degraded"
+    assert store.get("cd" * 32) is None
@@ -0,0 +1,65 @@
+import json
+import os
+
+import pytest
+
+from batch_reports import JobManifest, report_paths, run_batch
+
+class FinishedReport:
+    def ready(self):
+        return True
+
+    def get(self):
+        return b"%PDF"
+
+class CountingPool:
+    """Stands in for the ReportPool: finishes every report at once and counts them"""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, json_data, name, source_key=None):
+        self.submitted.append(name)
+        return FinishedReport()
+
+def test_reports_mirror_input_directories(tmp_path):
+    inputs = [str(tmp_path / "a" / "s1.json"), str(tmp_path / "b" / "s1.json.gz"), str(tmp_path / "a" / "s1.v2.json")]
+    out = str(tmp_path / "out")
+    paths = report_paths(inputs, out)
+    assert paths[inputs[0]] == os.path.join(out, "a", "s1.pdf")
+    assert paths[inputs[1]] == os.path.join(out, "b", "s1.pdf")
+    assert paths[inputs[2]] == os.path.join(out, "a", "s1.v2.pdf")
+
+def test_single_directory_keeps_flat_names(tmp_path):
+    path = str(tmp_path / "s1.json")
+    assert report_paths([path, path], str(tmp_path / "out")) == {path: str(tmp_path / "out" / "s1.pdf")}
+
+def test_colliding_inputs_are_refused(tmp_path):
+    with pytest.raises(ValueError, match="both be written"):
+        report_paths([str(tmp_path / "s1.json"), str(tmp_path / "s1.json.gz")], str(tmp_path / "out"))
+
+def test_manifest_refuses_an_output_owned_by_another_input(tmp_path):
+    output = str(tmp_path / "out" / "s1.pdf")
+    with JobManifest(str(tmp_path / "manifest.sqlite")) as manifest:
+        assert manifest.register("/data/a/s1.json", "h1", "s1", output)
+        with pytest.raises(ValueError, match="already holds"):
+            manifest.register("/data/b/s1.json", "h2", "s1", output)
+        assert manifest.pending() == ["/data/a/s1.json"]
+
+def test_rerun_with_a_subset_keeps_the_first_runs_reports(tmp_path, submission):
+    inputs = [tmp_path / "in" / "a" / "s1.json", tmp_path / "in" / "b" / "s2.json"]
+    for seed, path in enumerate(inputs):
+        path.parent.mkdir(parents=True)
+        path.write_text(json.dumps(submission(seed=seed)), encoding="utf-8")
+    out, pool = str(tmp_path / "out"), CountingPool()
+    assert run_batch([str(path) for path in inputs], out, pool=pool)["done"] == 2
+    # On its own a/s1.json would map to out/s1.pdf; the recorded root keeps it at out/a/s1.pdf
+    assert run_batch([str(inputs[0])], out, pool=pool)["done"] == 2
+    assert pool.submitted == ["s1", "s2"]
+    assert os.path.exists(os.path.join(out, "a", "s1.pdf"))
+    assert not os.path.exists(os.path.join(out, "s1.pdf"))
+    outside = tmp_path / "elsewhere" / "s3.json"
+    outside.parent.mkdir()
+    outside.write_text(json.dumps(submission(seed=3)), encoding="utf-8")
+    with pytest.raises(ValueError, match="outside"):
+        run_batch([str(outside)], out, pool=pool)
@@ -0,0 +1,68 @@
+import copy
+
+import pandas as pd
+import pytest
+
+from cohort_aggregates import GROUP_KEYS, AggregateStore
+
+@pytest.fixture
+def frames(submission):
+    import main
+
+    return [main.parse_json_data(submission(seed=seed))["questions_df"] for seed in range(3)]
+
+def expected(frames):
+    """Per-group count, correct, mean and population variance straight from pandas"""
+    combined = pd.concat(frames)
+    grouped = combined.groupby(GROUP_KEYS)
+    return {
+        key: (len(group), int(group["isCorrect"].sum()), group["timeTaken"].mean(), group["timeTaken"].var(ddof=0))
+        for key, group in grouped
+    }
+
+def assert_matches(store, frames):
+    want = expected(frames)
+    assert set(store.groups) == set(want)
+    for key, (count, correct, mean, var) in want.items():
+        state = store.groups[key]
+        assert state[:2] == [count, correct]
+        assert state[2] == pytest.approx(mean)
+        assert state[3] / state[0] == pytest.approx(var, abs=1e-6)
+
+def test_add_matches_pandas(frames):
+    store = AggregateStore()
+    for frame in frames:
+        store.add(frame)
+    assert store.submissions == 3
+    assert_matches(store, frames)
+
+def test_remove_undoes_add(frames):
+    store = AggregateStore()
+    for frame in frames:
+        store.add(frame)
+    store.remove(frames[1])
+    assert store.submissions == 2
+    assert_matches(store, [frames[0], frames[2]])
+
+def test_merge_equals_adding_everything(frames):
+    left, right = AggregateStore(), AggregateStore()
+    left.add(frames[0])
+    right.add(frames[1])
+    right.add(frames[2])
+    merged = left.merge(right)
+    assert merged.submissions == 3
+    assert_matches(merged, frames)
+
+def test_removing_an_unknown_submission_changes_nothing(frames):
+    store = AggregateStore()
+    store.add(frames[0])
+    before = copy.deepcopy(store.to_dict())
+    unknown = frames[0].copy()
+    unknown.loc[unknown.index[-1], "chapter"] = "Never added"
+    with pytest.raises(KeyError):
+        store.remove(unknown)
+    assert store.to_dict() == before
+    store.remove(frames[0])
+    with pytest.raises(KeyError):
+        store.remove(frames[0])
+    assert store.submissions == 0 and store.groups == {}
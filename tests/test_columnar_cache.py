@@ -0,0 +1,20 @@
+import io
+
+import columnar_cache
+from columnar_cache import HASH_CHUNK_BYTES, load_parsed, source_hash, source_hash_file, write_parsed
+
+def test_chunked_hash_matches_whole_bytes_and_rewinds():
+    data = bytes(range(256)) * (HASH_CHUNK_BYTES // 100)
+    fp = io.BytesIO(data)
+    fp.seek(10)
+    assert source_hash_file(fp) == source_hash(data)
+    assert fp.tell() == 0
+
+def test_entries_from_another_cache_version_are_misses(tmp_path, submission, monkeypatch):
+    import main
+
+    parsed_data = main.parse_json_data(submission(seed=1))
+    write_parsed("key", parsed_data, main.extract_chapter_source(parsed_data["raw_data"]), str(tmp_path))
+    assert load_parsed("key", cache_dir=str(tmp_path))["questions_df"].equals(parsed_data["questions_df"])
+    monkeypatch.setattr(columnar_cache, "CACHE_VERSION", columnar_cache.CACHE_VERSION + 1)
+    assert load_parsed("key", cache_dir=str(tmp_path)) is None
@@ -0,0 +1,62 @@
+import bz2
+import gzip
+import io
+import json
+
+import pytest
+
+import json_backend
+
+DOCUMENT = {"sections": [{"title": "Physics", "questions": [{"timeTaken": 12, "subjectId": "x"}]}], "name": "é"}
+RAW = json.dumps(DOCUMENT).encode("utf-8")
+
+def compressed(kind):
+    if kind == "zstd":
+        zstandard = pytest.importorskip("zstandard")
+        return zstandard.ZstdCompressor().compress(RAW)
+    return {"plain": RAW, "gzip": gzip.compress(RAW), "bz2": bz2.compress(RAW)}[kind]
+
+@pytest.mark.parametrize("backend", json_backend.available_backends())
+@pytest.mark.parametrize("kind", ["plain", "gzip", "bz2", "zstd"])
+def test_load_decompresses_and_leaves_file_open(kind, backend):
+    fp = io.BytesIO(compressed(kind))
+    assert json_backend.load(fp, backend) == DOCUMENT
+    assert not fp.closed
+
+def test_detect_compression():
+    assert json_backend.detect_compression(gzip.compress(b"{}")[:4]) == "gzip"
+    assert json_backend.detect_compression(bz2.compress(b"{}")[:4]) == "bz2"
+    assert json_backend.detect_compression(b'{"a"') is None
+
+@pytest.mark.parametrize("backend", json_backend.available_backends())
+def test_malformed_input_raises_json_decode_error(backend):
+    with pytest.raises(json.JSONDecodeError):
+        json_backend.load(io.BytesIO(gzip.compress(b'{"sections": [')), backend)
+
+@pytest.mark.parametrize("backend", json_backend.available_backends())
+def test_trailing_data_is_rejected(backend):
+    with pytest.raises(json.JSONDecodeError):
+        json_backend.load(io.BytesIO(RAW + b" {}"), backend)
+
+class RecordingReader(io.BytesIO):
+    """Remembers the size of every read so tests can tell streaming from buffering"""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.reads = []
+
+    def read(self, size=-1):
+        self.reads.append(size)
+        return super().read(size)
+
+    def readinto(self, buffer):
+        self.reads.append(len(buffer))
+        return super().readinto(buffer)
+
+def test_default_load_streams_in_bounded_reads():
+    pytest.importorskip("ijson")
+    big = {"sections": [{"title": "Physics", "questions": [{"timeTaken": n} for n in range(50000)]}]}
+    fp = RecordingReader(json.dumps(big).encode("utf-8"))
+    assert json_backend.load(fp) == big
+    assert len(fp.reads) > 1
+    assert all(0 <= size <= json_backend.STREAM_BUFFER_BYTES for size in fp.reads)
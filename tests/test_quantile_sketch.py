@@ -0,0 +1,65 @@
+import random
+
+import pytest
+
+from cohort_ranks import CohortSketches
+from quantile_sketch import KLLSketch
+
+N = 50000
+MAX_RANK_ERROR = 0.02
+
+@pytest.fixture
+def values():
+    rng = random.Random(7)
+    return [rng.gauss(0, 1) for _ in range(N)]
+
+def assert_accurate(sketch, values):
+    ordered = sorted(values)
+    for q in (0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99):
+        true_value = ordered[int(q * (len(ordered) - 1))]
+        assert sketch.rank(true_value) == pytest.approx(q, abs=MAX_RANK_ERROR)
+        estimate = sketch.quantile(q)
+        assert sum(v <= estimate for v in ordered) / len(ordered) == pytest.approx(q, abs=MAX_RANK_ERROR)
+
+def test_ranks_and_quantiles_stay_within_error(values):
+    sketch = KLLSketch(k=200, seed=1)
+    sketch.update_many(values)
+    assert sketch.n == N
+    assert sketch.size < 3 * sketch.k
+    assert_accurate(sketch, values)
+
+def test_merged_partials_match_the_whole_stream(values):
+    parts = [KLLSketch(k=200, seed=seed) for seed in range(5)]
+    for i, value in enumerate(values):
+        parts[i % len(parts)].update(value)
+    merged = parts[0]
+    for part in parts[1:]:
+        merged.merge(part)
+    assert merged.n == N
+    assert merged.size < 3 * merged.k
+    assert_accurate(merged, values)
+
+def test_round_trip_keeps_answers(values):
+    sketch = KLLSketch(k=100, seed=3)
+    sketch.update_many(values[:5000])
+    restored = KLLSketch.from_dict(sketch.to_dict())
+    assert restored.n == sketch.n
+    assert [restored.quantile(q) for q in (0.1, 0.5, 0.9)] == [sketch.quantile(q) for q in (0.1, 0.5, 0.9)]
+
+def test_empty_sketch_answers_nan():
+    sketch = KLLSketch()
+    assert sketch.rank(0) != sketch.rank(0)
+    assert sketch.quantile(0.5) != sketch.quantile(0.5)
+
+def test_cohort_merge_equals_single_cohort(submission):
+    import main
+
+    frames = [main.parse_json_data(submission(seed=seed))["questions_df"] for seed in range(6)]
+    whole, left, right = CohortSketches(), CohortSketches(), CohortSketches()
+    for i, frame in enumerate(frames):
+        whole.add_submission(frame)
+        (left if i % 2 else right).add_submission(frame)
+    merged = CohortSketches.from_dict(left.merge(right).to_dict())
+    assert merged.n == whole.n == 6
+    # Below k observations nothing is compacted, so ranks are exact
+    assert merged.percentile_ranks(frames[0]) == whole.percentile_ranks(frames[0])
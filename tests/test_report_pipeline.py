@@ -0,0 +1,62 @@
+import pytest
+
+import main
+
+class EchoModel:
+    """A Gemini stand-in that always answers, with a JSON body both prompts can use"""
+
+    class Response:
+        text = '{"Physics": ["Electrostatics"], "Chemistry": [], "Mathematics": []}'
+
+    def generate_content(self, prompt):
+        return self.Response()
+
+@pytest.fixture
+def parsed(submission):
+    parsed_data = main.parse_json_data(submission(questions_per_subject=5))
+    parsed_data["raw_data"] = main.extract_chapter_source(parsed_data["raw_data"])
+    return parsed_data
+
+def test_stage_warnings_bypass_streamlit(parsed, offline_gemini, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("st.* called from the report pipeline")
+
+    monkeypatch.setattr(main.st, "warning", fail)
+    monkeypatch.setattr(main.st, "error", fail)
+    warnings = []
+    report = main.build_report(parsed, "Student", report_format="html", on_warning=warnings.append)
+    assert report.startswith(b"<!DOCTYPE html>")
+    assert any("Gemini API Error" in warning for warning in warnings)
+
+def stored_reports(directory):
+    return [path for path in directory.rglob("*.html")]
+
+def test_fallback_report_is_not_cached(parsed, offline_gemini, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    first = main.build_report(parsed, "Student", source_key="source", report_format="html", on_warning=lambda m: None)
+    assert first.startswith(b"<!DOCTYPE html>")
+    assert stored_reports(tmp_path) == []
+
+def test_complete_report_is_cached(parsed, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main, "model", EchoModel())
+    warnings = []
+    report = main.build_report(parsed, "Student", source_key="source", report_format="html", on_warning=warnings.append)
+    assert warnings == []
+    assert len(stored_reports(tmp_path)) == 1
+    assert main.cached_report("source", "Student", report_format="html") == report
+    monkeypatch.setattr(main, "report_sections", lambda *args, **kwargs: pytest.fail("rebuilt a cached report"))
+    assert main.build_report(parsed, "Student", source_key="source", report_format="html") == report
+
+def test_svg_settings_do_not_leak_into_rcparams():
+    import matplotlib
+
+    before = {key: matplotlib.rcParams[key] for key in main.SVG_RC}
+    svgs = []
+    for _ in range(2):
+        with main.chart_figure((2, 2)) as (fig, ax):
+            ax.set_title("Accuracy")
+            svgs.append(main.figure_to_bytes(fig, "svg"))
+    assert {key: matplotlib.rcParams[key] for key in main.SVG_RC} == before
+    assert b">Accuracy</text>" in svgs[0]
+    assert svgs[0] == svgs[1]
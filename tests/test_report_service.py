@@ -0,0 +1,76 @@
+import http.client
+import json
+import os
+import threading
+
+import pytest
+
+from report_service import QueueFull, ReportService, make_server
+
+@pytest.fixture
+def service(tmp_path, manual_pool):
+    service = ReportService(queue_size=1, output_dir=str(tmp_path / "reports"), keep=1, pool=manual_pool)
+    yield service
+    service.close()
+
+@pytest.fixture
+def server(service):
+    server = make_server(service, port=0, quiet=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def request(server, method, path, body=None):
+    connection = http.client.HTTPConnection(*server.server_address, timeout=10)
+    try:
+        connection.request(method, path, body=body)
+        response = connection.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        connection.close()
+
+def test_full_class_answers_429_and_other_classes_still_run(server, submission, manual_pool):
+    body = json.dumps(submission(questions_per_subject=2)).encode("utf-8")
+    status, headers, payload = request(server, "POST", "/reports?student_name=Asha", body)
+    assert status == 202 and headers["Location"] == f"/reports/{json.loads(payload)['job_id']}"
+    status, headers, _ = request(server, "POST", "/reports", body)
+    assert status == 429 and headers["Retry-After"] == "5"
+    status, _, _ = request(server, "POST", "/reports?priority=interactive", body)
+    assert status == 202
+    manual_pool.finish("Asha")
+    # A finished job frees its class again
+    assert request(server, "POST", "/reports", body)[0] == 202
+
+def test_finished_report_can_be_downloaded(server, submission, manual_pool):
+    body = json.dumps(submission(questions_per_subject=2)).encode("utf-8")
+    job_id = json.loads(request(server, "POST", "/reports?student_name=Asha%20K", body)[2])["job_id"]
+    status, _, payload = request(server, "GET", f"/reports/{job_id}/pdf")
+    assert status == 409 and json.loads(payload)["job"]["state"] == "running"
+    manual_pool.finish()
+    assert json.loads(request(server, "GET", f"/reports/{job_id}")[2])["state"] == "done"
+    status, headers, payload = request(server, "GET", f"/reports/{job_id}/pdf")
+    assert status == 200 and payload == b"%PDF"
+    assert 'filename="Asha_K_Performance_Report.pdf"' in headers["Content-Disposition"]
+
+def test_bad_requests_are_rejected(server, submission):
+    assert request(server, "POST", "/reports", b"{not json")[0] == 400
+    body = json.dumps(submission(questions_per_subject=2)).encode("utf-8")
+    status, _, payload = request(server, "POST", "/reports?priority=urgent", body)
+    assert status == 400 and b"priority must be one of" in payload
+    assert request(server, "GET", "/reports/unknown")[0] == 404
+    assert request(server, "GET", "/elsewhere")[0] == 404
+
+def test_oldest_finished_reports_are_evicted(service, manual_pool):
+    first = service.submit({}, "first")
+    manual_pool.finish()
+    first_path = service.pdf_path(first)
+    assert os.path.exists(first_path)
+    second = service.submit({}, "second")
+    with pytest.raises(QueueFull):
+        service.submit({}, "third")
+    manual_pool.finish(error=RuntimeError("render failed"))
+    assert service.status(first) is None and not os.path.exists(first_path)
+    assert service.status(second)["state"] == "failed"
+    assert service.stats()["failed"] == 1
@@ -0,0 +1,93 @@
+import pytest
+
+import main
+
+def parse(submission, seed):
+    return main.parse_json_data(submission(seed=seed))
+
+def test_template_shared_across_attempt_dates(submission):
+    main._report_templates.clear()
+    first, second = parse(submission, 0), parse(submission, 1)
+    assert first["test_info"]["date"] != second["test_info"]["date"]
+    template = main.report_template(first["test_info"], first["questions_df"])
+    assert main.report_template(second["test_info"], second["questions_df"]) is template
+    assert len(main._report_templates) == 1
+
+def test_template_split_by_test(submission):
+    main._report_templates.clear()
+    first, second = parse(submission, 0), parse(submission, 1)
+    second["test_info"] = {**second["test_info"], "test_id": "another-test"}
+    assert main.report_template(first["test_info"], first["questions_df"]) is not \
+        main.report_template(second["test_info"], second["questions_df"])
+
+def test_cover_shows_each_students_date(submission):
+    main._report_templates.clear()
+    for seed in (0, 1):
+        parsed = parse(submission, seed)
+        template = main.report_template(parsed["test_info"], parsed["questions_df"])
+        pdf = template.new_document(parsed["test_info"]["date"])
+        pdf.set_compression(False)
+        assert f"{parsed['test_info']['name']} - {parsed['test_info']['date']}".encode() in bytes(pdf.output())
+
+def test_template_chapter_summary_matches_groupby(submission):
+    parsed = parse(submission, 0)
+    questions_df = parsed["questions_df"]
+    fast = main.chapter_summary_table(questions_df, main.report_template(parsed["test_info"], questions_df))
+    slow = main.chapter_summary_table(questions_df)
+    assert list(fast["Chapter"]) == list(slow["Chapter"])
+    assert (fast["Accuracy (%)"].to_numpy() == slow["Accuracy (%)"].to_numpy()).all()
+
+FEEDBACK = "### Intro\nHello.\n### Subject-wise Analysis\nSteady.\n### Actionable Suggestions\n**Physics:**\n- Revise Electrostatics"
+PERCENTILES = {"cohort_size": 10, "overall_accuracy": 55.0, "subject_accuracy": {"Physics": 40.0}, "chapter_avg_time": {}}
+
+def render(parsed, template):
+    return main.generate_analysis_pdf(
+        parsed["questions_df"], parsed["subject_data"], main.split_feedback_sections(FEEDBACK), {}, [],
+        parsed["test_info"], "Student", PERCENTILES, template
+    )
+
+def test_replayed_blocks_render_like_drawn_ones(submission):
+    fitz = pytest.importorskip("fitz")
+    main._report_templates.clear()
+    for seed in (0, 1):
+        parsed = parse(submission, seed)
+        template = main.report_template(parsed["test_info"], parsed["questions_df"])
+        replayed, drawn = fitz.open(stream=render(parsed, template)), fitz.open(stream=render(parsed, None))
+        assert replayed.page_count == drawn.page_count
+        for replayed_page, drawn_page in zip(replayed, drawn):
+            replayed_words, drawn_words = replayed_page.get_text("words"), drawn_page.get_text("words")
+            assert [w[4] for w in replayed_words] == [w[4] for w in drawn_words]
+            for a, b in zip(replayed_words, drawn_words):
+                assert a[:4] == pytest.approx(b[:4], abs=0.05)
+    # Section titles, subtitles, table headers and the cover were recorded once for both students
+    assert len(template.blocks) >= 10
+
+def test_blocks_are_recorded_once_per_template(submission, monkeypatch):
+    main._report_templates.clear()
+    parsed = parse(submission, 0)
+    template = main.report_template(parsed["test_info"], parsed["questions_df"])
+    render(parsed, template)
+    recorded = len(template.blocks)
+    monkeypatch.setattr(main.StaticBlock, "record", None)
+    render(parse(submission, 1), template)
+    assert len(template.blocks) == recorded
+
+def test_long_cells_and_headers_are_cut_to_their_columns():
+    fitz = pytest.importorskip("fitz")
+    chapter = "Electrostatics and Capacitance of Conducting Spheres in Uniform External Fields " * 2
+    data = {"Chapter": [chapter.strip(), "Optics"], "Questions": ["3", "4"]}
+    headers = ["Chapter", "Questions answered within the time limit"]
+    pdf = main.PDF()
+    pdf.add_page()
+    pdf.set_font("Helvetica", "", 8)
+    widths = pdf._content_widths(headers, [pdf.string_widths(data[key]) for key in data])
+    assert sum(widths) == pytest.approx(pdf.epw)  # scaled down from the overflowing content
+    pdf.add_table(data, headers, widths=widths)
+    points = 72 / 25.4
+    edges = [(pdf.l_margin + sum(widths[:i])) * points for i in range(len(widths) + 1)]
+    words = fitz.open(stream=bytes(pdf.output()))[0].get_text("words")
+    for x0, _, x1, _, text, *_ in words:
+        column = max(i for i in range(len(widths)) if edges[i] <= x0 + 0.01)
+        assert x1 <= edges[column + 1], text
+    cut = [w[4] for w in words if w[4].endswith("...")]
+    assert len(cut) == 2  # the chapter and the header
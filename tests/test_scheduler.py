@@ -0,0 +1,63 @@
+import pytest
+
+from scheduler import ReportScheduler
+
+def test_bulk_leaves_a_worker_for_interactive_jobs(manual_pool):
+    scheduler = ReportScheduler(manual_pool)
+    for n in range(3):
+        scheduler.submit({}, f"bulk{n}")
+    assert manual_pool.started == ["bulk0"]
+    scheduler.submit({}, "teacher", priority="interactive")
+    assert manual_pool.started == ["bulk0", "teacher"]
+    assert scheduler.stats()["bulk"] == {"queued": 2, "running": 1, "limit": 1, "tenants": 1}
+
+def test_interactive_jobs_jump_the_bulk_queue(manual_pool):
+    scheduler = ReportScheduler(manual_pool, slots=1)
+    scheduler.submit({}, "bulk0")
+    scheduler.submit({}, "bulk1")
+    scheduler.submit({}, "teacher", priority="interactive")
+    manual_pool.finish()
+    manual_pool.finish(error=RuntimeError("render failed"))
+    assert manual_pool.started == ["bulk0", "teacher", "bulk1"]
+    assert scheduler.queued() == 0
+
+def test_tenants_take_turns_within_a_class(manual_pool):
+    scheduler = ReportScheduler(manual_pool, slots=1)
+    scheduler.submit({}, "warmup", tenant="other")
+    for n in range(3):
+        scheduler.submit({}, f"a{n}", tenant="a")
+    scheduler.submit({}, "b0", tenant="b")
+    while manual_pool.running:
+        manual_pool.finish()
+    assert manual_pool.started == ["warmup", "a0", "b0", "a1", "a2"]
+
+def test_callbacks_run_after_the_slot_is_released(manual_pool):
+    scheduler = ReportScheduler(manual_pool, slots=1)
+    results, errors = [], []
+    scheduler.submit({}, "ok", callback=results.append)
+    scheduler.submit({}, "broken", error_callback=errors.append)
+    manual_pool.finish()
+    manual_pool.finish(error=ValueError("bad"))
+    assert results == [b"%PDF"] and [str(e) for e in errors] == ["bad"]
+    assert scheduler.stats()["bulk"]["running"] == 0
+
+def test_job_the_pool_refuses_fails_and_frees_its_slot(manual_pool, monkeypatch):
+    submit = manual_pool.submit
+
+    def refuse(json_data, student_name, **kwargs):
+        if student_name == "refused":
+            raise RuntimeError("pool closed")
+        submit(json_data, student_name, **kwargs)
+
+    monkeypatch.setattr(manual_pool, "submit", refuse)
+    scheduler = ReportScheduler(manual_pool, slots=1)
+    errors = []
+    scheduler.submit({}, "refused", error_callback=errors.append)
+    scheduler.submit({}, "next")
+    assert [str(e) for e in errors] == ["pool closed"]
+    assert manual_pool.started == ["next"]
+    assert scheduler.stats()["bulk"]["running"] == 1
+
+def test_unknown_priority_is_rejected(manual_pool):
+    with pytest.raises(ValueError, match="Unknown priority"):
+        ReportScheduler(manual_pool).submit({}, priority="urgent")
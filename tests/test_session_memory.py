@@ -0,0 +1,76 @@
+import os
+import time
+
+import pytest
+
+from session_memory import SessionMemory, value_nbytes
+
+BLOB = b"x" * 1000
+
+@pytest.fixture
+def memory(tmp_path):
+    # Room for one blob per session and two in total
+    return SessionMemory(session_budget=int(value_nbytes(BLOB) * 1.5), total_budget=int(value_nbytes(BLOB) * 2.5),
+                         idle_timeout=60, spill_dir=str(tmp_path / "spill"))
+
+def spill_files(memory, session_id):
+    directory = os.path.join(memory.spill_dir, session_id)
+    return os.listdir(directory) if os.path.isdir(directory) else []
+
+def test_coldest_value_spills_to_disk_and_comes_back(memory):
+    memory.put("s", "a", BLOB + b"a")
+    memory.put("s", "b", BLOB + b"b")
+    assert len(spill_files(memory, "s")) == 1
+    stats = memory.stats()["per_session"]["s"]
+    assert stats["entries"] == 2 and stats["spilled_bytes"] == value_nbytes(BLOB + b"a")
+    assert memory.get("s", "a") == BLOB + b"a"
+    # Reading a back made b the coldest value, so b went to disk and a's file was removed
+    assert memory.stats()["per_session"]["s"]["reloads"] == 1
+    assert len(spill_files(memory, "s")) == 1
+    assert memory.get("s", "b") == BLOB + b"b"
+
+def test_values_with_a_reload_are_dropped_not_pickled(memory):
+    calls = []
+
+    def reload():
+        calls.append(1)
+        return BLOB + b"a"
+
+    memory.put("s", "a", BLOB + b"a", reload=reload)
+    memory.put("s", "b", BLOB + b"b")
+    assert spill_files(memory, "s") == []
+    assert memory.get("s", "a") == BLOB + b"a" and calls == [1]
+
+def test_failed_reload_returns_the_default(memory):
+    memory.put("s", "a", BLOB, reload=lambda: None)
+    memory.put("s", "b", BLOB)
+    assert memory.get("s", "a", "gone") == "gone"
+    assert memory.stats()["per_session"]["s"]["entries"] == 1
+
+def test_total_budget_evicts_the_least_recently_active_session(memory):
+    for session_id in ("old", "mid", "new"):
+        memory.put(session_id, "a", BLOB)
+        memory.put(session_id, "b", BLOB)
+    assert memory.get("old", "a", "evicted") == "evicted"
+    assert spill_files(memory, "old") == []
+    assert memory.get("new", "a") == BLOB
+    assert memory.stats()["memory_bytes"] <= memory.total_budget
+
+def test_idle_sessions_are_evicted_with_their_spill_files(memory):
+    memory.put("idle", "a", BLOB)
+    memory.put("idle", "b", BLOB)
+    assert spill_files(memory, "idle")
+    assert memory.evict_idle(now=time.time() + 30) == []
+    assert memory.evict_idle(now=time.time() + 61) == ["idle"]
+    assert not os.path.exists(os.path.join(memory.spill_dir, "idle"))
+    assert memory.get("idle", "a") is None
+
+def test_discard_and_drop_session_remove_spill_files(memory):
+    memory.put("s", "a", BLOB)
+    memory.put("s", "b", BLOB)
+    memory.discard("s", "a")
+    assert spill_files(memory, "s") == []
+    memory.put("s", "c", BLOB)
+    memory.drop_session("s")
+    assert memory.stats()["sessions"] == 0
+    assert not os.path.exists(os.path.join(memory.spill_dir, "s"))
@@ -0,0 +1,154 @@
+import json
+import os
+import time
+
+import pytest
+
+import sharded_batch
+from cohort_aggregates import AggregateStore
+from sharded_batch import Lease
+
+LEASE_SECONDS = 0.2
+
+@pytest.fixture
+def leases_dir(tmp_path):
+    return str(tmp_path)
+
+def wait_for_expiry(lease, seen):
+    """Watch a lease for longer than its duration; returns whether it could be taken over"""
+    assert not lease.acquire(seen)  # first sighting only starts the clock
+    time.sleep(LEASE_SECONDS * 1.5)
+    return lease.acquire(seen)
+
+def test_only_one_node_acquires_a_free_lease(leases_dir):
+    first = Lease(leases_dir, "000000", "a", LEASE_SECONDS)
+    second = Lease(leases_dir, "000000", "b", LEASE_SECONDS)
+    assert first.acquire({})
+    assert not second.acquire({})
+    assert first.held() and not second.held()
+
+def test_stale_lease_is_taken_over_once(leases_dir):
+    holder = Lease(leases_dir, "000000", "a", LEASE_SECONDS)
+    assert holder.acquire({})
+    b, c = Lease(leases_dir, "000000", "b", LEASE_SECONDS), Lease(leases_dir, "000000", "c", LEASE_SECONDS)
+    seen_b, seen_c = {}, {}
+    assert not b.acquire(seen_b) and not c.acquire(seen_c)
+    time.sleep(LEASE_SECONDS * 1.5)
+    # Both saw the same stale generation; only one can create the next one
+    assert b.acquire(seen_b)
+    assert not c.acquire(seen_c)
+    assert b.generation == 2 and b.held()
+    assert not holder.held() and not holder.renew()
+
+def test_renewed_lease_is_not_taken_over(leases_dir):
+    holder = Lease(leases_dir, "000000", "a", LEASE_SECONDS)
+    assert holder.acquire({})
+    other, seen = Lease(leases_dir, "000000", "b", LEASE_SECONDS), {}
+    assert not other.acquire(seen)
+    for _ in range(4):
+        time.sleep(LEASE_SECONDS / 2)
+        assert holder.renew()
+        assert not other.acquire(seen)
+    assert holder.held()
+
+def test_expiry_ignores_written_timestamps(leases_dir):
+    holder = Lease(leases_dir, "000000", "a", LEASE_SECONDS)
+    assert holder.acquire({})
+    # A holder whose clock runs far ahead cannot keep a dead lease alive, nor one far behind lose it
+    with open(holder.path(1), "w", encoding="utf-8") as f:
+        json.dump({**holder._payload(), "expires": time.time() + 3600}, f)
+    assert wait_for_expiry(Lease(leases_dir, "000000", "b", LEASE_SECONDS), {})
+
+def test_released_lease_is_free_immediately(leases_dir):
+    holder = Lease(leases_dir, "000000", "a", LEASE_SECONDS)
+    assert holder.acquire({})
+    holder.release()
+    assert Lease(leases_dir, "000000", "b", LEASE_SECONDS).acquire({})
+
+def test_first_commit_wins(tmp_path):
+    dirs = sharded_batch._dirs(str(tmp_path))
+    os.makedirs(dirs["done"])
+    assert sharded_batch._commit(dirs, "000000", {"generation": 1})
+    assert not sharded_batch._commit(dirs, "000000", {"generation": 2})
+    with open(os.path.join(dirs["done"], "000000.json"), encoding="utf-8") as f:
+        assert json.load(f)["generation"] == 1
+    assert os.listdir(dirs["done"]) == ["000000.json"]
+
+def run_queue(tmp_path, submission, n):
+    inputs = []
+    for seed in range(n):
+        path = tmp_path / f"submission_{seed}.json"
+        path.write_text(json.dumps(submission(seed=seed)), encoding="utf-8")
+        inputs.append(str(path))
+    queue_dir = str(tmp_path / "queue")
+    sharded_batch.enqueue(queue_dir, inputs, chunk=2)
+    assert sharded_batch.work(queue_dir, str(tmp_path / "reports"), node="node", reports=False, poll=0.1) == (n + 1) // 2
+    return queue_dir, inputs
+
+def test_merge_adds_to_existing_stores_once(tmp_path, submission, monkeypatch):
+    import main
+
+    monkeypatch.chdir(tmp_path)
+    queue_dir, _ = run_queue(tmp_path, submission, 4)
+    aggregates_path, sketches_path = str(tmp_path / "aggregates.json"), str(tmp_path / "sketches.json")
+    existing = AggregateStore()
+    existing.add(main.parse_json_data(submission(seed=99))["questions_df"])
+    existing.save(aggregates_path)
+    for _ in range(2):
+        aggregates, cohort, missing = sharded_batch.merge(queue_dir, aggregates_path, sketches_path)
+        assert aggregates.submissions == 5 and cohort.n == 4 and missing == []
+    assert AggregateStore.load(aggregates_path).submissions == 5
+
+def test_merge_interrupted_while_saving_is_completed_once(tmp_path, submission, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    queue_dir, _ = run_queue(tmp_path, submission, 4)
+    aggregates_path, sketches_path = str(tmp_path / "aggregates.json"), str(tmp_path / "sketches.json")
+    write_json_atomic = sharded_batch._write_json_atomic
+
+    def crash_after_aggregates(path, payload):
+        if path == sketches_path:
+            raise KeyboardInterrupt
+        write_json_atomic(path, payload)
+
+    monkeypatch.setattr(sharded_batch, "_write_json_atomic", crash_after_aggregates)
+    with pytest.raises(KeyboardInterrupt):
+        sharded_batch.merge(queue_dir, aggregates_path, sketches_path, analytics=False, history=False)
+    assert AggregateStore.load(aggregates_path).submissions == 4
+    monkeypatch.setattr(sharded_batch, "_write_json_atomic", write_json_atomic)
+    aggregates, cohort, _ = sharded_batch.merge(queue_dir, aggregates_path, sketches_path, analytics=False, history=False)
+    assert aggregates.submissions == 4 and cohort.n == 4
+    assert not os.path.exists(os.path.join(queue_dir, "merge-journal.json"))
+
+def test_merge_rebuilds_or_reports_missing_cache_entries(tmp_path, submission, monkeypatch):
+    import shutil
+
+    from columnar_cache import cache_path, source_hash
+
+    monkeypatch.chdir(tmp_path)
+    queue_dir, inputs = run_queue(tmp_path, submission, 2)
+    cache_dir = sharded_batch._dirs(queue_dir)["cache"]
+    for path in inputs:
+        with open(path, "rb") as f:
+            shutil.rmtree(cache_path(source_hash(f.read()), cache_dir))
+    os.remove(inputs[0])
+    _, _, missing = sharded_batch.merge(queue_dir, str(tmp_path / "a.json"), str(tmp_path / "s.json"))
+    assert [item["path"] for item in missing] == [os.path.abspath(inputs[0])]
+
+def test_enqueue_records_distinct_report_names(tmp_path):
+    queue_dir = str(tmp_path / "queue")
+    first, second = str(tmp_path / "a" / "s1.json"), str(tmp_path / "b" / "s1.json")
+    sharded_batch.enqueue(queue_dir, [first, second], chunk=1)
+    tasks_dir = sharded_batch._dirs(queue_dir)["tasks"]
+    reports = {}
+    for name in sorted(os.listdir(tasks_dir)):
+        with open(os.path.join(tasks_dir, name), encoding="utf-8") as f:
+            reports.update(json.load(f)["reports"])
+    assert reports == {first: os.path.join("a", "s1"), second: os.path.join("b", "s1")}
+
+def test_enqueue_refuses_colliding_reports(tmp_path):
+    queue_dir = str(tmp_path / "queue")
+    sharded_batch.enqueue(queue_dir, [str(tmp_path / "s1.json")])
+    with pytest.raises(ValueError, match="both be written"):
+        sharded_batch.enqueue(queue_dir, [str(tmp_path / "s1.json.gz")])
+    with pytest.raises(ValueError, match="both be written"):
+        sharded_batch.enqueue(queue_dir, [str(tmp_path / "s2.json"), str(tmp_path / "s2.json.gz")])
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+import shared_frame
+from shared_frame import attach_frame, detach_frame, publish_frame
+
+def frame():
+    return pd.DataFrame({
+        "timeTaken": np.arange(6), "isCorrect": [True, False] * 3,
+        "chapter": ["Sets", "Functions", "Sets", None, "Matrices", "Sets"]
+    })
+
+def test_attach_round_trip():
+    df = frame()
+    with publish_frame(df) as shared:
+        attached = attach_frame(shared.handle)
+        assert attached["timeTaken"].tolist() == df["timeTaken"].tolist()
+        assert attached["isCorrect"].tolist() == df["isCorrect"].tolist()
+        assert attached["chapter"].iloc[3] != attached["chapter"].iloc[3]  # NaN survives the codes
+        assert attached["chapter"].drop(3).tolist() == df["chapter"].drop(3).tolist()
+        del attached
+        assert detach_frame(shared.handle)
+
+def test_detach_waits_for_live_views():
+    with publish_frame(frame()) as shared:
+        attached = attach_frame(shared.handle)
+        column = attached["timeTaken"]
+        del attached
+        assert not detach_frame(shared.handle)
+        assert column.sum() == 15  # still mapped and readable
+        del column
+        assert detach_frame(shared.handle)
+        assert shared.handle.shm_name not in shared_frame._attached
+
+def _mapped_blocks():
+    return len(shared_frame._attached)
+
+def test_pool_workers_unmap_after_rendering(submission):
+    import main
+    from report_pool import ReportPool
+
+    questions_df = main.parse_json_data(submission(questions_per_subject=5))["questions_df"]
+    with ReportPool(processes=1) as pool, publish_frame(questions_df) as shared:
+        charts = pool.render_charts(shared.handle, "svg").get()
+        assert len(charts) == 17 and charts[0][2].lstrip().startswith(b"<")
+        assert pool._pool.apply(_mapped_blocks) == 0
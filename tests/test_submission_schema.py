@@ -0,0 +1,39 @@
+import pytest
+
+import json_backend
+from json_backend import SubmissionSchemaError, compile_schema
+
+def test_synthetic_submission_is_valid(submission):
+    data = submission()
+    assert json_backend.validate_submission([data]) is data
+    assert json_backend.validate_submission(data) is data
+
+@pytest.mark.parametrize("mutate, message", [
+    (lambda d: d.pop("sections"), "$: missing required field 'sections'"),
+    (lambda d: d.update(sections={}), "$.sections: expected array"),
+    (lambda d: d["sections"][0]["questions"][0].update(timeTaken=True), "timeTaken: expected number or string"),
+    (lambda d: d["sections"][0]["questions"][0]["questionId"].update(chapters=[]), "chapters: expected at least 1 item"),
+    (lambda d: d["test"].update(totalMarks="300"), "$.test.totalMarks: expected number, got str"),
+])
+def test_invalid_submission_reports_path(submission, mutate, message):
+    data = submission()
+    mutate(data)
+    with pytest.raises(SubmissionSchemaError, match=message.replace("$", r"\$").replace("[", r"\[")):
+        json_backend.validate_submission(data)
+
+def test_error_path_includes_list_indexes(submission):
+    data = submission()
+    data["sections"][1]["questions"][3]["subjectId"] = 7
+    with pytest.raises(SubmissionSchemaError, match=r"\$\[0\]\.sections\[1\]\.questions\[3\]\.subjectId"):
+        json_backend.validate_submission([data])
+
+def test_empty_upload_list_is_rejected():
+    with pytest.raises(SubmissionSchemaError):
+        json_backend.validate_submission([])
+
+def test_compile_schema_subset():
+    check = compile_schema({"type": "array", "minItems": 1, "items": {"type": ["number", "null"]}})
+    check([1, None, 2.5])
+    for bad in ([], [True], "x"):
+        with pytest.raises(SubmissionSchemaError):
+            check(bad)
@@ -0,0 +1,95 @@
+import gzip
+import json
+import os
+import shutil
+
+import pytest
+
+from analytics_store import ANALYTICS_STORE_PATH
+from cohort_aggregates import AggregateStore
+from columnar_cache import cache_path, load_parsed
+from watch_folder import CheckpointManifest, Ingestor, scan
+
+class FinishedReport:
+    def ready(self):
+        return True
+
+    def get(self):
+        return b"%PDF"
+
+class InstantPool:
+    """Stands in for the ReportPool: every report is finished as soon as it is submitted"""
+
+    def submit(self, json_data, name, source_key=None):
+        return FinishedReport()
+
+@pytest.fixture
+def watched(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    directory = tmp_path / "inbox"
+    directory.mkdir()
+    return directory
+
+def write(path, payload):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = json.dumps(payload).encode("utf-8")
+    path.write_bytes(gzip.compress(data) if path.name.endswith(".gz") else data)
+
+def test_failed_replacement_keeps_the_ingested_version(watched, submission):
+    manifest = CheckpointManifest(str(watched.parent / "manifest.json"))
+    ingestor = Ingestor()
+    path = watched / "s1.json"
+    write(path, submission(seed=1))
+    assert scan(str(watched), manifest, ingestor, settle=0) == (1, 0, 0)
+    good = manifest.ingested(str(path))
+    path.write_text("{not json", encoding="utf-8")
+    os.utime(path, ns=(1, 1))
+    assert scan(str(watched), manifest, ingestor, settle=0) == (0, 1, 0)
+    assert manifest.ingested(str(path)) == good
+    write(path, submission(seed=2))
+    assert scan(str(watched), manifest, ingestor, settle=0) == (1, 0, 0)
+    assert ingestor.aggregates.submissions == 1
+    assert manifest.ingested(str(path)) == manifest.digest(str(path)) != good
+
+def test_reports_mirror_the_tree_and_refuse_collisions(watched, submission, tmp_path):
+    manifest = CheckpointManifest(str(tmp_path / "manifest.json"))
+    ingestor = Ingestor()
+    ingestor.report_dir, ingestor.pool = str(tmp_path / "reports"), InstantPool()
+    for name in ["s1.json", "s1.v2.json", "sub/s1.json", "s1.json.gz"]:
+        write(watched / name, submission(seed=len(name)))
+    assert scan(str(watched), manifest, ingestor, settle=0, recursive=True) == (3, 1, 0)
+    ingestor.collect_reports(wait=True)
+    reports = sorted(os.path.relpath(os.path.join(root, name), ingestor.report_dir)
+                     for root, _, files in os.walk(ingestor.report_dir) for name in files)
+    assert reports == ["s1.pdf", "s1.v2.pdf", os.path.join("sub", "s1.pdf")]
+    assert manifest.entries[str(watched / "s1.json.gz")]["status"] == "failed"
+    # Ownership survives a restart
+    manifest.save()
+    assert CheckpointManifest(manifest.path).report_owner("s1") == str(watched / "s1.json")
+
+def test_replacement_after_cache_eviction_is_not_double_counted(watched, submission):
+    manifest = CheckpointManifest(str(watched.parent / "manifest.json"))
+    ingestor = Ingestor()
+    path = watched / "s1.json"
+
+    def replace(seed):
+        shutil.rmtree(cache_path(manifest.ingested(str(path))))
+        write(path, submission(seed=seed))
+        os.utime(path, ns=(seed, seed))
+        return scan(str(watched), manifest, ingestor, settle=0)
+
+    write(path, submission(seed=1))
+    assert scan(str(watched), manifest, ingestor, settle=0) == (1, 0, 0)
+    ingestor.flush()
+    # The evicted version is taken out through the analytics store
+    assert replace(2) == (1, 0, 0)
+    expected = AggregateStore()
+    expected.add(load_parsed(manifest.ingested(str(path)))["questions_df"])
+    assert ingestor.aggregates.to_dict() == expected.to_dict()
+    ingestor.flush()
+    # With nothing left to take out the replacement fails instead of being added on top
+    os.remove(ANALYTICS_STORE_PATH)
+    good = manifest.ingested(str(path))
+    assert replace(3) == (0, 1, 0)
+    assert manifest.ingested(str(path)) == good
+    assert ingestor.aggregates.to_dict() == expected.to_dict()
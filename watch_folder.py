@@ -0,0 +1,308 @@
+"""Watch-folder ingestion daemon.
+
+Watches a directory that submissions are dropped into, and ingests every new or changed file:
+the parsed tables go to the columnar cache, and the cohort aggregates, percentile sketches,
+history index and analytics store are updated; PDF reports can optionally be queued on a
+warm ReportPool. A checkpoint manifest records (path, size, mtime, content hash, status) for
+every file, so a restarted daemon skips finished files without even reading them. It also keeps
+the hash of the last version that made it into the stores, so a replacement that fails to
+ingest is retracted correctly once a good version arrives. Reports mirror the watched tree
+(sub/s1.json -> REPORTS/sub/s1.pdf) and are written atomically; a file whose report would
+overwrite another file's (s1.json next to s1.json.gz) fails instead.
+
+Change notification uses watchdog (inotify on Linux) when it is installed and otherwise a
+plain polling scan; the periodic scan also runs alongside watchdog, so files written while
+the daemon was down or missed by the notifier are always picked up.
+
+Usage: python watch_folder.py DIRECTORY [--reports DIR] [--interval S] [--settle S] [--once]
+"""
+import argparse
+import io
+import json
+import os
+import signal
+import threading
+import time
+
+import json_backend
+from batch_reports import report_name
+from analytics_store import AnalyticsStore
+from cohort_aggregates import AggregateStore
+from cohort_ranks import CohortSketches
+from columnar_cache import source_hash, load_parsed, write_parsed
+from history_index import HistoryIndex
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    Observer = None
+
+WATCH_MANIFEST_PATH = os.environ.get("FAST_EDA_WATCH_MANIFEST", os.path.join(".cache", "watch_manifest.json"))
+SUBMISSION_SUFFIXES = tuple([".json"] + [f".{ext}" for ext in json_backend.COMPRESSED_EXTENSIONS])
+
+def is_submission_file(name):
+    """Submission files to ingest; hidden and partially-written temp files are ignored"""
+    return name.endswith(SUBMISSION_SUFFIXES) and not name.startswith(".") and ".tmp" not in name
+
+class CheckpointManifest:
+    """Per-file ingest state keyed by absolute path, saved atomically as JSON"""
+
+    def __init__(self, path=WATCH_MANIFEST_PATH):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        self.reports = {entry["report"]: path for path, entry in self.entries.items() if entry.get("report")}
+
+    def unchanged(self, path, stat):
+        """True when the file was already handled and its size and mtime have not moved since"""
+        entry = self.entries.get(path)
+        return entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+
+    def digest(self, path):
+        entry = self.entries.get(path)
+        return entry["sha256"] if entry else None
+
+    def ingested(self, path):
+        """Hash of the last version of the file that made it into the stores"""
+        entry = self.entries.get(path)
+        if entry is None:
+            return None
+        return entry.get("ingested", entry["sha256"] if entry["status"] == "done" else None)
+
+    def report_owner(self, report):
+        return self.reports.get(report)
+
+    def mark(self, path, stat, digest, status, error=None, report=None):
+        # A failed version keeps the report an earlier good version already owns
+        report = report or self.entries.get(path, {}).get("report")
+        self.entries[path] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": digest,
+            "status": status,
+            "error": error,
+            "ingested": digest if status == "done" else self.ingested(path),
+            "report": report,
+            "processed_at": time.time()
+        }
+        if report:
+            self.reports[report] = path
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+class Ingestor:
+    """Applies parsed submissions to the caches and stores, flushing them in batches"""
+
+    def __init__(self, report_dir=None, processes=None):
+        import main
+
+        self.pipeline = main
+        self.aggregates = AggregateStore.load()
+        self.cohort = CohortSketches.load() or CohortSketches()
+        self.batch = []
+        self.report_dir = report_dir
+        self.pending_reports = []
+        self.pool = None
+        if report_dir is not None:
+            from report_pool import ReportPool
+
+            os.makedirs(report_dir, exist_ok=True)
+            self.pool = ReportPool(processes)
+
+    def ingest(self, path, raw, digest, previous_digest=None, report=None):
+        """Parse one submission file and fold it into the stores
+
+        previous_digest marks a replaced file; report is the PDF's path below report_dir, without .pdf.
+        """
+        json_data = json_backend.validate_submission(json_backend.load(io.BytesIO(raw)))
+        parsed_data = self.pipeline.parse_json_data(json_data)
+        if parsed_data is None:
+            raise ValueError("Failed to parse the JSON data")
+        if previous_digest:
+            previous_questions = self._previous_questions(previous_digest)
+            if previous_questions is None:
+                raise LookupError(f"The version it replaces ({previous_digest[:12]}) is no longer cached "
+                                  "or stored, so its aggregates cannot be taken out")
+            self.aggregates.remove(previous_questions)
+            # A version still waiting in the batch never reached the on-disk stores
+            self.batch = [entry for entry in self.batch if entry[1] != previous_digest]
+        else:
+            # Sketches cannot take an observation back, so a re-exported file is only counted once
+            self.cohort.add_submission(parsed_data["questions_df"])
+        write_parsed(digest, parsed_data, self.pipeline.extract_chapter_source(parsed_data["raw_data"]))
+        self.aggregates.add(parsed_data["questions_df"])
+        self.batch.append((parsed_data, digest, previous_digest))
+        if self.pool is not None:
+            name = parsed_data.get("student_id") or report_name(path)
+            report_path = os.path.join(self.report_dir, f"{report or report_name(path)}.pdf")
+            self.pending_reports.append((self.pool.submit(json_data, name, source_key=digest), report_path))
+
+    def _previous_questions(self, previous_digest):
+        """questions_df of the version a replaced file had: from the unflushed batch, the columnar
+        cache or, after a cache eviction, the analytics store; None when none of them has it"""
+        for parsed_data, digest, _ in self.batch:
+            if digest == previous_digest:
+                return parsed_data["questions_df"]
+        previous = load_parsed(previous_digest)
+        if previous is not None:
+            return previous["questions_df"]
+        analytics = AnalyticsStore.open_existing()
+        if analytics is None:
+            return None
+        with analytics:
+            return analytics.submission_questions(previous_digest)
+
+    def flush(self):
+        """Write the batch to the on-disk stores and save the aggregates and sketches"""
+        if self.batch:
+            with HistoryIndex() as history:
+                for parsed_data, _, _ in self.batch:
+                    if parsed_data.get("student_id"):
+                        history.record_attempt(parsed_data["student_id"], parsed_data)
+            with AnalyticsStore() as analytics:
+                analytics.remove([previous for _, _, previous in self.batch if previous])
+                analytics.ingest_many([(parsed_data, digest) for parsed_data, digest, _ in self.batch])
+            self.aggregates.save()
+            self.cohort.save()
+            self.batch = []
+        self.collect_reports()
+
+    def collect_reports(self, wait=False):
+        """Write finished PDFs to the report directory"""
+        still_pending = []
+        for result, report_path in self.pending_reports:
+            if not wait and not result.ready():
+                still_pending.append((result, report_path))
+                continue
+            try:
+                pdf_bytes = result.get()
+            except Exception as e:
+                print(f"Report failed for {report_path}: {e}")
+                continue
+            os.makedirs(os.path.dirname(report_path), exist_ok=True)
+            tmp_path = f"{report_path}.tmp-{os.getpid()}"
+            with open(tmp_path, "wb") as f:
+                f.write(pdf_bytes)
+            os.replace(tmp_path, report_path)
+        self.pending_reports = still_pending
+
+    def close(self):
+        self.flush()
+        if self.pool is not None:
+            self.collect_reports(wait=True)
+            self.pool.close()
+
+def scan(directory, manifest, ingestor, settle=2.0, recursive=False):
+    """Ingest new or changed files; returns (ingested, failed, still settling)"""
+    ingested = failed = settling = 0
+    for root, dirs, files in os.walk(directory):
+        if not recursive:
+            dirs[:] = []
+        for name in sorted(files):
+            if not is_submission_file(name):
+                continue
+            path = os.path.abspath(os.path.join(root, name))
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if manifest.unchanged(path, stat):
+                continue
+            # A file still being copied in keeps changing; wait until it has been quiet for `settle` seconds
+            if time.time() - stat.st_mtime < settle:
+                settling += 1
+                continue
+            with open(path, "rb") as f:
+                raw = f.read()
+            digest = source_hash(raw)
+            if digest == manifest.digest(path):
+                # Touched but identical content: refresh the stat so the next scan skips it cheaply
+                manifest.entries[path].update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+                continue
+            report = None
+            if ingestor.report_dir is not None:
+                report = os.path.normpath(os.path.join(os.path.relpath(root, directory), report_name(name)))
+            try:
+                owner = manifest.report_owner(report) if report else None
+                if owner is not None and owner != path:
+                    raise ValueError(f"its report {report}.pdf belongs to {owner}")
+                # Retract the version that is in the stores, which a failed replacement never displaced
+                ingestor.ingest(path, raw, digest, manifest.ingested(path), report)
+            except Exception as e:
+                manifest.mark(path, stat, digest, "failed", str(e))
+                failed += 1
+                print(f"Failed to ingest {path}: {e}")
+            else:
+                manifest.mark(path, stat, digest, "done", report=report)
+                ingested += 1
+    return ingested, failed, settling
+
+def watch(directory, manifest_path=WATCH_MANIFEST_PATH, report_dir=None, processes=None,
+          interval=30.0, settle=2.0, recursive=False, once=False):
+    """Ingest the directory, then keep ingesting as files arrive until stopped (SIGINT/SIGTERM)"""
+    manifest = CheckpointManifest(manifest_path)
+    ingestor = Ingestor(report_dir, processes)
+    wake = threading.Event()
+    stop = threading.Event()
+    observer = None
+    if not once and Observer is not None:
+        class _Wake(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if not event.is_directory:
+                    wake.set()
+
+        observer = Observer()
+        observer.schedule(_Wake(), directory, recursive=recursive)
+        observer.start()
+
+    def _stop(signum, frame):
+        stop.set()
+        wake.set()
+
+    signal.signal(signal.SIGTERM, _stop)
+    try:
+        while True:
+            ingested, failed, settling = scan(directory, manifest, ingestor, settle, recursive)
+            if ingested or failed:
+                ingestor.flush()
+                manifest.save()
+                print(f"Ingested {ingested} file(s), {failed} failed")
+            else:
+                ingestor.collect_reports()
+            if once and not settling:
+                break
+            # Come back sooner while files are still being written
+            wake.wait(settle if settling else interval)
+            wake.clear()
+            if stop.is_set():
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if observer is not None:
+            observer.stop()
+            observer.join()
+        ingestor.close()
+        manifest.save()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Watch a directory and ingest submissions as they arrive")
+    parser.add_argument("directory", help="Directory submissions are written to")
+    parser.add_argument("--manifest", default=WATCH_MANIFEST_PATH, help="Checkpoint manifest file")
+    parser.add_argument("--reports", help="Also generate a PDF report per submission into this directory")
+    parser.add_argument("--processes", type=int, help="Report worker processes (default: CPU count)")
+    parser.add_argument("--interval", type=float, default=30.0, help="Seconds between full scans")
+    parser.add_argument("--settle", type=float, default=2.0, help="Seconds a file must be unchanged before ingest")
+    parser.add_argument("--recursive", action="store_true", help="Also watch subdirectories")
+    parser.add_argument("--once", action="store_true", help="Ingest what is there now and exit")
+    args = parser.parse_args()
+    watch(args.directory, args.manifest, args.reports, args.processes,
+          args.interval, args.settle, args.recursive, args.once)